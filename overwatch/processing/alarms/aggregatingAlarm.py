@@ -13,8 +13,8 @@ except ImportError:
 
 
 class AggregatingAlarm(Alarm):
-    def __init__(self, children, alarmText=''):  # type: (List[Alarm], str) -> None
-        super(AggregatingAlarm, self).__init__(alarmText=alarmText)
+    def __init__(self, children, alarmText='', **kwargs):  # type: (List[Alarm], str, Any) -> None
+        super(AggregatingAlarm, self).__init__(alarmText=alarmText, **kwargs)
 
         # None - no value, True/False - last value returned from alarm
         self.children = {c: None for c in children}  # type: Dict[Alarm, Optional[bool]]
@@ -30,16 +30,26 @@ class AggregatingAlarm(Alarm):
     def isAllAlarmsCompleted(self):
         return all(c is not None for c in self.children.values())
 
-    def checkAlarm(self, *args, **kwargs):  # type: () -> (bool, str)
-        """abstract method"""
+    def checkAlarm(self, results):  # type: (Dict[Alarm, bool]) -> (bool, str)
+        """abstract method
+
+        Args:
+            results (dict): Result of each child alarm.
+        """
         raise NotImplementedError
 
     def childProcessed(self, child, result):
+        """ Store the result of a child which was checked separately, and check once all children are done.
+
+        This is only needed if the children aren't checked together in one ``AlarmPlan`` (for example,
+        because they belong to different trends). Otherwise, the plan passes the results directly.
+        """
         if self.children[child] is not None:
             print("WARNING: last result ignored")
 
         self.children[child] = result
 
         if self.isAllAlarmsCompleted():
-            self.processCheck()
+            results = self.children
             self.children = {c: None for c in self.children}
+            self.reportResult(self.checkAlarm(results))
@@ -3,8 +3,14 @@
 
 .. codeauthor:: Pawel Ostrowski <ostr000@interia.pl>, AGH University of Science and Technology
 """
+import time
+import weakref
+
 import numpy as np
+import overwatch.processing.alarms.state as STATE
 from overwatch.processing.alarms.collectors import alarmCollector
+from overwatch.processing.alarms.window import AlarmWindow
+from overwatch.processing.trending.ringBuffer import TrendingRingBuffer
 
 try:
     from typing import *  # noqa
@@ -15,18 +21,76 @@ except ImportError:
 
 
 class Alarm(object):
-    def __init__(self, alarmText='', collector=None):
+    # Number of most recent values which are needed to check the alarm. If it is set, the alarm keeps an
+    # ``AlarmWindow`` for each trend, which is updated with the new values and passed to ``checkWindow``.
+    # Otherwise, all of the trended values are passed to ``checkAlarm``.
+    windowSize = None  # type: Optional[int]
+    # Suppression settings (see ``AlarmState``). None uses the value from the configuration.
+    # Class level defaults so that alarms stored before the settings were available are still valid.
+    raiseAfter = None  # type: Optional[int]
+    clearAfter = None  # type: Optional[int]
+    renotifyInterval = None  # type: Optional[float]
+
+    def __init__(self, alarmText='', collector=None, raiseAfter=None, clearAfter=None, renotifyInterval=None):
         self.alarmText = alarmText
         self.collector = collector
+        self.raiseAfter = raiseAfter
+        self.clearAfter = clearAfter
+        self.renotifyInterval = renotifyInterval
         self.receivers = []
         self.parent = None  # type: Optional[AggregatingAlarm]
+        self.windows = weakref.WeakKeyDictionary()  # type: MutableMapping[TrendingObject, AlarmWindow]
+
+    def __getstate__(self):
+        # The windows are rebuilt from the trended values when needed, so they aren't stored.
+        state = self.__dict__.copy()
+        state.pop("windows", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.windows = weakref.WeakKeyDictionary()
 
     def addReceiver(self, receiver):  # type: (callable) -> None
         self.receivers.append(receiver)
 
-    def processCheck(self, trend=None):  # type: (Optional[TrendingObject]) -> None
-        args = (self.prepareTrendValues(trend),) if trend else ()
-        result = self.checkAlarm(*args)
+    def processCheck(self, trend):  # type: (TrendingObject) -> None
+        """ Check the alarm for a single trend.
+
+        Several alarms of a trend are usually checked together with an ``AlarmPlan`` instead.
+        """
+        if self.windowSize is not None:
+            window = self.windows.get(trend)
+            if window is None:
+                window = self.windows[trend] = self.createWindow()
+            self.updateWindow(window, trend)
+            result = self.checkWindow(window)
+        else:
+            result = self.checkAlarm(self.prepareTrendValues(trend))
+        self.reportResult(result, trend)
+
+    def updateState(self, state, isAlarm, now, parameters):
+        # type: (STATE.AlarmState, bool, float, dict) -> Optional[str]
+        """ Update the persistent state of the alarm with the result of a check.
+
+        Returns:
+            str or None: Change of the state which should be announced (see ``AlarmState.update``).
+        """
+        def setting(value, key, default):
+            return value if value is not None else parameters.get(key, default)
+
+        return state.update(isAlarm, now,
+                            raiseAfter=setting(self.raiseAfter, STATE.RAISE_AFTER, 1),
+                            clearAfter=setting(self.clearAfter, STATE.CLEAR_AFTER, 1),
+                            renotifyInterval=setting(self.renotifyInterval, STATE.RENOTIFY_INTERVAL, 0))
+
+    def reportResult(self, result, trend=None, notifyParent=True, state=None, change=None):
+        # type: (Tuple[bool, str], Optional[TrendingObject], bool, Optional[STATE.AlarmState], Optional[str]) -> None
+        """ Announce (or collect) the message of the alarm and pass the result on to the parent alarm.
+
+        Without a state, every triggered check is announced. With a state, only the changes of the state
+        are announced: when the alarm is raised, when it is cleared, and reminders while it stays raised.
+        """
         isAlarm, msg = result
 
         if isAlarm:
@@ -36,16 +100,80 @@ class Alarm(object):
             if trend:
                 trend.alarmsMessages.append(msg)
 
+        if state is None:
+            announcement = msg if isAlarm else None
+        elif change == STATE.RAISED:
+            announcement = msg
+        elif change == STATE.REMINDER:
+            announcement = "{msg} (active since {since})".format(msg=msg, since=time.ctime(state.since))
+        elif change == STATE.CLEARED:
+            announcement = "[{alarmText}]: cleared".format(alarmText=self.alarmText)
+        else:
+            announcement = None
+
+        if announcement is not None:
             # tell collector about alarm or announce alarm itself
             if self.collector:
-                alarmCollector.collectMessage(self, "[{trendName}]{msg}".format(trendName=trend.name, msg=msg))
+                alarmCollector.collectMessage(
+                    self, "[{trendName}]{msg}".format(trendName=trend.name, msg=announcement))
             else:
-                self._announceAlarm(msg)
-        if self.parent:
+                self._announceAlarm(announcement)
+        if self.parent and notifyParent:
             self.parent.childProcessed(child=self, result=isAlarm)
 
+    def createWindow(self):  # type: () -> AlarmWindow
+        window = AlarmWindow(self.windowSize)
+        self.prepareWindow(window)
+        return window
+
+    def prepareWindow(self, window):  # type: (AlarmWindow) -> None
+        """ Register any additional statistics which are needed from the window (such as ranges). """
+        pass
+
+    @staticmethod
+    def numberOfTrendValues(trend):  # type: (TrendingObject) -> int
+        """ Number of values which have been trended, including those which are no longer stored. """
+        trendedValues = trend.trendedValues
+        return trendedValues.count if isinstance(trendedValues, TrendingRingBuffer) else len(trendedValues)
+
+    @staticmethod
+    def updateWindow(window, trend, totalCount=None):  # type: (AlarmWindow, TrendingObject, Optional[int]) -> None
+        """ Add the values trended since the last update to the window.
+
+        If the window can't be brought up to date (for example, because it was just created), it is rebuilt
+        from the most recent trended values.
+
+        Args:
+            window (AlarmWindow): Window to update.
+            trend (TrendingObject): Trend which provides the values.
+            totalCount (int): Only add the values up to this number of trended values, such that the window
+                ends at an earlier value. Default: None, which adds all of the trended values.
+        """
+        availableCount = Alarm.numberOfTrendValues(trend)
+        if totalCount is None:
+            totalCount = availableCount
+        nNew = totalCount - window.count
+        if nNew < 0 or nNew > window.size:
+            nNew = min(totalCount, window.size)
+            window.reset(count=totalCount - nNew)
+        if nNew > 0:
+            values = Alarm.latestTrendValues(trend, availableCount - totalCount + nNew)
+            # Drop the values which were trended after ``totalCount``.
+            end = max(len(values) - (availableCount - totalCount), 0)
+            for value in values[max(end - nNew, 0):end]:
+                window.push(value)
+
+    @staticmethod
+    def latestTrendValues(trend, n):  # type: (TrendingObject, int) -> np.ndarray
+        if isinstance(trend.trendedValues, TrendingRingBuffer):
+            return trend.trendedValues.latestValues(n)
+        trendingValues = Alarm.prepareTrendValues(trend)
+        return trendingValues[max(len(trendingValues) - n, 0):]
+
     @staticmethod
     def prepareTrendValues(trend):  # type: (TrendingObject) -> np.ndarray
+        if isinstance(trend.trendedValues, TrendingRingBuffer):
+            return trend.trendedValues.chronologicalValues()
         trendingValues = np.array(trend.trendedValues)
         if len(trendingValues.shape) == 2:
             trendingValues = trendingValues[:, 0]
@@ -54,7 +182,11 @@ class Alarm(object):
         return trendingValues
 
     def checkAlarm(self, trend):  # type: (np.ndarray) -> (bool, str)
-        """abstract method"""
+        """abstract method, used if windowSize is not set"""
+        raise NotImplementedError
+
+    def checkWindow(self, window):  # type: (AlarmWindow) -> (bool, str)
+        """abstract method, used if windowSize is set"""
         raise NotImplementedError
 
     def _announceAlarm(self, msg):  # type: (str) -> None
@@ -10,6 +10,8 @@ from email.mime.text import MIMEText
 import logging
 from collections import defaultdict
 
+from overwatch.processing.alarms.delivery import alarmDeliveryQueue
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,24 +32,48 @@ class Singleton(_Singleton('SingletonMeta', (object,), {})):
 
 
 class Mail(Singleton):
+    """Stores the SMTP settings and the connection to the SMTP server.
+
+    The connection is only opened when the first email is sent (from the alarm delivery thread),
+    so a slow mail server doesn't delay the processing.
+
+    Args:
+        alarmsParameters (dict): Parameters read from configuration files
+    """
     def __init__(self, alarmsParameters=None):
+        self.smtp = None
+        self._password = None
         if alarmsParameters is not None:
             self.parameters = alarmsParameters
             try:
                 smtpSettings = alarmsParameters["emailDelivery"]["smtpSettings"]
-                host = smtpSettings["address"]
-                port = smtpSettings["port"]
-                password = smtpSettings["password"]
+                self.host = smtpSettings["address"]
+                self.port = smtpSettings["port"]
                 self.user_name = smtpSettings["userName"]
             except KeyError:
                 logger.debug("EmailDelivery not configured")
             else:
-                self.smtp = smtplib.SMTP(host=host, port=port)
-                self._login(password)
-
-    def _login(self, password):
-        self.smtp.starttls()
-        self.smtp.login(user=self.user_name, password=password)
+                # Without a password, the server is used without authentication (such as a local relay).
+                self._password = smtpSettings.get("password")
+
+    def connection(self):  # type: () -> smtplib.SMTP
+        """ Retrieve the connection to the SMTP server, connecting if necessary. """
+        if self.smtp is None:
+            smtp = smtplib.SMTP(host=self.host, port=self.port)
+            if self._password:
+                smtp.starttls()
+                smtp.login(user=self.user_name, password=self._password)
+            self.smtp = smtp
+        return self.smtp
+
+    def resetConnection(self):
+        """ Drop the connection, such that the next email reconnects. """
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except smtplib.SMTPException:
+                pass
+        self.smtp = None
 
 
 def printCollector(alarm):
@@ -67,15 +93,19 @@ class MailSender:
         self.recipients = addresses
 
     def __call__(self, alarm):
-        self.sendMail(alarm)
+        alarmDeliveryQueue.enqueue(self.sendMail, alarm)
 
     def sendMail(self, payload):
         """ Sends message to specified earlier recipients.
 
+        It is called from the alarm delivery thread.
+
         Args:
             payload (str): Message to send
         Return:
             None.
+        Raises:
+            smtplib.SMTPException: If the email couldn't be sent, so that it can be retried.
         """
         success = "Emails successfully sent to {recipients}"
         fail = "EmailDelivery not configured, couldn't send emails"
@@ -88,7 +118,12 @@ class MailSender:
                 msg['To'] = ", ".join(self.recipients)
                 msg['Subject'] = 'Overwatch Alarm'
                 msg.attach(MIMEText(payload, 'plain'))
-                mail.smtp.sendmail(mail.user_name, self.recipients, msg.as_string())
+                try:
+                    mail.connection().sendmail(mail.user_name, self.recipients, msg.as_string())
+                except (smtplib.SMTPException, IOError):
+                    # Reconnect when it is retried.
+                    mail.resetConnection()
+                    raise
 
                 logger.debug(success.format(recipients=", ".join(self.recipients)))
             else:
@@ -115,23 +150,29 @@ class SlackNotification(Singleton):
                 logger.debug("Slack not configured")
 
     def __call__(self, alarm):
-        self.sendMessage(alarm)
+        alarmDeliveryQueue.enqueue(self.sendMessage, alarm)
 
     def sendMessage(self, payload):
         """ Sends message to specified earlier channel.
 
+        It is called from the alarm delivery thread.
+
         Args:
             payload (str): Message to send
         Return:
             None.
+        Raises:
+            RuntimeError: If Slack didn't accept the message, so that it can be retried.
         """
         success = "Message successfully sent on Slack channel {channel}"
         fail = "Slack not configured, couldn't send messages"
 
         if 'slack' in self.parameters:
-            self.slackClient.api_call(
+            response = self.slackClient.api_call(
                 'chat.postMessage', channel=self.channel, text=payload,
                 username='Alarms OVERWATCH', icon_emoji=':robot_face:')
+            if isinstance(response, dict) and not response.get("ok", True):
+                raise RuntimeError("Slack error: {error}".format(error=response.get("error")))
             logger.debug(success.format(channel=self.channel))
         else:
             logger.debug(fail)
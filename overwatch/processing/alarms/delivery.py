@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+""" Background delivery of alarm notifications.
+
+Sending an email or a Slack message can take a long time (or hang) if the server is slow, so the
+notification receivers only put their messages into the ``AlarmDeliveryQueue``. The messages are delivered
+from a background thread, such that processing never waits on them. The queue:
+
+- collects the messages for each receiver and delivers them together (batching),
+- limits how many deliveries each receiver gets per minute,
+- retries failed deliveries with exponential backoff,
+- drops identical messages which were already delivered recently (deduplication).
+"""
+import atexit
+import contextlib
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingDelivery(object):
+    """ Messages waiting to be delivered to one receiver. """
+
+    def __init__(self):
+        self.messages = []  # type: List[str]
+        self.attempts = 0
+        self.retryAt = 0.
+
+
+class AlarmDeliveryQueue(object):
+    """ Queue which delivers alarm messages from a background thread.
+
+    A receiver is a function which takes a single (possibly multi-line) message and delivers it, such as
+    ``MailSender.sendMail``. It should raise an exception if the delivery failed, so that it can be retried.
+
+    Args:
+        batchInterval (float): Time in seconds between delivery attempts. Messages for the same receiver which
+            arrive within this time are delivered together. Default: 5.
+        maxPerMinute (int): Maximum number of deliveries to each receiver per minute. Default: 10.
+        maxRetries (int): Number of times that a failed delivery is retried before it is dropped. Default: 5.
+        retryBackoff (float): Time in seconds before the first retry. It doubles with each further retry. Default: 2.
+        deduplicationInterval (float): Identical messages to the same receiver are only delivered once within
+            this time in seconds. Default: 600.
+        clock (callable): Returns the current time in seconds. Default: ``time.time``.
+
+    Attributes:
+        queue (queue.Queue): Messages which were enqueued, but not yet collected by the delivery thread.
+        pending (OrderedDict): Messages waiting to be delivered, keyed by receiver.
+        thread (threading.Thread): Delivery thread. None until the first message is enqueued.
+    """
+
+    def __init__(self, batchInterval=5., maxPerMinute=10, maxRetries=5, retryBackoff=2., deduplicationInterval=600.,
+                 clock=time.time):
+        # type: (float, int, int, float, float, Callable[[], float]) -> None
+        self.batchInterval = batchInterval
+        self.maxPerMinute = maxPerMinute
+        self.maxRetries = maxRetries
+        self.retryBackoff = retryBackoff
+        self.deduplicationInterval = deduplicationInterval
+        self.clock = clock
+
+        self.queue = queue.Queue()
+        self.pending = OrderedDict()  # type: Dict[Callable[[str], None], _PendingDelivery]
+        # Time at which each (receiver, message) was last delivered.
+        self._delivered = {}  # type: Dict[Tuple[Callable[[str], None], str], float]
+        # Times of the deliveries to each receiver within the last minute.
+        self._deliveryTimes = {}  # type: Dict[Callable[[str], None], Deque[float]]
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._deliverRemaining = True
+        self._atexitRegistered = False
+        self.thread = None  # type: Optional[threading.Thread]
+
+    def configure(self, parameters):  # type: (dict) -> None
+        """ Set the delivery options from the configuration parameters. """
+        self.batchInterval = parameters.get("alarmDeliveryBatchInterval", self.batchInterval)
+        self.maxPerMinute = parameters.get("alarmDeliveryMaxPerMinute", self.maxPerMinute)
+        self.maxRetries = parameters.get("alarmDeliveryMaxRetries", self.maxRetries)
+        self.retryBackoff = parameters.get("alarmDeliveryRetryBackoff", self.retryBackoff)
+        self.deduplicationInterval = parameters.get("alarmDeliveryDeduplicationInterval", self.deduplicationInterval)
+
+    def enqueue(self, receiver, message):  # type: (Callable[[str], None], str) -> None
+        """ Queue a message to be delivered. It returns immediately.
+
+        Args:
+            receiver (callable): Function which delivers the message.
+            message (str): Message to deliver.
+        Returns:
+            None.
+        """
+        self.queue.put((receiver, message))
+        if self.thread is None:
+            self.start()
+
+    def start(self):  # type: () -> None
+        """ Start the delivery thread. """
+        self._stopping.clear()
+        self._deliverRemaining = True
+        self.thread = threading.Thread(target=self._run, name="alarmDelivery")
+        self.thread.daemon = True
+        self.thread.start()
+        # Try to deliver the remaining messages before the process exits. The thread may be restarted
+        # (see ``suspended()``), so it's only registered once.
+        if not self._atexitRegistered:
+            atexit.register(self.stop)
+            self._atexitRegistered = True
+
+    def stop(self, timeout=None, deliverRemaining=True):  # type: (Optional[float], bool) -> None
+        """ Deliver the remaining messages (if possible) and stop the delivery thread.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait for the thread to stop. Default: None (no limit).
+            deliverRemaining (bool): If True, try to deliver the pending messages before the thread stops.
+                Otherwise, they are kept until the thread is started again. Default: True.
+        Returns:
+            None.
+        """
+        if self.thread is None:
+            return
+        self._deliverRemaining = deliverRemaining
+        self._stopping.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    @contextlib.contextmanager
+    def suspended(self):  # type: () -> Iterator[None]
+        """ Stop the delivery thread within the context, and restart it afterwards if it was running.
+
+        A process which is forked while another thread holds a lock (such as a logging handler lock held by
+        the delivery thread) inherits the lock in the locked state, so the child process can deadlock. Thus,
+        worker processes (such as a ``multiprocessing.Pool``) must only be created within this context. The
+        messages which are enqueued in the meantime are delivered once the thread is restarted.
+        """
+        wasRunning = self.thread is not None
+        self.stop(deliverRemaining=False)
+        try:
+            yield
+        finally:
+            if wasRunning:
+                self.start()
+
+    def _run(self):  # type: () -> None
+        while not self._stopping.wait(self.batchInterval):
+            self.deliverPending()
+        if not self._deliverRemaining:
+            return
+        # Final attempt for anything which is still waiting.
+        self.deliverPending()
+        for receiver, delivery in self.pending.items():
+            logger.warning("Dropping {n} undelivered alarm message(s) for {receiver}".format(
+                n=len(delivery.messages), receiver=receiver))
+
+    def _collectQueuedMessages(self, now):  # type: (float) -> None
+        """ Move the enqueued messages to the pending deliveries, dropping duplicates. """
+        while True:
+            try:
+                receiver, message = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            lastDelivered = self._delivered.get((receiver, message))
+            if lastDelivered is not None and now - lastDelivered < self.deduplicationInterval:
+                logger.debug("Dropping repeated alarm message: {message}".format(message=message))
+                continue
+            delivery = self.pending.setdefault(receiver, _PendingDelivery())
+            if message not in delivery.messages:
+                delivery.messages.append(message)
+
+    def _rateLimited(self, receiver, now):  # type: (Callable[[str], None], float) -> bool
+        times = self._deliveryTimes.setdefault(receiver, deque())
+        while times and now - times[0] >= 60:
+            times.popleft()
+        return len(times) >= self.maxPerMinute
+
+    def deliverPending(self):  # type: () -> None
+        """ Deliver the pending messages to each receiver which is due (one delivery per receiver).
+
+        It is called periodically by the delivery thread, but it can also be called directly.
+
+        Args:
+            None.
+        Returns:
+            None.
+        """
+        with self._lock:
+            now = self.clock()
+            self._collectQueuedMessages(now)
+            # Forget deliveries which can't cause any more deduplication.
+            for key in [k for k, t in self._delivered.items() if now - t >= self.deduplicationInterval]:
+                del self._delivered[key]
+
+            for receiver in list(self.pending):
+                delivery = self.pending[receiver]
+                if delivery.retryAt > now or self._rateLimited(receiver, now):
+                    continue
+                try:
+                    receiver('\n'.join(delivery.messages))
+                except Exception as e:
+                    delivery.attempts += 1
+                    if delivery.attempts > self.maxRetries:
+                        logger.error("Failed to deliver alarm messages to {receiver} after {n} attempts. Dropping them. "
+                                     "Last error: {e}".format(receiver=receiver, n=delivery.attempts, e=e))
+                        del self.pending[receiver]
+                    else:
+                        delivery.retryAt = now + self.retryBackoff * 2 ** (delivery.attempts - 1)
+                        logger.info("Delivery of alarm messages to {receiver} failed ({e}). Retrying in {t} s.".format(
+                            receiver=receiver, e=e, t=delivery.retryAt - now))
+                    continue
+
+                del self.pending[receiver]
+                self._deliveryTimes[receiver].append(now)
+                for message in delivery.messages:
+                    self._delivered[(receiver, message)] = now
+
+
+alarmDeliveryQueue = AlarmDeliveryQueue()
@@ -7,15 +7,16 @@ from overwatch.processing.alarms.alarm import Alarm
 
 
 class AbsolutePreviousValueAlarm(Alarm):
+    windowSize = 2
+
     def __init__(self, maxDelta=1, *args, **kwargs):
         super(AbsolutePreviousValueAlarm, self).__init__(*args, **kwargs)
         self.maxDelta = maxDelta
 
-    def checkAlarm(self, trend):
-        if len(trend) < 2:
+    def checkWindow(self, window):
+        if not window.isFull():
             return False, ''
-        prevValue = trend[-2]
-        curValue = trend[-1]
+        prevValue, curValue = window.values
 
         delta = abs(prevValue - curValue)
         if delta <= self.maxDelta:
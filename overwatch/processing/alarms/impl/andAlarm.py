@@ -12,11 +12,11 @@ except ImportError:
 
 
 class AndAlarm(AggregatingAlarm):
-    def __init__(self, children, alarmText=''):  # type: (list[Alarm], str) -> None
-        super(AndAlarm, self).__init__(children, alarmText=alarmText)
+    def __init__(self, children, alarmText='', **kwargs):  # type: (list[Alarm], str, Any) -> None
+        super(AndAlarm, self).__init__(children, alarmText=alarmText, **kwargs)
 
-    def checkAlarm(self):
-        alarms = [alarm for alarm, val in self.children.items() if val]
-        result = len(alarms) == len(self.children)
+    def checkAlarm(self, results):
+        alarms = [alarm for alarm, val in results.items() if val]
+        result = len(alarms) == len(results)
         msg = ", ".join(a.alarmText for a in alarms)
         return result, msg
@@ -7,13 +7,15 @@ from overwatch.processing.alarms.alarm import Alarm
 
 
 class BetweenValuesAlarm(Alarm):
+    windowSize = 1
+
     def __init__(self, centerValue=50., maxDistance=50., minVal=None, maxVal=None, alarmText='', *args, **kwargs):
         super(BetweenValuesAlarm, self).__init__(alarmText=alarmText, *args, **kwargs)
         self.minVal = minVal if minVal is not None else centerValue - maxDistance
         self.maxVal = maxVal if maxVal is not None else centerValue + maxDistance
 
-    def checkAlarm(self, trend):
-        testedValue = trend[-1]
+    def checkWindow(self, window):
+        testedValue = window.values[-1]
         if self.minVal <= testedValue <= self.maxVal:
             return False, ''
 
@@ -14,13 +14,18 @@ class CheckLastNAlarm(Alarm):
         self.ratio = ratio
         self.N = N
 
-    def checkAlarm(self, trend):
-        if len(trend) < self.N:
+    @property
+    def windowSize(self):
+        return self.N
+
+    def prepareWindow(self, window):
+        window.addRange(self.minVal, self.maxVal)
+
+    def checkWindow(self, window):
+        if not window.isFull():
             return False, ''
 
-        trendedValues = trend[-self.N:]
-        inBorderValues = [tv for tv in trendedValues if self.maxVal > tv > self.minVal]
-        if len(inBorderValues) >= self.ratio * self.N:
+        if window.countInRange(self.minVal, self.maxVal) >= self.ratio * self.N:
             return False, ''
 
         msg = "(CheckLastNAlarm): less than {} % values of last {} trending values not in [{}, {}]".format(
@@ -4,7 +4,6 @@
 .. codeauthor:: Jacek Nabywaniec <>, AGH University of Science and Technology
 """
 from overwatch.processing.alarms.alarm import Alarm
-import numpy as np
 
 
 class MeanInRangeAlarm(Alarm):
@@ -14,13 +13,15 @@ class MeanInRangeAlarm(Alarm):
         self.maxVal = maxVal
         self.N = N
 
-    def checkAlarm(self, trend):
-        if len(trend) < self.N:
+    @property
+    def windowSize(self):
+        return self.N
+
+    def checkWindow(self, window):
+        if not window.isFull():
             return False, ''
 
-        trendedValues = trend[-self.N:]
-        mean = np.mean(trendedValues)
-        if self.minVal < np.mean(mean) < self.maxVal:
+        if self.minVal < window.mean() < self.maxVal:
             return False, ''
 
         msg = "(MeanInRangeAlarm): mean of last {n} values not in [{min}, {max}]".format(
@@ -13,11 +13,11 @@ except ImportError:
 
 
 class OrAlarm(AggregatingAlarm):
-    def __init__(self, children, alarmText=''):  # type: (List[Alarm], str) -> None
-        super(OrAlarm, self).__init__(children, alarmText=alarmText)
+    def __init__(self, children, alarmText='', **kwargs):  # type: (List[Alarm], str, Any) -> None
+        super(OrAlarm, self).__init__(children, alarmText=alarmText, **kwargs)
 
-    def checkAlarm(self):
-        alarms = [alarm for alarm, val in self.children.items() if val]
+    def checkAlarm(self, results):
+        alarms = [alarm for alarm, val in results.items() if val]
         result = len(alarms) > 0
         msg = ", ".join(a.alarmText for a in alarms)
         return result, msg
@@ -7,16 +7,17 @@ from overwatch.processing.alarms.alarm import Alarm
 
 
 class RelativePreviousValueAlarm(Alarm):
+    windowSize = 2
+
     def __init__(self, ratio=2.0, *args, **kwargs):
         super(RelativePreviousValueAlarm, self).__init__(*args, **kwargs)
         assert ratio > 1
         self.ratio = ratio
 
-    def checkAlarm(self, trend):
-        if len(trend) < 2:
+    def checkWindow(self, window):
+        if not window.isFull():
             return False, ''
-        prevValue = trend[-2]
-        curValue = trend[-1]
+        prevValue, curValue = window.values
 
         if prevValue < 0:
             curValue = -curValue
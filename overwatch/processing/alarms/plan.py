@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+""" Evaluation plan for all of the alarms of a trend.
+
+The alarms of a trend are compiled once into an ``AlarmPlan``. When the trend receives new values, the plan
+evaluates all of them together:
+
+- Alarms which use the same window size share one ``AlarmWindow``, which is updated once per check.
+- Alarms which need all of the trended values share one array of the values.
+- Aggregating alarms (``AndAlarm``, ``OrAlarm``, ...) whose children are all attached to the trend are
+  evaluated directly from the results of the children, so they don't depend on any state from previous checks.
+
+Aggregating alarms with children from other trends still collect the results via ``childProcessed``.
+
+If the persistent states of the alarms are passed to the plan, only the changes of the states are announced
+(see ``AlarmState``).
+"""
+import time
+
+from overwatch.processing.alarms.alarm import Alarm
+from overwatch.processing.alarms.state import AlarmState
+from overwatch.processing.alarms.window import AlarmWindow
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+else:
+    # Imports in this block below here are used solely for typing information
+    from overwatch.processing.alarms.aggregatingAlarm import AggregatingAlarm  # noqa
+    from overwatch.processing.trending.objects.object import TrendingObject  # noqa
+
+
+class AlarmPlan(object):
+    """ Compiled evaluation plan for the alarms of one trend.
+
+    Args:
+        alarms (list): Alarms attached to the trend.
+
+    Attributes:
+        alarms (list): Alarms attached to the trend, in the order in which they are checked.
+        windows (dict): Shared windows, keyed by the window size.
+        windowAlarms (list): ``(alarm, window)`` for each alarm, where the window is None if the alarm
+            needs all of the trended values.
+        aggregatingAlarms (list): Aggregating alarms which are evaluated within the plan, ordered such that
+            children are evaluated before their parents.
+        stateKeys (dict): Key of the persistent state of each alarm. It is built from the position, the type
+            and the text of the alarm, so it is stable as long as the alarms of the trend aren't changed.
+    """
+
+    def __init__(self, alarms):  # type: (List[Alarm]) -> None
+        self.alarms = list(alarms)
+        self.windows = {}  # type: Dict[int, AlarmWindow]
+        self.windowAlarms = []  # type: List[Tuple[Alarm, Optional[AlarmWindow]]]
+        for alarm in self.alarms:
+            window = None
+            if alarm.windowSize is not None:
+                window = self.windows.get(alarm.windowSize)
+                if window is None:
+                    window = self.windows[alarm.windowSize] = AlarmWindow(alarm.windowSize)
+                alarm.prepareWindow(window)
+            self.windowAlarms.append((alarm, window))
+
+        # Find the aggregating alarms for which all of the children are evaluated here.
+        self.aggregatingAlarms = []  # type: List[AggregatingAlarm]
+        evaluated = set(self.alarms)
+        candidates = [alarm.parent for alarm in self.alarms if alarm.parent is not None]
+        while candidates:
+            parent = candidates.pop(0)
+            if parent in evaluated or not all(child in evaluated for child in parent.children):
+                continue
+            self.aggregatingAlarms.append(parent)
+            evaluated.add(parent)
+            if parent.parent is not None:
+                candidates.append(parent.parent)
+        self._evaluated = evaluated
+
+        self.stateKeys = {}  # type: Dict[Alarm, str]
+        for i, alarm in enumerate(self.alarms + self.aggregatingAlarms):
+            self.stateKeys[alarm] = "{i}:{type}:{text}".format(i=i, type=type(alarm).__name__, text=alarm.alarmText)
+
+    @classmethod
+    def forTrend(cls, trend):  # type: (TrendingObject) -> AlarmPlan
+        """ Retrieve the plan of a trend, compiling it if the alarms have changed.
+
+        The plan (and therefore the windows) is stored in a volatile attribute, so it isn't stored in the
+        database. It is rebuilt from the trended values when it is needed again.
+        """
+        plan = getattr(trend, "_v_alarmPlan", None)
+        if plan is None or len(plan.alarms) != len(trend.alarms) or \
+                any(a is not b for a, b in zip(plan.alarms, trend.alarms)):
+            plan = cls(trend.alarms)
+            trend._v_alarmPlan = plan
+        return plan
+
+    def evaluate(self, trend, states=None, parameters=None, now=None, nValues=None):
+        # type: (TrendingObject, Optional[MutableMapping[str, AlarmState]], Optional[dict], Optional[float], Optional[int]) -> Dict[Alarm, bool]
+        """ Check all of the alarms of the trend with the current trended values.
+
+        To check the trend as it was after an earlier value, pass the number of values which had been
+        trended at that point as ``nValues``. The checks must be performed in order.
+
+        Args:
+            trend (TrendingObject): Trend which received new values.
+            states (MutableMapping): Persistent states of the alarms, keyed by ``stateKeys``. Missing states are
+                added. Default: None, which announces every triggered alarm.
+            parameters (dict): Parameters read from configuration files, which provide the default suppression
+                settings. Default: None.
+            now (float): Unix time of the check. Default: None, which uses the current time.
+            nValues (int): Number of trended values (including those which are no longer stored) to check.
+                Default: None, which checks all of the trended values.
+        Returns:
+            dict: Whether each alarm (including the aggregating alarms evaluated within the plan) is triggered.
+        """
+        for window in self.windows.values():
+            Alarm.updateWindow(window, trend, totalCount=nValues)
+        if now is None:
+            now = time.time()
+
+        trendValues = None
+        results = {}  # type: Dict[Alarm, bool]
+        for alarm, window in self.windowAlarms:
+            if window is not None:
+                result = alarm.checkWindow(window)
+            else:
+                if trendValues is None:
+                    trendValues = Alarm.prepareTrendValues(trend)
+                    if nValues is not None:
+                        # Drop the values which were trended after the checked value.
+                        trendValues = trendValues[:len(trendValues) - (Alarm.numberOfTrendValues(trend) - nValues)]
+                result = alarm.checkAlarm(trendValues)
+            self._report(alarm, result, trend, states, parameters, now)
+            results[alarm] = result[0]
+
+        for parent in self.aggregatingAlarms:
+            result = parent.checkAlarm({child: results[child] for child in parent.children})
+            self._report(parent, result, None, states, parameters, now)
+            results[parent] = result[0]
+
+        return results
+
+    def _report(self, alarm, result, trend, states, parameters, now):
+        # type: (Alarm, Tuple[bool, str], Optional[TrendingObject], Optional[MutableMapping[str, AlarmState]], Optional[dict], float) -> None
+        state, change = None, None
+        if states is not None:
+            key = self.stateKeys[alarm]
+            state = states.get(key)
+            if state is None:
+                state = states[key] = AlarmState()
+            change = alarm.updateState(state, result[0], now, parameters or {})
+        alarm.reportResult(result, trend, notifyParent=alarm.parent not in self._evaluated, state=state, change=change)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+""" Persistent state of an alarm for a trend.
+
+The state is stored in the database with the trending object, so it is kept between processing cycles.
+Only changes of the state are announced:
+
+- An alarm is raised after it was triggered in ``raiseAfter`` consecutive checks (debounce).
+- A raised alarm is only cleared after it wasn't triggered in ``clearAfter`` consecutive checks (hysteresis),
+  so a value which fluctuates around the threshold doesn't raise and clear the alarm in every cycle.
+- While the alarm is raised, a reminder is announced every ``renotifyInterval`` seconds (never if it is 0 or less).
+"""
+from persistent import Persistent
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+
+# Configuration keys of the default suppression settings.
+RAISE_AFTER = "alarmRaiseAfter"
+CLEAR_AFTER = "alarmClearAfter"
+RENOTIFY_INTERVAL = "alarmRenotifyInterval"
+
+OK = "OK"
+ALARM = "ALARM"
+
+# Changes which are announced.
+RAISED = "raised"
+CLEARED = "cleared"
+REMINDER = "reminder"
+
+
+class AlarmState(Persistent):
+    """ State of one alarm for one trend.
+
+    Attributes:
+        status (str): Either ``OK`` or ``ALARM``.
+        consecutiveAlarms (int): Number of consecutive checks in which the alarm was triggered (capped at
+            the number needed to raise it).
+        consecutiveOk (int): Number of consecutive checks in which the alarm wasn't triggered (capped at
+            the number needed to clear it).
+        since (float): Unix time of the last change of the status.
+        lastNotified (float): Unix time when the raised alarm was last announced.
+    """
+
+    def __init__(self):  # type: () -> None
+        self.status = OK
+        self.consecutiveAlarms = 0
+        self.consecutiveOk = 0
+        self.since = None  # type: Optional[float]
+        self.lastNotified = None  # type: Optional[float]
+
+    def _set(self, name, value):  # type: (str, Any) -> None
+        # Only assign changed values, so that unchanged states aren't written to the database again.
+        if getattr(self, name) != value:
+            setattr(self, name, value)
+
+    def update(self, isAlarm, now, raiseAfter=1, clearAfter=1, renotifyInterval=0):
+        # type: (bool, float, int, int, float) -> Optional[str]
+        """ Update the state with the result of a check.
+
+        Args:
+            isAlarm (bool): True if the alarm was triggered in this check.
+            now (float): Unix time of the check.
+            raiseAfter (int): Number of consecutive triggered checks needed to raise the alarm. Default: 1.
+            clearAfter (int): Number of consecutive checks without a trigger needed to clear the alarm. Default: 1.
+            renotifyInterval (float): Time in seconds between reminders while the alarm is raised. Default: 0 (never).
+        Returns:
+            str or None: ``RAISED``, ``CLEARED`` or ``REMINDER`` if the check should be announced, or None otherwise.
+        """
+        if isAlarm:
+            self._set("consecutiveAlarms", min(self.consecutiveAlarms + 1, raiseAfter))
+            self._set("consecutiveOk", 0)
+        else:
+            self._set("consecutiveOk", min(self.consecutiveOk + 1, clearAfter))
+            self._set("consecutiveAlarms", 0)
+
+        if self.status == OK:
+            if self.consecutiveAlarms >= raiseAfter:
+                self.status = ALARM
+                self.since = now
+                self.lastNotified = now
+                return RAISED
+        elif self.consecutiveOk >= clearAfter:
+            self.status = OK
+            self.since = now
+            return CLEARED
+        elif isAlarm and renotifyInterval > 0 and now - self.lastNotified >= renotifyInterval:
+            self.lastNotified = now
+            return REMINDER
+        return None
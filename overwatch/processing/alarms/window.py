@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+""" Rolling statistics over the most recent values of a trend.
+
+Alarms which only depend on the last N values of a trend are checked with an ``AlarmWindow``. Each new
+value updates the window in O(1), so checking an alarm doesn't need to rebuild an array of the trended
+values. Alarms with the same N share one window (see ``AlarmPlan``).
+"""
+import math
+from collections import deque
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+
+
+class AlarmWindow(object):
+    """ Sum, minimum, maximum and number of values in given ranges over the most recent values.
+
+    Args:
+        size (int): Maximum number of values in the window.
+
+    Attributes:
+        size (int): Maximum number of values in the window.
+        values (deque): Values in the window, ordered from oldest to newest.
+        total (float): Sum of the values in the window.
+        inRangeCounts (dict): Number of values in the window in each range added via ``addRange()``.
+            Keys are the (exclusive) ``(minVal, maxVal)`` bounds.
+        count (int): Number of values which have been pushed into the window, including those which left it.
+    """
+
+    def __init__(self, size):  # type: (int) -> None
+        self.size = max(int(size), 1)
+        self.values = deque()  # type: Deque[float]
+        self.total = 0.
+        self.inRangeCounts = {}  # type: Dict[Tuple[float, float], int]
+        self.count = 0
+        # Monotonic deques of (count, value), such that the front is the minimum (maximum) of the window.
+        self._minima = deque()  # type: Deque[Tuple[int, float]]
+        self._maxima = deque()  # type: Deque[Tuple[int, float]]
+
+    def addRange(self, minVal, maxVal):  # type: (float, float) -> None
+        """ Keep track of the number of values in (minVal, maxVal). """
+        if (minVal, maxVal) not in self.inRangeCounts:
+            self.inRangeCounts[(minVal, maxVal)] = sum(1 for value in self.values if minVal < value < maxVal)
+
+    def countInRange(self, minVal, maxVal):  # type: (float, float) -> int
+        """ Number of values in the window in (minVal, maxVal). The range must have been added via ``addRange()``. """
+        return self.inRangeCounts[(minVal, maxVal)]
+
+    def _updateRangeCounts(self, value, change):  # type: (float, int) -> None
+        for (minVal, maxVal) in self.inRangeCounts:
+            if minVal < value < maxVal:
+                self.inRangeCounts[(minVal, maxVal)] += change
+
+    def reset(self, count=0):  # type: (int) -> None
+        """ Remove all values, continuing the count from the given value. """
+        self.values.clear()
+        self._minima.clear()
+        self._maxima.clear()
+        self.total = 0.
+        for key in self.inRangeCounts:
+            self.inRangeCounts[key] = 0
+        self.count = count
+
+    def push(self, value):  # type: (float) -> None
+        """ Add a new value, removing the oldest value if the window is full. """
+        value = float(value)
+        self.values.append(value)
+        self.total += value
+        self._updateRangeCounts(value, 1)
+        while self._minima and self._minima[-1][1] >= value:
+            self._minima.pop()
+        self._minima.append((self.count, value))
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((self.count, value))
+        self.count += 1
+
+        if len(self.values) > self.size:
+            oldValue = self.values.popleft()
+            self.total -= oldValue
+            self._updateRangeCounts(oldValue, -1)
+        firstCount = self.count - len(self.values)
+        while self._minima[0][0] < firstCount:
+            self._minima.popleft()
+        while self._maxima[0][0] < firstCount:
+            self._maxima.popleft()
+
+        # Recalculate the sum once per window so that rounding errors can't accumulate.
+        if self.count % self.size == 0:
+            self.total = math.fsum(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def isFull(self):  # type: () -> bool
+        return len(self.values) >= self.size
+
+    def mean(self):  # type: () -> float
+        return self.total / len(self.values)
+
+    def minimum(self):  # type: () -> float
+        return self._minima[0][1]
+
+    def maximum(self):  # type: () -> float
+        return self._maxima[0][1]
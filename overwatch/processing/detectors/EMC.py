@@ -26,6 +26,8 @@ import numpy
 
 # Basic processing classes
 from .. import processingClasses
+# Bulk access to the bins for vectorized calculations
+from .. import histogramArrays
 
 # For retrieving debug configuration
 from ...base import config
@@ -810,11 +812,8 @@ def fastOROptions(subsystem, hist, processingOptions, **kwargs):
         hist.hist.SetLineColor(ROOT.kBlue + 1)
 
         # Find bins above the threshold
-        absIdList = []
-        for iBin in range(1, hist.hist.GetXaxis().GetNbins() + 1):
-            if hist.hist.GetBinContent(iBin) > threshold:
-                # Translate back from bin number (1, Nbins() + 1) to fastOR ID (0, Nbins())
-                absIdList.append(iBin - 1)
+        # The array doesn't include the underflow bin, so the index is already the fastOR ID (0, Nbins())
+        absIdList = [int(absId) for absId in numpy.flatnonzero(histogramArrays.binContents(hist.hist) > threshold)]
 
         hist.information["Threshold"] = threshold
         hist.information["Fast OR Hot Channels ID"] = absIdList
@@ -1196,16 +1195,8 @@ def hasSignalOutlier(hist):
     # Whether to include empty bins in mean/std dev calculation
     ignoreEmptyBins = False
     xbins = hist.GetNbinsX()
-    ybins = hist.GetNbinsY()
-    totalBins = xbins * ybins
-    signal = numpy.zeros(totalBins)
-
-    # Get bins for hist
-    for binX in range(1, xbins + 1):
-        for binY in range(1, ybins + 1):
-            binContent = hist.GetBinContent(binX, binY)
-            # Bins start at 1, arrays at 0
-            signal[(binX - 1) + (binY - 1) * xbins] = binContent
+    # Get bins for hist. Bins start at 1, arrays at 0, so bin (binX, binY) is at index (binX - 1) + (binY - 1) * xbins
+    signal = histogramArrays.binContents(hist).astype(numpy.float64).reshape(-1)
 
     # Change calculation technique depending on option and type of hist
     if ignoreEmptyBins:
@@ -1219,16 +1210,16 @@ def hasSignalOutlier(hist):
     threshUp = mean + stdev
     threshDown = mean - stdev
 
-    # index of outliers in signal array
-    outlierList = []
     # Determine if a bin is an outlier
-    for binX in range(1, xbins + 1):
-        for binY in range(1, ybins + 1):
-            amp = signal[(binX - 1) + (binY - 1) * xbins]
-            if(amp > threshUp or amp < threshDown):
-                if not ignoreEmptyBins or amp > 0:
-                    logger.info("bin (" + repr(binX) + "," + repr(binY) + ") has amplitude " + repr(amp) + "! This is outside of threshold, [" + '%.2f' % threshDown + "," + '%.2f' % threshUp + "]")
-                    outlierList.append((binX - 1) + (binY - 1) * xbins)
+    outliers = (signal > threshUp) | (signal < threshDown)
+    if ignoreEmptyBins:
+        outliers &= signal > 0
+    # index of outliers in signal array
+    outlierList = numpy.flatnonzero(outliers)
+    for index in outlierList:
+        binX = index % xbins + 1
+        binY = index // xbins + 1
+        logger.info("bin (" + repr(binX) + "," + repr(binY) + ") has amplitude " + repr(signal[index]) + "! This is outside of threshold, [" + '%.2f' % threshDown + "," + '%.2f' % threshUp + "]")
 
     # Exclude outliers and recalculate
     newSignal = numpy.delete(signal, outlierList)
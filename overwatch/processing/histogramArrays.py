@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+""" Helpers to access histogram bins as numpy arrays.
+
+Calling ``GetBinContent(...)`` for each bin from python is very slow for histograms with many bins
+(such as the EMC 2D maps). Instead, these functions provide numpy views of the underlying bin storage
+of a histogram, such that the bins can be accessed without copying and operated on with vectorized numpy.
+
+Note:
+    The arrays are views of memory owned by the ROOT histogram. They are only valid as long as the histogram
+    exists and isn't rebinned. Modifying the array modifies the histogram.
+"""
+
+# Python 2/3 support
+from __future__ import print_function
+
+import numpy as np
+import logging
+logger = logging.getLogger(__name__)
+
+# Map from the ROOT array class which stores the bin contents of a histogram to the corresponding numpy type.
+_histogramArrayTypes = [
+    ("TArrayD", np.float64),
+    ("TArrayF", np.float32),
+    ("TArrayI", np.int32),
+    ("TArrayS", np.int16),
+    ("TArrayC", np.int8),
+]
+
+def _bufferToArray(buffer, size, dtype):
+    """ Create a numpy view of a buffer returned by ROOT.
+
+    Args:
+        buffer (buffer): Buffer returned by ROOT for a C array.
+        size (int): Number of elements in the array.
+        dtype (numpy.dtype): Type of the elements in the array.
+    Returns:
+        numpy.ndarray: View of the buffer.
+    """
+    # The size of the C array isn't known to python, so it must be set before the buffer can be read.
+    # The method depends on the version of PyROOT.
+    if hasattr(buffer, "SetSize"):
+        buffer.SetSize(size)
+    elif hasattr(buffer, "reshape"):
+        buffer.reshape((size,))
+    return np.frombuffer(buffer, dtype = dtype, count = size)
+
+def _binShape(hist):
+    """ Determine the shape of the bin array, including the under- and overflow bins.
+
+    Args:
+        hist (ROOT.TH1): Histogram.
+    Returns:
+        tuple: Shape of the bins, ordered as (z, y, x) (for as many dimensions as the histogram has), such that
+            the bins can be indexed as ``[binY, binX]`` for a 2D histogram.
+    """
+    nBins = [hist.GetNbinsX() + 2, hist.GetNbinsY() + 2, hist.GetNbinsZ() + 2]
+    return tuple(reversed(nBins[:hist.GetDimension()]))
+
+def binContents(hist, includeFlowBins = False):
+    """ Retrieve the bin contents of a histogram as a numpy array without copying.
+
+    Args:
+        hist (ROOT.TH1): Histogram. It may be 1D, 2D, or 3D.
+        includeFlowBins (bool): If True, include the under- and overflow bins. Default: False.
+    Returns:
+        numpy.ndarray: Bin contents with shape (z, y, x) (for as many dimensions as the histogram has).
+            Without the flow bins, ``contents[binY - 1, binX - 1]`` corresponds to ``GetBinContent(binX, binY)``.
+
+    Raises:
+        TypeError: If the histogram doesn't store it's bins in a known array type.
+    """
+    for arrayType, dtype in _histogramArrayTypes:
+        if hist.InheritsFrom(arrayType):
+            contents = _bufferToArray(hist.GetArray(), hist.GetNcells(), dtype).reshape(_binShape(hist))
+            break
+    else:
+        raise TypeError("Unable to determine the bin storage type of {name}".format(name = hist.GetName()))
+
+    return contents if includeFlowBins else _removeFlowBins(contents)
+
+def binErrors(hist, includeFlowBins = False):
+    """ Retrieve the bin errors of a histogram as a numpy array.
+
+    If the histogram stores the sum of weights squared, the errors are calculated from it. Otherwise, the
+    errors are the square root of the bin contents (as in ROOT).
+
+    Args:
+        hist (ROOT.TH1): Histogram. It may be 1D, 2D, or 3D.
+        includeFlowBins (bool): If True, include the under- and overflow bins. Default: False.
+    Returns:
+        numpy.ndarray: Bin errors with the same shape as ``binContents(...)``.
+    """
+    if hist.GetSumw2N() > 0:
+        sumw2 = _bufferToArray(hist.GetSumw2().GetArray(), hist.GetNcells(), np.float64).reshape(_binShape(hist))
+        errors = np.sqrt(sumw2)
+    else:
+        errors = np.sqrt(np.abs(binContents(hist, includeFlowBins = True).astype(np.float64)))
+
+    return errors if includeFlowBins else _removeFlowBins(errors)
+
+def _removeFlowBins(array):
+    """ Remove the under- and overflow bins from each axis of the bin array.
+
+    Args:
+        array (numpy.ndarray): Bin array including the flow bins.
+    Returns:
+        numpy.ndarray: View of the array without the flow bins.
+    """
+    return array[tuple(slice(1, -1) for _ in range(array.ndim))]
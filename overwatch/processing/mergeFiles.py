@@ -15,8 +15,10 @@ from future.utils import iteritems
 
 # General
 import copy
+import multiprocessing
 import os
 import shutil
+import tempfile
 import logging
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -24,9 +26,14 @@ logger = logging.getLogger(__name__)
 # ROOT
 import ROOT
 
+# ZODB
+import BTrees.OOBTree
+
 from . import processingClasses
+from .alarms.delivery import alarmDeliveryQueue
 
-def merge(currentDir, run, subsystem, cumulativeMode = True, timeSlice = None):
+def merge(currentDir, run, subsystem, cumulativeMode = True, timeSlice = None, inMemory = False,
+          nWorkers = 1, chunkSize = 20, outputFilename = None):
     """ For a given run and subsystem, handles merging of files into a "combined file" which
     is suitable for processing.
 
@@ -45,7 +52,10 @@ def merge(currentDir, run, subsystem, cumulativeMode = True, timeSlice = None):
     For cumulative mode, the combined objects are created in two different ways: 1) For a standard
     combined file, by simply copying the most recent file (because it contains data covering the entire
     run); 2) For time slices, by subtracting the objects in two corresponding ROOT files. For reset
-    mode, ``TFileMerger`` is used to merge all files within the available timestamps together.
+    mode, ``TFileMerger`` is used to merge all files within the available timestamps together. Many files
+    are merged via a tree reduction in parallel (see ``treeMergeFiles()``). If a combined file already
+    exists in reset mode, only the files which have not yet been folded into it (as recorded in
+    ``subsystemContainer.mergedFileTimes``) are merged into it.
 
     This function also handles merging files for time slices. The relevant parameters should be specified
     in a ``timeSliceContainer``. The min and max requested times are extracted, and this function only
@@ -65,8 +75,16 @@ def merge(currentDir, run, subsystem, cumulativeMode = True, timeSlice = None):
             "request/reset mode". Default: True.
         timeSlice (processingClasses.timeSliceContainer): Stores the properties of the requested time slice. If not specified,
             it will be ignored and it will create a standard "combined file". Default: None
+        inMemory (bool): If True, time slices which are created by subtraction are stored in a ROOT memory file
+            rather than being written to disk. The time slice file can be written later if it is requested.
+            Default: False.
+        nWorkers (int): Number of worker processes used to merge files in reset mode. Default: 1.
+        chunkSize (int): Maximum number of files merged together in one merge step in reset mode. Default: 20.
+        outputFilename (str): Full path where the time slice file should be written. Only used for time slices.
+            Default: None, which writes it to the path of the time slice in the subsystem directory.
     Returns:
-        None: On success, ``None`` is returned. Otherwise, an exception is raise.
+        ROOT.TMemFile or None: If a time slice was created in memory, the memory file containing it is returned.
+            Otherwise, ``None`` is returned on success. If there is a problem, an exception is raised.
 
     Raises:
         ValueError: If the number of input files doesn't match the number of files in the merger. Perhaps if a
@@ -92,8 +110,13 @@ def merge(currentDir, run, subsystem, cumulativeMode = True, timeSlice = None):
     if cumulativeMode and timeSlice and timeSlice.minUnixTimeAvailable != subsystem.startOfRun:
         earliestFile = filesToMerge[0].filename
         latestFile = filesToMerge[-1].filename
+        if inMemory:
+            logger.info("Completed time slicing via subtraction in memory!")
+            return subtractFilesInMemory(os.path.join(currentDir, earliestFile),
+                                         os.path.join(currentDir, latestFile),
+                                         timeSlice.filename.filename)
         # Subtract latestFile from earliestFile
-        timeSlicesFilename = os.path.join(currentDir, subsystem.baseDir, timeSlice.filename.filename)
+        timeSlicesFilename = outputFilename or os.path.join(currentDir, subsystem.baseDir, timeSlice.filename.filename)
         subtractFiles(os.path.join(currentDir, earliestFile),
                       os.path.join(currentDir, latestFile),
                       timeSlicesFilename)
@@ -104,51 +127,248 @@ def merge(currentDir, run, subsystem, cumulativeMode = True, timeSlice = None):
         # Take the most recent file
         filesToMerge = [filesToMerge[-1]]
 
-    # Merging using root. We use this for multiple files, but will skip it
-    # if we are only copying one file.
-    merger = ROOT.TFileMerger()
-
-    # Determine the files to merge
-    if len(filesToMerge) == 1:
-        # This is often cumulative mode, but could also be reset mode with only 1 file
-        numberOfFiles = len(filesToMerge)
-    else:
-        # If more than one file (almost assuredly reset mode), merge everything
-        for fileCont in filesToMerge:
-            logger.info("Added file {} to merger".format(fileCont.filename))
-            merger.AddFile(fileCont.filename)
-
-        numberOfFiles = merger.GetMergeList().GetEntries()
-        if numberOfFiles != len(filesToMerge):
-            errorMessage = "Problems encountered when adding files to merger! Number of input files ({}) do not match number in merger ({})!".format(len(filesToMerge), numberOfFiles)
-            logger.error(errorMessage)
-            raise ValueError(errorMessage)
-
+    # In reset mode, we keep a running merge. If the combined file is available and we know which files it
+    # contains, we only need to merge the files which have not yet been folded into it.
+    runningMerge = not cumulativeMode and not timeSlice
+    previousCombinedFile = None
+    previousFileTimes = []
+    if runningMerge and subsystem.combinedFile and subsystem.mergedFileTimes is not None \
+            and os.path.exists(os.path.join(currentDir, subsystem.combinedFile.filename)):
+        previousCombinedFile = subsystem.combinedFile
+        previousFileTimes = list(subsystem.mergedFileTimes)
+        filesToMerge = [fileCont for fileCont in filesToMerge if fileCont.fileTime not in subsystem.mergedFileTimes]
+        if not filesToMerge:
+            logger.info("Combined file {} is already up to date.".format(previousCombinedFile.filename))
+            return None
+
+    numberOfFiles = len(previousFileTimes) + len(filesToMerge)
     if timeSlice:
         filePath = os.path.join(subsystem.baseDir, timeSlice.filename.filename)
     else:
         # Define convenient variable
-        maxFilteredTimeStamp = filesToMerge[-1].fileTime
+        # Files may arrive out of order, so we need to account for the files that were already merged.
+        maxFilteredTimeStamp = max([filesToMerge[-1].fileTime] + previousFileTimes)
         filePath = os.path.join(subsystem.baseDir, "hists.combined.{}.{}.root".format(numberOfFiles, maxFilteredTimeStamp))
-    outFile = os.path.join(currentDir, filePath)
+    outFile = outputFilename if timeSlice and outputFilename else os.path.join(currentDir, filePath)
     logger.info("Number of files to be merged: {}".format(numberOfFiles))
     logger.info("Output file: {}".format(outFile))
 
     # Set the output and perform the actual merge
-    if numberOfFiles == 1:
+    inputFilenames = [os.path.join(currentDir, fileCont.filename) for fileCont in filesToMerge]
+    if previousCombinedFile:
+        logger.info("Merging {} new file(s) into {}".format(len(filesToMerge), previousCombinedFile.filename))
+        inputFilenames.insert(0, os.path.join(currentDir, previousCombinedFile.filename))
+    if len(inputFilenames) == 1:
+        # This is often cumulative mode, but could also be reset mode with only 1 file
         # Avoid errors with TFileMerger and only one file.
         # Plus, performance should be better
-        shutil.copy(os.path.join(currentDir, filesToMerge[0].filename), outFile)
+        linkOrCopyFile(inputFilenames[0], outFile)
     else:
-        merger.OutputFile(outFile)
-        merger.Merge()
+        # If more than one file (almost assuredly reset mode), merge everything
+        treeMergeFiles(inputFilenames, outFile, nWorkers = nWorkers, chunkSize = chunkSize)
     logger.info("Merging complete!")
 
+    if runningMerge:
+        # The previous combined file has now been replaced by the new combined file, so it can be removed.
+        # If we didn't know which files it contained, it was rebuilt from scratch, so it is removed as well.
+        if subsystem.combinedFile and subsystem.combinedFile.filename != filePath \
+                and os.path.exists(os.path.join(currentDir, subsystem.combinedFile.filename)):
+            logger.info("Removing previous merged file {}".format(subsystem.combinedFile.filename))
+            os.remove(os.path.join(currentDir, subsystem.combinedFile.filename))
+        # Record which files have been folded into the combined file.
+        if previousCombinedFile is None:
+            subsystem.mergedFileTimes = BTrees.OOBTree.OOTreeSet()
+        subsystem.mergedFileTimes.update([fileCont.fileTime for fileCont in filesToMerge])
+    elif not timeSlice:
+        # The combined file is just the most recent file, so there is no running merge to keep track of.
+        subsystem.mergedFileTimes = None
+
     # Add combined file to the subsystem
     if not timeSlice:
         subsystem.combinedFile = processingClasses.fileContainer(filePath, startOfRun = subsystem.startOfRun)
     return None
 
+def linkOrCopyFile(source, destination):
+    """ Make a file available at a new path without copying the data if possible.
+
+    A hard link is created if possible, such that the operation is O(1) in both I/O and disk usage.
+    If a hard link is not possible (for example, if the paths are on different file systems), the
+    file is copied.
+
+    Note:
+        The received files are never modified after they are received, so it is safe for the combined
+        file to share the data with the received file.
+
+    Args:
+        source (str): Path to the existing file.
+        destination (str): Path where the file should be made available. It is replaced if it already exists.
+    Returns:
+        None.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except (OSError, AttributeError) as e:
+        # AttributeError is for platforms where ``os.link`` isn't available.
+        logger.debug("Unable to link {} to {} ({}). Copying instead.".format(source, destination, e))
+        shutil.copy(source, destination)
+
+def mergeFilesWithTFileMerger(inputFilenames, outputFilename):
+    """ Merge the given ROOT files into one output file using ``TFileMerger``.
+
+    Args:
+        inputFilenames (list): Filenames of the files to be merged.
+        outputFilename (str): Filename where the merged output should be written.
+    Returns:
+        str: Filename of the merged output.
+
+    Raises:
+        ValueError: If the number of input files doesn't match the number of files in the merger, or if the
+            merge failed. Perhaps if a file is inaccessible.
+    """
+    merger = ROOT.TFileMerger()
+    for filename in inputFilenames:
+        logger.debug("Added file {} to merger".format(filename))
+        merger.AddFile(filename)
+
+    numberOfFiles = merger.GetMergeList().GetEntries()
+    if numberOfFiles != len(inputFilenames):
+        errorMessage = "Problems encountered when adding files to merger! Number of input files ({}) do not match number in merger ({})!".format(len(inputFilenames), numberOfFiles)
+        logger.error(errorMessage)
+        raise ValueError(errorMessage)
+
+    merger.OutputFile(outputFilename)
+    if not merger.Merge():
+        errorMessage = "Merging into {} failed!".format(outputFilename)
+        logger.error(errorMessage)
+        raise ValueError(errorMessage)
+
+    return outputFilename
+
+def _mergeFilesInWorker(task):
+    """ Merge one chunk of files in a merge worker process.
+
+    Args:
+        task (tuple): ``(inputFilenames, outputFilename)``. See ``mergeFilesWithTFileMerger()``.
+    Returns:
+        str: Filename of the merged output.
+    """
+    inputFilenames, outputFilename = task
+    return mergeFilesWithTFileMerger(inputFilenames, outputFilename)
+
+def treeMergeFiles(inputFilenames, outputFilename, nWorkers = 1, chunkSize = 20):
+    """ Merge many ROOT files via a tree reduction, with each level of the tree merged in parallel.
+
+    The input files are split into chunks of at most ``chunkSize`` files, and each chunk is merged into
+    a partial file by a pool of worker processes. The partial files are then merged in the same manner
+    until there are few enough to merge them directly into the output file. The partial files are stored
+    in a temporary directory next to the output file, which is removed when the merge is complete.
+
+    Args:
+        inputFilenames (list): Filenames of the files to be merged.
+        outputFilename (str): Filename where the merged output should be written.
+        nWorkers (int): Number of worker processes. If 1, the chunks are merged in this process. Default: 1.
+        chunkSize (int): Maximum number of files to merge together in one step. Default: 20.
+    Returns:
+        None.
+
+    Raises:
+        ValueError: If any of the merges failed.
+    """
+    # At least two files must be merged in each step to ensure that the tree reduces.
+    chunkSize = max(chunkSize, 2)
+    currentFilenames = list(inputFilenames)
+    pool = None
+    if nWorkers > 1 and len(currentFilenames) > chunkSize:
+        # The alarm delivery thread must not run while the workers are forked.
+        with alarmDeliveryQueue.suspended():
+            pool = multiprocessing.Pool(nWorkers)
+    # Starts with "." so that the partial files are never mistaken for received files.
+    tempDir = tempfile.mkdtemp(prefix = ".merge", dir = os.path.dirname(outputFilename) or None)
+    try:
+        level = 0
+        while len(currentFilenames) > chunkSize:
+            tasks = []
+            partialFilenames = []
+            for index, start in enumerate(range(0, len(currentFilenames), chunkSize)):
+                chunk = currentFilenames[start:start + chunkSize]
+                if len(chunk) == 1:
+                    # Nothing to merge, so just pass it on to the next level.
+                    partialFilenames.append(chunk[0])
+                    continue
+                partialFilename = os.path.join(tempDir, "partial.{}.{}.root".format(level, index))
+                tasks.append((chunk, partialFilename))
+                partialFilenames.append(partialFilename)
+            logger.debug("Merging {} files in {} chunks at level {}".format(len(currentFilenames), len(tasks), level))
+            if pool:
+                pool.map(_mergeFilesInWorker, tasks)
+            else:
+                for task in tasks:
+                    _mergeFilesInWorker(task)
+            currentFilenames = partialFilenames
+            level += 1
+
+        mergeFilesWithTFileMerger(currentFilenames, outputFilename)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        shutil.rmtree(tempDir, ignore_errors = True)
+
+def _histogramKeysByPath(directory, classCache, prefix = ""):
+    """ Index the histogram keys in a ROOT directory by their path, including those in subdirectories.
+
+    Only the highest cycle of each histogram is kept.
+
+    Args:
+        directory (ROOT.TDirectory): Directory (or file) containing the keys.
+        classCache (dict): Cache of the type of object (``"dir"``, ``"hist"``, or ``None``) stored under each
+            class name, so that we only need to look up each class once. It is updated in place.
+        prefix (str): Path of the directory within the file. Default: "".
+    Returns:
+        dict: Keys of the histograms, indexed by their path within the file (ex. ``TPCQA/histName``).
+    """
+    keys = {}
+    for key in directory.GetListOfKeys():
+        className = key.GetClassName()
+        if className not in classCache:
+            classOfObject = ROOT.gROOT.GetClass(className)
+            objectType = None
+            if classOfObject:
+                if classOfObject.InheritsFrom(ROOT.TDirectory.Class()):
+                    objectType = "dir"
+                elif classOfObject.InheritsFrom(ROOT.TH1.Class()):
+                    objectType = "hist"
+            classCache[className] = objectType
+
+        path = prefix + key.GetName()
+        if classCache[className] == "dir":
+            keys.update(_histogramKeysByPath(key.ReadObj(), classCache, prefix = path + "/"))
+        elif classCache[className] == "hist":
+            # Ensure that we only take histograms (we would expect such, but better to check for safety)
+            if path not in keys or key.GetCycle() > keys[path].GetCycle():
+                keys[path] = key
+
+    return keys
+
+def _getOrCreateDirectory(fOut, path):
+    """ Retrieve a (potentially nested) directory in a ROOT file, creating it if necessary.
+
+    Args:
+        fOut (ROOT.TFile): File in which the directory should be stored.
+        path (str): Path of the directory within the file. An empty path corresponds to the file itself.
+    Returns:
+        ROOT.TDirectory: The requested directory.
+    """
+    directory = fOut
+    for name in [name for name in path.split("/") if name]:
+        subdirectory = directory.GetDirectory(name)
+        if not subdirectory:
+            subdirectory = directory.mkdir(name)
+        directory = subdirectory
+    return directory
+
 def subtractFiles(minFile, maxFile, outfile):
     """ Subtract histograms in one file from matching histograms in another.
 
@@ -160,7 +380,9 @@ def subtractFiles(minFile, maxFile, outfile):
     is already stored in the most recent file.
 
     Note:
-        The names of the histograms in each file must match exactly for them to be subtracted.
+        The names of the histograms in each file must match exactly for them to be subtracted. Histograms
+        stored in subdirectories (such as ``TPCQA/``) are matched by their full path, and are written into
+        the same subdirectory in the output file.
 
     Note:
         The output file is opened with "RECREATE", so it will always overwrite an existing
@@ -174,44 +396,63 @@ def subtractFiles(minFile, maxFile, outfile):
         None.
     """
 
-    fMin = ROOT.TFile(minFile, "READ")
-    fMax = ROOT.TFile(maxFile, "READ")
     fOut = ROOT.TFile(outfile, "RECREATE")
+    _subtractFilesIntoDirectory(minFile, maxFile, fOut)
+    fOut.Close()
 
-    # Read in available keys in the file
-    keysMinFile = fMin.GetListOfKeys()
-    keysMaxFile = fMax.GetListOfKeys()
+def subtractFilesInMemory(minFile, maxFile, name):
+    """ Subtract histograms in one file from matching histograms in another, storing the result in memory.
 
-    # Loop through both files, and subtract matching pairs of hists
-    for keyMin in keysMinFile:
-        # Ensure that we only take histograms (we would expect such, but better to check for safety)
-        classOfObject = ROOT.gROOT.GetClass(keyMin.GetClassName())
-        if not classOfObject.InheritsFrom(ROOT.TH1.Class()):
-            continue
+    This is the same as ``subtractFiles(...)``, except that the result is stored in a ``TMemFile``, which
+    avoids writing and then immediately reading the output from disk.
 
-        minHistName = keyMin.GetName()
+    Args:
+        minFile (str): Filename of the ROOT file containing data to be subtracted.
+        maxFile (str): Filename of the ROOT file containing data to to subtracted from.
+        name (str): Name of the memory file.
+    Returns:
+        ROOT.TMemFile: Memory file containing the subtracted histograms. It should be closed by the caller.
+    """
+    fOut = ROOT.TMemFile(name, "RECREATE")
+    _subtractFilesIntoDirectory(minFile, maxFile, fOut)
+    return fOut
 
-        for keyMax in keysMaxFile:
-            # Ensure that we only take histograms
-            classOfObject = ROOT.gROOT.GetClass(keyMin.GetClassName())
-            if not classOfObject.InheritsFrom(ROOT.TH1.Class()):
-                continue
+def _subtractFilesIntoDirectory(minFile, maxFile, fOut):
+    """ Subtract matching histograms in the given files and write the result into an output file.
 
-            maxHistName = keyMax.GetName()
-            if minHistName == maxHistName:
-                minHist = keyMin.ReadObj()
-                maxHist = keyMax.ReadObj()
+    Args:
+        minFile (str): Filename of the ROOT file containing data to be subtracted.
+        maxFile (str): Filename of the ROOT file containing data to to subtracted from.
+        fOut (ROOT.TFile): Already opened file where the subtracted histograms will be written.
+    Returns:
+        None.
+    """
+    fMin = ROOT.TFile(minFile, "READ")
+    fMax = ROOT.TFile(maxFile, "READ")
 
-                # Subtract the earlier hist from the later hist
-                maxHist.Add(minHist, -1)
-                fOut.cd()
-                maxHist.Write()
+    # Index the available histograms by their path in the file so that we can match them directly.
+    classCache = {}
+    keysMinFile = _histogramKeysByPath(fMin, classCache)
+    keysMaxFile = _histogramKeysByPath(fMax, classCache)
+
+    # Subtract matching pairs of hists
+    for path, keyMin in iteritems(keysMinFile):
+        keyMax = keysMaxFile.get(path)
+        if keyMax is None:
+            continue
+
+        minHist = keyMin.ReadObj()
+        maxHist = keyMax.ReadObj()
+
+        # Subtract the earlier hist from the later hist
+        maxHist.Add(minHist, -1)
+        _getOrCreateDirectory(fOut, os.path.dirname(path)).cd()
+        maxHist.Write()
 
     fMin.Close()
     fMax.Close()
-    fOut.Close()
 
-def mergeRootFiles(runs, dirPrefix, forceNewMerge = False, cumulativeMode = True):
+def mergeRootFiles(runs, dirPrefix, forceNewMerge = False, cumulativeMode = True, nWorkers = 1, chunkSize = 20, runDirs = None):
     """ Driver function for creating combined files for each subsystem within a given set of runs.
 
     For a given list of runs, this function will iterate over all available subsystems, merging or
@@ -229,13 +470,22 @@ def mergeRootFiles(runs, dirPrefix, forceNewMerge = False, cumulativeMode = True
         cumulativeMode (bool): Specifies whether the histograms we receive are cumulative or if they
             have been reset between each acquired ROOT file, i.e. whether we merge in "subscribe mode" or
             "request/reset mode". See ``merge()`` for further information on this mode. Default: True.
+        nWorkers (int): Number of worker processes used to merge files in reset mode. Default: 1.
+        chunkSize (int): Maximum number of files merged together in one merge step in reset mode. Default: 20.
+        runDirs (list): Run directories of the runs which contain subsystems with new files. Only these runs
+            are checked (and therefore loaded from the database), unless ``forceNewMerge`` is set. Default: None,
+            which checks all runs.
     Returns:
         None
     """
     currentDir = dirPrefix
 
+    if runDirs is None or forceNewMerge:
+        runDirs = list(runs.keys())
+
     # Process runs
-    for runDir, run in iteritems(runs):
+    for runDir in runDirs:
+        run = runs[runDir]
         for subsystem in run.subsystems:
             # Only merge if we there are new files to merge
             if run.subsystems[subsystem].newFile is True or forceNewMerge:
@@ -257,14 +507,17 @@ def mergeRootFiles(runs, dirPrefix, forceNewMerge = False, cumulativeMode = True
                 #   In REQ mode, compare combined file merge count with number of uncombined files
 
                 logger.info("Need to merge {}, {} again".format(runDir, subsystem))
-                if combinedFile:
+                # In reset mode, the previous combined file is kept so the new files can be merged into it.
+                # It is removed by ``merge()`` once the new combined file is created.
+                if combinedFile and (cumulativeMode or forceNewMerge):
                     logger.info("Removing previous merged file {}".format(combinedFile.filename))
                     os.remove(os.path.join(currentDir, combinedFile.filename))
                     # Remove from the file list
                     run.subsystems[subsystem].combinedFile = None
 
                 # Perform the actual merge
-                merge(currentDir, run, run.subsystems[subsystem], cumulativeMode)
+                merge(currentDir, run, run.subsystems[subsystem], cumulativeMode,
+                      nWorkers = nWorkers, chunkSize = chunkSize)
 
                 # We have successfully merged!
                 # Still considered a new file until we have processed it entirely, so don't change state here
@@ -34,6 +34,7 @@ ROOT.gROOT.ProcessLine("gErrorIgnoreLevel = kWarning;")
 # General includes
 import copy
 import hashlib
+import multiprocessing
 import os
 import uuid
 import logging
@@ -50,14 +51,18 @@ from ..base import config
 
 # Module includes
 from ..base import utilities
+from . import histogramArrays
 from . import mergeFiles
 from . import pluginManager
 from . import processingClasses
+from .alarms.delivery import alarmDeliveryQueue
+from .profiler import profiler
 from .trending.manager import TrendingManager
 
 
 def processRootFile(filename, outputFormatting, subsystem, processingOptions = None,
-                    forceRecreateSubsystem = False, trendingManager = None):
+                    forceRecreateSubsystem = False, trendingManager = None, imageRenderer = None, inputFile = None,
+                    skipUnchangedHists = True):
     """ Given a root file, process all histograms for a given subsystem.
 
     Processing includes assigning the contained histograms to a subsystem, allowing for customization via
@@ -92,17 +97,17 @@ def processRootFile(filename, outputFormatting, subsystem, processingOptions = N
             it will use the default subsystem processing options.
         forceRecreateSubsystem (bool): True if subsystems will be recreated, even if they already exist.
         trendingManager (TrendingManager): Manages the trending subsystem.
+        imageRenderer (imageRenderer): Renders images asynchronously in a pool of worker processes. If ``None``,
+            images are written directly. Default: ``None``.
+        inputFile (ROOT.TFile): Already opened file (such as a ``TMemFile``) to process instead of opening
+            ``filename``. It will be closed when processing is complete. Default: ``None``.
+        skipUnchangedHists (bool): If False, all histograms are written, regardless of whether they are unchanged
+            since they were last written. See ``processHist()``. Default: True.
     Returns:
         None. However, the underlying subsystems, histograms, etc, are modified.
     """
     # The file with the new histograms
-    fIn = ROOT.TFile(filename, "READ")
-
-    # Read in available keys in the file
-    keysInFile = fIn.GetListOfKeys()
-
-    # Sorts keys so that we can have consistency when histograms are processed.
-    keysInFile.Sort()
+    fIn = inputFile if inputFile is not None else ROOT.TFile(filename, "READ")
 
     if forceRecreateSubsystem:
         # Clear the stored hist information so we can recreate (reprocess) the subsystem
@@ -112,80 +117,7 @@ def processRootFile(filename, outputFormatting, subsystem, processingOptions = N
     # Only need to do this the first time for each run
     # We know it is the first run if there are no histograms for this subsystem.
     if not subsystem.hists:
-        for key in keysInFile:
-            classOfObject = ROOT.TClass.GetClass(key.GetClassName())
-            if classOfObject.InheritsFrom(ROOT.TH1.Class()):
-                # Create histogram object
-                hist = processingClasses.histogramContainer(key.GetName())
-                # Wait to read the object until we are actually going to process it.
-                hist.hist = None
-                hist.canvas = None
-                # However, store the object type so we know how to configure it without the underlying
-                # hist being available.
-                hist.histType = classOfObject
-
-                # Store the histogram container so we can continue processing.
-                subsystem.histsInFile[hist.histName] = hist
-
-                # Extract the number of events if the proper histogram is available.
-                # NOTE: This requires other histograms not to have "events" in their name,
-                #       but so far (Aug 2018), this seems to be a reasonable assumption.
-                if "events" in hist.histName.lower():
-                    subsystem.nEvents = key.ReadObj().GetBinContent(1)
-
-        # Create additional histograms
-        #logger.debug("pre  create additional histsAvailable: {}".format(", ".join(subsystem.histsAvailable.keys())))
-        pluginManager.createAdditionalHistograms(subsystem)
-        #logger.debug("post create additional histsAvailable: {}".format(", ".join(subsystem.histsAvailable.keys())))
-
-        # Create the subsystem stacks
-        pluginManager.createHistogramStacks(subsystem)
-
-        # Customize histogram traits
-        pluginManager.setHistogramOptions(subsystem)
-
-        # Create histogram sorting groups
-        if not subsystem.histGroups:
-            sortingSuccess = pluginManager.createHistGroups(subsystem)
-            if sortingSuccess is False:
-                logger.debug("Subsystem {subsystem} does not have a sorting function. Adding all histograms into one group!".format(subsystem = subsystem.subsystem))
-
-                if subsystem.fileLocationSubsystem != subsystem.subsystem:
-                    selection = subsystem.subsystem
-                else:
-                    # NOTE: In addition to being a normal option, this ensures that the HLT will always catch all
-                    #       extra histograms from HLT files!
-                    #       However, having this selection for other subsystems is dangerous, because it will include
-                    #       many unrelated hists
-                    selection = ""
-                logger.info("selection: {selection}".format(selection = selection))
-                subsystem.histGroups.append(processingClasses.histogramGroupContainer(subsystem.subsystem + " Histograms", selection))
-
-        # See how we've done.
-        logger.debug("post groups histsAvailable: {}".format(", ".join(subsystem.histsAvailable.keys())))
-
-        # Finally classify into the groups and determine which functions to apply
-        for hist in subsystem.histsAvailable.values():
-            # Add the histogram name to the proper group
-            classifiedHist = False
-            for group in subsystem.histGroups:
-                if group.selectionPattern in hist.histName:
-                    group.histList.append(hist.histName)
-                    classifiedHist = True
-                    # Break so that we don't have multiple copies of hists!
-                    break
-
-            # See if we've classified successfully.
-            logger.debug("{subsystem} hist: {histName} - classified: {classifiedHist}".format(subsystem = subsystem.subsystem, histName = hist.histName, classifiedHist = classifiedHist))
-
-            if classifiedHist:
-                # Determine the processing functions to apply
-                pluginManager.findFunctionsForHist(subsystem, hist)
-                # Add it to the subsystem
-                subsystem.hists[hist.histName] = hist
-            else:
-                # We don't want to process histograms which haven't been defined.
-                logger.debug("Skipping histogram {} since it is not classifiable for subsystem {}".format(hist.histName, subsystem.subsystem))
+        createHistogramContainers(subsystem = subsystem, fIn = fIn)
 
     # Set the proper processing options
     # If it was passed in, it was probably from time slices
@@ -197,24 +129,29 @@ def processRootFile(filename, outputFormatting, subsystem, processingOptions = N
     # Start of run should unique to each run!
     canvas = ROOT.TCanvas("processRunsCanvas{}{}".format(subsystem.subsystem, subsystem.startOfRun),
                           "processRunsCanvas{}{}".format(subsystem.subsystem, subsystem.startOfRun))
+    # Run directory, for labeling the histogram timings.
+    runDir = getattr(subsystem, "baseDir", "").split(os.sep)[0]
     # Loop over histograms and draw
     for histGroup in subsystem.histGroups:
         for histName in histGroup.histList:
             # Retrieve histogram container and underlying histogram
             hist = subsystem.hists[histName]
-            retrievedHist = hist.retrieveHistogram(fIn = fIn, ROOT = ROOT)
-            if not retrievedHist:
-                # We first log at info level so the information is available, and then we fire a warning
-                # at the warning level. We've split these up so that the warning doesn't end up as a different
-                # entry in sentry for every different histogram.
-                logger.info("Could not retrieve histogram for hist {}, histList: {}".format(hist.histName, hist.histList))
-                # Disable the warning level log - it seems that this can happen at times when a file just lacks
-                # the file for whatever reason (even if it was present before in the same). The best we can do is log
-                # it internally (ie not to sentry) and continue.
-                #logger.warning("Could not retrieve histogram!")
-                continue
-            processHist(subsystem = subsystem, hist = hist, canvas = canvas, outputFormatting = outputFormatting,
-                        processingOptions = processingOptions, trendingManager = trendingManager)
+            with profiler.histogram(subsystem.subsystem, runDir, histName):
+                with profiler.stage("retrieveHistogram"):
+                    retrievedHist = hist.retrieveHistogram(fIn = fIn, ROOT = ROOT)
+                if not retrievedHist:
+                    # We first log at info level so the information is available, and then we fire a warning
+                    # at the warning level. We've split these up so that the warning doesn't end up as a different
+                    # entry in sentry for every different histogram.
+                    logger.info("Could not retrieve histogram for hist {}, histList: {}".format(hist.histName, hist.histList))
+                    # Disable the warning level log - it seems that this can happen at times when a file just lacks
+                    # the file for whatever reason (even if it was present before in the same). The best we can do is log
+                    # it internally (ie not to sentry) and continue.
+                    #logger.warning("Could not retrieve histogram!")
+                    continue
+                processHist(subsystem = subsystem, hist = hist, canvas = canvas, outputFormatting = outputFormatting,
+                            processingOptions = processingOptions, trendingManager = trendingManager,
+                            imageRenderer = imageRenderer, skipUnchangedHists = skipUnchangedHists)
 
     # Delete the canvas. Although ROOT will mostly likely handle this eventually, the
     # garbage collection doesn't have to happen immediately. So we help it out by explictly
@@ -225,8 +162,103 @@ def processRootFile(filename, outputFormatting, subsystem, processingOptions = N
     # Since we are done, we can cleanup by closing the file.
     fIn.Close()
 
+def createHistogramContainers(subsystem, fIn):
+    """ Create and classify the histogram containers of a subsystem based on the histograms in a file.
+
+    The histogram containers are created for the histograms in the file, and then the plugins create the
+    additional histograms, histogram stacks, histogram options, and histogram groups. The available histograms
+    are then sorted into the groups, and the functions to apply are determined for each classified histogram.
+    See ``processRootFile()`` for further information.
+
+    Args:
+        subsystem (subsystemContainer): Subsystem where the histogram containers will be stored.
+        fIn (ROOT.TFile): File which contains the histograms of the subsystem.
+    Returns:
+        None. However, the histogram containers and groups of the subsystem are filled.
+    """
+    # Read in available keys in the file
+    keysInFile = fIn.GetListOfKeys()
+
+    # Sorts keys so that we can have consistency when histograms are processed.
+    keysInFile.Sort()
+
+    for key in keysInFile:
+        classOfObject = ROOT.TClass.GetClass(key.GetClassName())
+        if classOfObject.InheritsFrom(ROOT.TH1.Class()):
+            # Create histogram object
+            hist = processingClasses.histogramContainer(key.GetName())
+            # Wait to read the object until we are actually going to process it.
+            hist.hist = None
+            hist.canvas = None
+            # However, store the object type so we know how to configure it without the underlying
+            # hist being available.
+            hist.histType = classOfObject
+
+            # Store the histogram container so we can continue processing.
+            subsystem.histsInFile[hist.histName] = hist
+
+            # Extract the number of events if the proper histogram is available.
+            # NOTE: This requires other histograms not to have "events" in their name,
+            #       but so far (Aug 2018), this seems to be a reasonable assumption.
+            if "events" in hist.histName.lower():
+                subsystem.nEvents = key.ReadObj().GetBinContent(1)
+
+    # Create additional histograms
+    #logger.debug("pre  create additional histsAvailable: {}".format(", ".join(subsystem.histsAvailable.keys())))
+    pluginManager.createAdditionalHistograms(subsystem)
+    #logger.debug("post create additional histsAvailable: {}".format(", ".join(subsystem.histsAvailable.keys())))
+
+    # Create the subsystem stacks
+    pluginManager.createHistogramStacks(subsystem)
+
+    # Customize histogram traits
+    pluginManager.setHistogramOptions(subsystem)
+
+    # Create histogram sorting groups
+    if not subsystem.histGroups:
+        sortingSuccess = pluginManager.createHistGroups(subsystem)
+        if sortingSuccess is False:
+            logger.debug("Subsystem {subsystem} does not have a sorting function. Adding all histograms into one group!".format(subsystem = subsystem.subsystem))
+
+            if subsystem.fileLocationSubsystem != subsystem.subsystem:
+                selection = subsystem.subsystem
+            else:
+                # NOTE: In addition to being a normal option, this ensures that the HLT will always catch all
+                #       extra histograms from HLT files!
+                #       However, having this selection for other subsystems is dangerous, because it will include
+                #       many unrelated hists
+                selection = ""
+            logger.info("selection: {selection}".format(selection = selection))
+            subsystem.histGroups.append(processingClasses.histogramGroupContainer(subsystem.subsystem + " Histograms", selection))
+
+    # See how we've done.
+    logger.debug("post groups histsAvailable: {}".format(", ".join(subsystem.histsAvailable.keys())))
+
+    # Finally classify into the groups and determine which functions to apply
+    for hist in subsystem.histsAvailable.values():
+        # Add the histogram name to the proper group
+        classifiedHist = False
+        for group in subsystem.histGroups:
+            if group.selectionPattern in hist.histName:
+                group.histList.append(hist.histName)
+                classifiedHist = True
+                # Break so that we don't have multiple copies of hists!
+                break
+
+        # See if we've classified successfully.
+        logger.debug("{subsystem} hist: {histName} - classified: {classifiedHist}".format(subsystem = subsystem.subsystem, histName = hist.histName, classifiedHist = classifiedHist))
+
+        if classifiedHist:
+            # Determine the processing functions to apply
+            pluginManager.findFunctionsForHist(subsystem, hist)
+            # Add it to the subsystem
+            subsystem.hists[hist.histName] = hist
+        else:
+            # We don't want to process histograms which haven't been defined.
+            logger.debug("Skipping histogram {} since it is not classifiable for subsystem {}".format(hist.histName, subsystem.subsystem))
+
 def processHist(subsystem, hist, canvas, outputFormatting, processingOptions,
-                subsystemName = None, trendingManager = None):
+                subsystemName = None, trendingManager = None, imageRenderer = None, skipUnchangedHists = True):
     """ Main histogram processing function.
 
     This function is responsible for taking a given ``histogramContainer``, process the underlying histogram
@@ -276,6 +308,13 @@ def processHist(subsystem, hist, canvas, outputFormatting, processingOptions,
             of the object being processed, so we have to pass it here.
         trendingManager (TrendingManager): Will be notified when as histogram is processed to allow the use of
             the histogram values in trending.
+        imageRenderer (imageRenderer): Renders images asynchronously in a pool of worker processes. If ``None``,
+            the image is written directly. Default: ``None``.
+        skipUnchangedHists (bool): If True (and enabled in the configuration), the histogram isn't drawn and written
+            if it's unchanged since it was last written, as determined by comparing the ``histogramFingerprint()``
+            with ``hist.renderFingerprint``. If False, the histogram is always written and the stored fingerprint
+            is left untouched. Time slices are written with False, since they are written to different files than
+            the standard processing (which would otherwise have to rewrite all of the histograms). Default: True.
     Returns:
         None. However, the subsystem, histogram, etc are modified and their representations in images
             and ``json`` are written to disk.
@@ -301,7 +340,41 @@ def processHist(subsystem, hist, canvas, outputFormatting, processingOptions,
     # Must be done before drawing!
     for func in hist.projectionFunctionsToApply:
         logger.debug("Calling projection func: {func}".format(func = func))
-        hist.hist = func(subsystem, hist, processingOptions)
+        with profiler.function(subsystemName, func):
+            hist.hist = func(subsystem, hist, processingOptions)
+
+    # Determine the output filenames
+    outputName = hist.histName
+    # Replace any slashes with underscores to ensure that it can be used safely as a filename.
+    # For example, the TPC has historically had a `/` in the name. This is fine everywhere except
+    # when attempting to use the name as a filename.
+    outputName = outputName.replace("/", "_")
+    outputFilename = outputFormatting.format(base = os.path.join(processingParameters["dirPrefix"], subsystem.imgDir % {"subsystem": subsystemName}),
+                                             name = outputName,
+                                             ext = processingParameters["fileExtension"])
+    jsonBufferFile = outputFormatting.format(base = os.path.join(processingParameters["dirPrefix"], subsystem.jsonDir % {"subsystem": subsystemName}),
+                                             name = outputName,
+                                             ext = "json")
+
+    # Skip drawing and writing the histogram if it is identical to the last time that it was written.
+    # Trended histograms are always fully processed so that the trending objects see exactly the same
+    # histogram as they would otherwise.
+    fingerprint = None
+    isTrended = trendingManager is not None and trendingManager.isTrended(hist.histName)
+    if skipUnchangedHists and processingParameters["skipUnchangedHists"] and not processingParameters["forceReprocessing"] and not isTrended:
+        fingerprint = histogramFingerprint(hist = hist.hist,
+                                           processingOptions = processingOptions,
+                                           nEvents = getattr(subsystem, "nEvents", None),
+                                           outputFilename = outputFilename,
+                                           drawOptions = hist.drawOptions,
+                                           functionsToApply = hist.functionsToApply)
+        # When images are rendered on demand, the image may legitimately not exist yet.
+        imageAvailable = processingParameters["renderImagesOnDemand"] or os.path.exists(outputFilename)
+        if fingerprint == hist.renderFingerprint and imageAvailable and os.path.exists(jsonBufferFile):
+            logger.debug("Hist {histName} is unchanged since it was last written. Skipping it.".format(histName = hist.histName))
+            hist.hist = None
+            hist.canvas = None
+            return
 
     # Setup and draw histogram
     # Turn off title, but store the value
@@ -313,38 +386,266 @@ def processHist(subsystem, hist, canvas, outputFormatting, processingOptions,
     #logger.debug("Functions to apply: {functionsToApply}".format(functionsToApply = hist.functionsToApply))
     for func in hist.functionsToApply:
         logger.debug("Calling func: {func}".format(func = func))
-        func(subsystem, hist, processingOptions)
+        with profiler.function(subsystemName, func):
+            func(subsystem, hist, processingOptions)
 
     logger.debug("histName: {}, hist: {}".format(hist.histName, hist.hist))
 
     if trendingManager:
-        trendingManager.notifyAboutNewHistogramValue(hist)
+        timestamp, runNumber = trendingEntryInformation(subsystem)
+        with profiler.stage("trendingValues"):
+            trendingManager.notifyAboutNewHistogramValue(hist, timestamp = timestamp, runNumber = runNumber)
+
+    # Convert to json. It is used for both jsRoot and (potentially) rendering the image.
+    with profiler.stage("TBufferJSON"):
+        canvasJSON = ROOT.TBufferJSON.ConvertToJSON(canvas).Data()
 
     # Save
-    outputName = hist.histName
-    # Replace any slashes with underscores to ensure that it can be used safely as a filename.
-    # For example, the TPC has historically had a `/` in the name. This is fine everywhere except
-    # when attempting to use the name as a filename.
-    outputName = outputName.replace("/", "_")
-    outputFilename = outputFormatting.format(base = os.path.join(processingParameters["dirPrefix"], subsystem.imgDir % {"subsystem": subsystemName}),
-                                             name = outputName,
-                                             ext = processingParameters["fileExtension"])
-    logger.debug("Saving hist to {outputFilename}".format(outputFilename = outputFilename))
-    hist.canvas.SaveAs(outputFilename)
+    # If images are rendered on demand, the image will be rendered from the json when it is first requested.
+    if not processingParameters["renderImagesOnDemand"]:
+        if imageRenderer:
+            with profiler.stage("queueImageRendering"):
+                imageRenderer.render(canvasJSON = canvasJSON, outputFilename = outputFilename)
+        else:
+            with profiler.stage("SaveAs"):
+                hist.canvas.SaveAs(outputFilename)
 
     # Write BufferJSON
-    jsonBufferFile = outputFormatting.format(base = os.path.join(processingParameters["dirPrefix"], subsystem.jsonDir % {"subsystem": subsystemName}),
-                                             name = outputName,
-                                             ext = "json")
     #logger.debug("jsonBufferFile: {jsonBufferFile}".format(jsonBufferFile = jsonBufferFile))
     # GZip is performed by the web server, not here!
-    with open(jsonBufferFile, "wb") as f:
-        f.write(ROOT.TBufferJSON.ConvertToJSON(canvas).Data().encode())
+    with profiler.stage("writeJSON"):
+        with open(jsonBufferFile, "wb") as f:
+            f.write(canvasJSON.encode())
+
+    # Store the fingerprint of what we just wrote so we can skip it next time if nothing changes.
+    if skipUnchangedHists:
+        hist.renderFingerprint = fingerprint
 
     # Clear hist and canvas so that we can successfully save
     hist.hist = None
     hist.canvas = None
 
+def trendingEntryInformation(subsystem):
+    """ Determine the time stamp and run number to associate with values trended from a subsystem.
+
+    Args:
+        subsystem (subsystemContainer): Subsystem which is being processed.
+    Returns:
+        tuple: (timestamp, runNumber), where timestamp (int) is the unix time of the most recent file in the
+            combined file, and runNumber (int) is the run number. Either may be None if it is not available.
+    """
+    combinedFile = getattr(subsystem, "combinedFile", None)
+    timestamp = combinedFile.fileTime if combinedFile else None
+    # The base dir is of the form ``Run123456/SYS``.
+    runDir = getattr(subsystem, "baseDir", "").split(os.sep)[0]
+    runNumber = int(runDir.replace("Run", "")) if runDir.replace("Run", "").isdigit() else None
+    return (timestamp, runNumber)
+
+def jsonFilenameForImage(imageFilename):
+    """ Determine the json filename which corresponds to a given histogram image filename.
+
+    Images are stored in the ``img`` directory of a subsystem, while the json is stored using
+    the same name in the ``json`` directory. For example, ``Run123/EMC/img/hist.png`` corresponds
+    to ``Run123/EMC/json/hist.json``.
+
+    Args:
+        imageFilename (str): Path to the histogram image.
+    Returns:
+        str: Path to the corresponding json file, or None if the image isn't in an image directory.
+    """
+    imgDir, name = os.path.split(imageFilename)
+    baseDir, imgDirName = os.path.split(imgDir)
+    if imgDirName != "img":
+        return None
+    return os.path.join(baseDir, "json", os.path.splitext(name)[0] + ".json")
+
+def renderImageOnDemand(imageFilename):
+    """ Render a histogram image from the stored canvas json if it isn't available or is out of date.
+
+    This is used when the ``renderImagesOnDemand`` option is enabled, in which case processing only
+    writes the canvas json. The image is then rendered the first time that it is requested and cached
+    on disk. The cached image is rendered again if the json has been updated since it was rendered.
+
+    Args:
+        imageFilename (str): Path to the requested histogram image.
+    Returns:
+        bool: True if the image was rendered.
+    """
+    jsonFilename = jsonFilenameForImage(imageFilename)
+    if jsonFilename is None or not os.path.exists(jsonFilename):
+        logger.debug("No json available to render image {imageFilename}".format(imageFilename = imageFilename))
+        return False
+    # Use the cached image if it is up to date.
+    if os.path.exists(imageFilename) and os.path.getmtime(imageFilename) >= os.path.getmtime(jsonFilename):
+        return False
+
+    logger.debug("Rendering image {imageFilename} from {jsonFilename}".format(imageFilename = imageFilename, jsonFilename = jsonFilename))
+    with open(jsonFilename, "r") as f:
+        return renderImageFromJSON(canvasJSON = f.read(), outputFilename = imageFilename)
+
+def renderImageFromJSON(canvasJSON, outputFilename):
+    """ Render an image from a canvas which was serialized with ``TBufferJSON``.
+
+    The image is written to a temporary file and then moved into place so that a reader never
+    sees a partially written image.
+
+    Args:
+        canvasJSON (str): Canvas serialized to json by ``TBufferJSON``.
+        outputFilename (str): Path where the image should be written.
+    Returns:
+        bool: True if the image was rendered.
+    """
+    canvas = ROOT.TBufferJSON.ConvertFromJSON(canvasJSON)
+    if not canvas:
+        logger.warning("Unable to restore canvas to write {outputFilename}".format(outputFilename = outputFilename))
+        return False
+    canvas.Draw()
+    tempFilename = "{base}.{uuid}{ext}".format(base = os.path.splitext(outputFilename)[0],
+                                               uuid = uuid.uuid4().hex,
+                                               ext = os.path.splitext(outputFilename)[1])
+    canvas.SaveAs(tempFilename)
+    os.rename(tempFilename, outputFilename)
+    canvas.Close()
+
+    return True
+
+def _renderImageInWorker(task):
+    """ Render a single image in a rendering worker process.
+
+    Args:
+        task (tuple): ``(canvasJSON, outputFilename)``. See ``renderImageFromJSON()``.
+    Returns:
+        bool: True if the image was rendered.
+    """
+    canvasJSON, outputFilename = task
+    return renderImageFromJSON(canvasJSON = canvasJSON, outputFilename = outputFilename)
+
+class imageRenderer(object):
+    """ Renders histogram images asynchronously in a pool of worker processes.
+
+    ``canvas.SaveAs(...)`` dominates the time spent processing a histogram. Here, finished canvases are
+    passed to the workers as ``TBufferJSON`` json, such that the main process can continue to apply the
+    processing functions and fill the trending while the images are written. ``wait()`` acts as a barrier,
+    and must be called before the database is committed so that the stored state never refers to images
+    which haven't been written yet.
+
+    Args:
+        nWorkers (int): Number of rendering worker processes.
+    Attributes:
+        pool (multiprocessing.Pool): Pool of rendering workers.
+        pending (list): Results for images which have been submitted but not yet waited on.
+    """
+    def __init__(self, nWorkers):
+        # The alarm delivery thread must not run while the workers are forked.
+        with alarmDeliveryQueue.suspended():
+            self.pool = multiprocessing.Pool(nWorkers)
+        self.pending = []
+
+    def render(self, canvasJSON, outputFilename):
+        """ Submit a canvas to be rendered to an image.
+
+        Args:
+            canvasJSON (str): Canvas serialized to json by ``TBufferJSON``.
+            outputFilename (str): Path where the image should be written.
+        Returns:
+            None.
+        """
+        self.pending.append(self.pool.apply_async(_renderImageInWorker, ((canvasJSON, outputFilename),)))
+
+    def wait(self):
+        """ Wait until all submitted images have been written.
+
+        Args:
+            None.
+        Returns:
+            None.
+        Raises:
+            Any exception raised while rendering an image in a worker.
+        """
+        pending, self.pending = self.pending, []
+        for result in pending:
+            result.get()
+
+    def close(self):
+        """ Wait for the outstanding images and then shutdown the worker processes.
+
+        Args:
+            None.
+        Returns:
+            None.
+        """
+        try:
+            self.wait()
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+def histogramFingerprint(hist, processingOptions, nEvents = None, outputFilename = "", drawOptions = "", functionsToApply = None):
+    """ Determine a fingerprint of the content of a histogram and the options used to process it.
+
+    The fingerprint is built from the number of entries, the sum of weights, and the raw bin contents
+    (including under- and overflow) of the histogram, as well as the processing options, the number of
+    events, the output filename, the draw options, and the processing functions (both their names and
+    their code, such that changing a plugin function changes the fingerprint). If the fingerprint is the
+    same as when the histogram was last written, the output would be identical, so it doesn't need to be
+    drawn and written again. For a ``THStack``, each histogram in the stack contributes to the fingerprint.
+
+    Args:
+        hist (ROOT.TH1 or ROOT.THStack): Histogram to fingerprint.
+        processingOptions (dict): Processing options used to process the histogram.
+        nEvents (int): Number of events in the subsystem, which may be used to scale the histogram. Default: None.
+        outputFilename (str): Filename where the output will be written. It is included so that output written
+            to a different location (such as for a time slice) doesn't look the same. Default: "".
+        drawOptions (str): Options used to draw the histogram. Default: "".
+        functionsToApply (list): Functions which are applied to the histogram during processing. Default: None.
+    Returns:
+        str: SHA1 hash representing the fingerprint.
+    """
+    fingerprint = hashlib.sha1()
+    fingerprint.update(str(sorted(iteritems(processingOptions))).encode())
+    fingerprint.update("{nEvents}:{outputFilename}:{drawOptions}".format(nEvents = nEvents,
+                                                                         outputFilename = outputFilename,
+                                                                         drawOptions = drawOptions).encode())
+    for func in (functionsToApply or []):
+        fingerprint.update("{module}.{name}".format(module = getattr(func, "__module__", ""),
+                                                    name = getattr(func, "__name__", repr(func))).encode())
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            _updateFingerprintWithCode(fingerprint, code)
+
+    hists = list(hist.GetHists()) if hist.InheritsFrom(ROOT.THStack.Class()) else [hist]
+    for h in hists:
+        fingerprint.update("{name}:{entries}:{sumOfWeights}".format(name = h.GetName(),
+                                                                    entries = h.GetEntries(),
+                                                                    sumOfWeights = h.GetSumOfWeights()).encode())
+        try:
+            fingerprint.update(histogramArrays.binContents(h, includeFlowBins = True).tobytes())
+        except TypeError:
+            # We don't know how to access the array directly, so fall back to the slow approach.
+            fingerprint.update(str([h.GetBinContent(i) for i in range(h.GetNcells())]).encode())
+
+    return fingerprint.hexdigest()
+
+def _updateFingerprintWithCode(fingerprint, code):
+    """ Add the code of a function to a fingerprint.
+
+    Nested code objects (such as those of list comprehensions) are added recursively, since their
+    representation contains their memory address, which differs between processes.
+
+    Args:
+        fingerprint (hashlib.sha1): Fingerprint to be updated.
+        code (types.CodeType): Code of the function.
+    Returns:
+        None. However, the fingerprint is updated.
+    """
+    fingerprint.update(code.co_code)
+    fingerprint.update(str(code.co_names).encode())
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            _updateFingerprintWithCode(fingerprint, const)
+        else:
+            fingerprint.update(repr(const).encode())
+
 def compareProcessingOptionsDicts(inputProcessingOptions, processingOptions, errors):
     """ Compare an input and existing processing options dictionaries.
 
@@ -443,7 +744,9 @@ def validateAndCreateNewTimeSlice(run, subsystem, minTimeMinutes, maxTimeMinutes
 
     # Filter files by input time range. We will use the files which pass the filtering for the time slice.
     filesToMerge = []
-    for fileCont in subsystem.files.values():
+    # The files are keyed by their time stamp, so we only need to look at those near the requested range.
+    # A margin is included because the check below rounds to the nearest minute.
+    for fileCont in subsystem.files.values(min = int(minTimeCutUnix) - 60, max = int(maxTimeCutUnix) + 60):
         #logger.info("fileCont.fileTime: {fileTime}, minTimeCutUnix: {minTimeCutUnix}, maxTimeCutUnix: {maxTimeCutUnix}".format(fileTime = fileCont.fileTime, minTimeCutUnix = minTimeCutUnix, maxTimeCutUnix = maxTimeCutUnix))
         #logger.info("fileCont.timeIntoRun (minutes): {timeIntoRun}, minTimeMinutes: {minTimeMinutes}, maxTimeMinutes: {maxTimeMinutes}".format(timeIntoRun = round(fileCont.timeIntoRun / 60), minTimeMinutes = minTimeMinutes, maxTimeMinutes = maxTimeMinutes))
         # It is important to make this check in such a way that we can round to the nearest minute.
@@ -497,7 +800,7 @@ def validateAndCreateNewTimeSlice(run, subsystem, minTimeMinutes, maxTimeMinutes
 
     return (uuidDictKey, True, None)
 
-def processTimeSlices(runs, runDir, minTimeRequested, maxTimeRequested, subsystemName, inputProcessingOptions):
+def processTimeSlices(runs, runDir, minTimeRequested, maxTimeRequested, subsystemName, inputProcessingOptions, dbRoot = None):
     """ Creates a time slice or performs user directed reprocessing.
 
     Time slices are created by processing a given run using only data in a given time range (and potentially modifying the
@@ -520,6 +823,9 @@ def processTimeSlices(runs, runDir, minTimeRequested, maxTimeRequested, subsyste
         subsystemName (str): The subsystem of the time slice request by three letter, all capital name (ex. ``EMC``).
         inputProcessingOptions (dict): Processing options requested for the time slice. Keys are the names of
         the options, while values are the actual values of the processing options.
+        dbRoot: Database root. The subsystems which receive newly moved files are stored in it's index such that
+            they will be merged and processed in the next processing cycle, and the run summaries are updated.
+            Default: None, in which case the files are only added to the runs.
     Returns:
         str or dict: If successful, we return the time slice key (str) under which the requested time slice is stored
             in the ``subsystemContainer.timeSlices`` dictionary. If an error was encountered, we return an error
@@ -538,7 +844,11 @@ def processTimeSlices(runs, runDir, minTimeRequested, maxTimeRequested, subsyste
     # Along this may be a bit slow, we do it here so that the most up to date information is available for
     # the time slice - particularly in the case of an ongoing run.
     runDict = utilities.moveRootFiles(processingParameters["dirPrefix"], processingParameters["subsystemList"])
-    processMovedFilesIntoRuns(runs, runDict)
+    changes = runChangeTracker(pendingSubsystems = movedSubsystemsIndex(dbRoot)) if dbRoot is not None else None
+    processMovedFilesIntoRuns(runs, runDict, changes = changes)
+    # Only update existing summaries. If they don't exist yet, they will be created by the processing.
+    if changes is not None and "runSummaries" in dbRoot:
+        updateRunSummaries(dbRoot, runs, changes.changedRuns)
 
     # Validate and create (or retrieve) the ``timeSliceContainer``.
     (timeSliceKey, newlyCreated, errors) = validateAndCreateNewTimeSlice(run, subsystem, minTimeRequested, maxTimeRequested, inputProcessingOptions)
@@ -551,11 +861,13 @@ def processTimeSlices(runs, runDir, minTimeRequested, maxTimeRequested, subsyste
     timeSlice = subsystem.timeSlices[timeSliceKey]
 
     # Merge the files that are included in the time slice.
+    # If possible, the time slice is kept in memory. In that case, the file is only written if it is requested later.
     # Return if there were errors in merging
     try:
-        mergeFiles.merge(processingParameters["dirPrefix"], run, subsystem,
-                         cumulativeMode = processingParameters["cumulativeMode"],
-                         timeSlice = timeSlice)
+        timeSliceFile = mergeFiles.merge(processingParameters["dirPrefix"], run, subsystem,
+                                         cumulativeMode = processingParameters["cumulativeMode"],
+                                         timeSlice = timeSlice,
+                                         inMemory = processingParameters["inMemoryTimeSlices"])
     except ValueError as e:
         # Return the merge error to the user.
         # We want to return a list, so we just return all of the args.
@@ -576,13 +888,259 @@ def processTimeSlices(runs, runDir, minTimeRequested, maxTimeRequested, subsyste
                                  subsystem.baseDir,
                                  timeSlice.filename.filename),
                     outputFormattingSave, subsystem,
-                    processingOptions = timeSlice.processingOptions)
+                    processingOptions = timeSlice.processingOptions,
+                    inputFile = timeSliceFile,
+                    skipUnchangedHists = False)
 
     logger.info("Finished processing {prettyName}!".format(prettyName = run.prettyName))
 
     # No errors, so return the key
     return timeSliceKey
 
+def writeTimeSliceFile(runs, filename):
+    """ Write the ROOT file for a time slice which was only created in memory.
+
+    When time slices are processed in memory, the time slice ROOT file is not written to disk. If a user
+    requests to download it, we write it here by repeating the merge (without processing) for the time slice.
+    Since the same file may be requested several times at once, the merge is written to a temporary file
+    which is then moved into place, such that a partially written file is never served.
+
+    Args:
+        runs (BTree): Dict-like object which stores all run, subsystem, and hist information. Keys are the
+            in the ``runDir`` format ("Run123456"), while the values are ``runContainer`` objects.
+        filename (str): Path of the requested file relative to the data directory. For example,
+            ``Run123/EMC/timeSlice.1.2.abc.root``.
+    Returns:
+        bool: True if the time slice file was written.
+    """
+    baseDir, name = os.path.split(filename)
+    runDir = baseDir.split(os.sep)[0]
+    if runDir not in runs:
+        return False
+    for subsystem in itervalues(runs[runDir].subsystems):
+        if subsystem.baseDir != baseDir:
+            continue
+        for timeSlice in itervalues(subsystem.timeSlices):
+            if timeSlice.filename.filename == name:
+                logger.info("Writing time slice file {filename}".format(filename = filename))
+                outputFilename = os.path.join(processingParameters["dirPrefix"], subsystem.baseDir, name)
+                tempFilename = "{base}.{uuid}{ext}".format(base = os.path.splitext(outputFilename)[0],
+                                                           uuid = uuid.uuid4().hex,
+                                                           ext = os.path.splitext(outputFilename)[1])
+                try:
+                    mergeFiles.merge(processingParameters["dirPrefix"], runs[runDir], subsystem,
+                                     cumulativeMode = processingParameters["cumulativeMode"],
+                                     timeSlice = timeSlice, outputFilename = tempFilename)
+                    os.rename(tempFilename, outputFilename)
+                finally:
+                    if os.path.exists(tempFilename):
+                        os.remove(tempFilename)
+                return True
+    return False
+
+class runChangeTracker(object):
+    """ Tracks the runs and subsystems which were modified during the current processing cycle.
+
+    Since ZODB commits all of the objects modified in a transaction together, the transactions are scoped by
+    committing once the changes to a run are complete, and skipping the commit when nothing has changed. The
+    tracked runs also determine which runs need to be visited during processing, such that runs without any
+    changes are never loaded from the database.
+
+    Args:
+        pendingSubsystems (BTrees.OOBTree.OOTreeSet): Persistent index of the subsystems with new files. See
+            ``pendingSubsystemsIndex()``. Default: None, in which case an index which isn't stored is used.
+
+    Attributes:
+        changedRuns (set): Run directories (ex. ``Run123456``) which were modified during this cycle.
+        changedSubsystems (set): (runDir, subsystemName) of the subsystems which were modified during this cycle.
+        uncommitted (set): Run directories with changes which haven't been committed yet.
+        pendingSubsystems (BTrees.OOBTree.OOTreeSet): (runDir, subsystemName) of the subsystems with new files.
+    """
+    def __init__(self, pendingSubsystems = None):
+        self.changedRuns = set()
+        self.changedSubsystems = set()
+        self.uncommitted = set()
+        self.pendingSubsystems = pendingSubsystems if pendingSubsystems is not None else BTrees.OOBTree.OOTreeSet()
+
+    def markChanged(self, runDir, subsystemName = None):
+        """ Note that a run (and optionally one of it's subsystems) was modified.
+
+        Args:
+            runDir (str): Run directory of the modified run.
+            subsystemName (str): Name of the modified subsystem. Default: None, in which case only the run
+                is noted as modified.
+        Returns:
+            None.
+        """
+        self.changedRuns.add(runDir)
+        self.uncommitted.add(runDir)
+        if subsystemName is not None:
+            self.changedSubsystems.add((runDir, subsystemName))
+
+    def markNewFiles(self, runDir, subsystemName):
+        """ Note that a subsystem received new files, such that it needs to be merged and processed.
+
+        Args:
+            runDir (str): Run directory of the run.
+            subsystemName (str): Name of the subsystem.
+        Returns:
+            None.
+        """
+        self.markChanged(runDir, subsystemName)
+        self.pendingSubsystems.insert((runDir, subsystemName))
+
+    def pendingRuns(self):
+        """ Run directories of the runs which contain subsystems with new files, in order. """
+        runDirs = []
+        for runDir, _ in self.pendingSubsystems:
+            if not runDirs or runDirs[-1] != runDir:
+                runDirs.append(runDir)
+        return runDirs
+
+    def changedSubsystemNames(self):
+        """ Names of the subsystems (ex. ``EMC``) which were modified in any run during this cycle. """
+        return set(subsystemName for _, subsystemName in self.changedSubsystems)
+
+    def commit(self):
+        """ Commit the current transaction if any run has uncommitted changes.
+
+        Args:
+            None.
+        Returns:
+            bool: True if the transaction was committed.
+        """
+        if not self.uncommitted:
+            return False
+        logger.debug("Committing changes to {runDirs}".format(runDirs = sorted(self.uncommitted)))
+        with profiler.stage("commit"):
+            transaction.commit()
+        self.uncommitted.clear()
+        return True
+
+    def runsToProcess(self, runs):
+        """ Determine which runs need to be visited during processing.
+
+        These are the runs with new files and the runs which were otherwise modified during this cycle, as well
+        as any runs where reprocessing was requested. Only these runs are loaded from the database.
+
+        Args:
+            runs (BTree): Dict-like object which stores all run, subsystem, and hist information. Keys are the
+                ``runDir``, while the values are ``runContainer`` objects.
+        Returns:
+            list: Run directories of the runs to process, in order.
+        """
+        if processingParameters["forceReprocessing"]:
+            return list(runs.keys())
+        runDirs = set(self.changedRuns)
+        runDirs.update(self.pendingRuns())
+        runDirs.update("Run{runNumber}".format(runNumber = runNumber) for runNumber in processingParameters["forceReprocessRuns"])
+        return sorted(runDir for runDir in runDirs if runDir in runs)
+
+def pendingSubsystemsIndex(dbRoot, runs):
+    """ Retrieve the persistent index of the subsystems with new files, resetting them for a new cycle.
+
+    The index contains (runDir, subsystemName) for each subsystem where ``newFile`` is set. It is filled
+    when files are moved into the runs (see ``processMovedFilesIntoRuns()``), and it is used by the merging,
+    processing and trending to find the subsystems with new data without visiting every run. The ``newFile``
+    flags of the previous cycle are cleared here, so only the subsystems in the index need to be loaded.
+
+    If the database was created before the index was available, all subsystems are checked once.
+
+    Files which were moved into the runs outside of the processing (ie. when a time slice is requested) are
+    stored in the "movedSubsystems" index instead (see ``movedSubsystemsIndex()``). They haven't been merged or
+    processed yet, so they are transferred into this index (keeping their ``newFile`` flag) for the new cycle.
+
+    Args:
+        dbRoot: Database root.
+        runs (BTree): Dict-like object which stores all run, subsystem, and hist information. Keys are the
+            ``runDir``, while the values are ``runContainer`` objects.
+    Returns:
+        BTrees.OOBTree.OOTreeSet: The (now empty) index of the subsystems with new files.
+    """
+    if "pendingSubsystems" not in dbRoot:
+        for run in itervalues(runs):
+            for subsystem in itervalues(run.subsystems):
+                if subsystem.newFile:
+                    subsystem.newFile = False
+        dbRoot["pendingSubsystems"] = BTrees.OOBTree.OOTreeSet()
+        _transferMovedSubsystems(dbRoot, runs, dbRoot["pendingSubsystems"])
+        return dbRoot["pendingSubsystems"]
+
+    pendingSubsystems = dbRoot["pendingSubsystems"]
+    for runDir, subsystemName in pendingSubsystems:
+        run = runs.get(runDir)
+        subsystem = run.subsystems.get(subsystemName) if run is not None else None
+        if subsystem is not None and subsystem.newFile:
+            subsystem.newFile = False
+    pendingSubsystems.clear()
+    _transferMovedSubsystems(dbRoot, runs, pendingSubsystems)
+    return pendingSubsystems
+
+def _transferMovedSubsystems(dbRoot, runs, pendingSubsystems):
+    """ Transfer the subsystems with files moved outside of the processing into the pending subsystems index.
+
+    Args:
+        dbRoot: Database root.
+        runs (BTree): Dict-like object which stores all run, subsystem, and hist information.
+        pendingSubsystems (BTrees.OOBTree.OOTreeSet): Index of the subsystems with new files for this cycle.
+    Returns:
+        None.
+    """
+    if "movedSubsystems" not in dbRoot or not dbRoot["movedSubsystems"]:
+        return
+    movedSubsystems = dbRoot["movedSubsystems"]
+    for runDir, subsystemName in movedSubsystems:
+        run = runs.get(runDir)
+        subsystem = run.subsystems.get(subsystemName) if run is not None else None
+        if subsystem is None:
+            continue
+        # The flag may have just been cleared if the subsystem also received files in the previous cycle.
+        if not subsystem.newFile:
+            subsystem.newFile = True
+        pendingSubsystems.insert((runDir, subsystemName))
+    movedSubsystems.clear()
+
+def movedSubsystemsIndex(dbRoot):
+    """ Retrieve the persistent index of the subsystems with files which were moved outside of the processing.
+
+    Files can be moved into the runs when a time slice is requested. They are indexed separately from the
+    ``pendingSubsystemsIndex()`` so that they aren't reset when the next processing cycle begins. Instead, they
+    are merged and processed in that cycle.
+
+    Args:
+        dbRoot: Database root.
+    Returns:
+        BTrees.OOBTree.OOTreeSet: (runDir, subsystemName) of the subsystems with files moved outside of the processing.
+    """
+    if "movedSubsystems" not in dbRoot:
+        dbRoot["movedSubsystems"] = BTrees.OOBTree.OOTreeSet()
+    return dbRoot["movedSubsystems"]
+
+def updateRunSummaries(dbRoot, runs, runDirs):
+    """ Update the summaries of the given runs, which are displayed in the web app run list.
+
+    The summaries are stored in a ``runSummaryIndex`` in the database. If the database was created before
+    the index was available, the summaries of all runs are created once.
+
+    Args:
+        dbRoot: Database root.
+        runs (BTree): Dict-like object which stores all run, subsystem, and hist information. Keys are the
+            ``runDir``, while the values are ``runContainer`` objects.
+        runDirs (iterable): Run directories of the runs to update.
+    Returns:
+        processingClasses.runSummaryIndex: The index of the run summaries.
+    """
+    if "runSummaries" not in dbRoot:
+        logger.info("Creating the run summaries for all runs.")
+        dbRoot["runSummaries"] = processingClasses.runSummaryIndex()
+        runDirs = runs.keys()
+    runSummaries = dbRoot["runSummaries"]
+    for runDir in runDirs:
+        run = runs.get(runDir)
+        if run is not None:
+            runSummaries.update(run)
+    return runSummaries
+
 def createNewSubsystemFromMovedFilesInformation(runs, subsystem, runDict, runDir):
     """ Creates a new subsystem based on the information from the moved files.
 
@@ -657,7 +1215,7 @@ def createNewSubsystemFromMovedFilesInformation(runs, subsystem, runDict, runDir
     # Flag that there are new files
     runs[runDir].subsystems[subsystem].newFile = True
 
-def processMovedFilesIntoRuns(runs, runDict):
+def processMovedFilesIntoRuns(runs, runDict, changes = None):
     """ Convert the list of moved files into run and subsystem containers stored in the database.
 
     In the case that the run has not been created, a new run container is created and an attempt is made
@@ -670,10 +1228,14 @@ def processMovedFilesIntoRuns(runs, runDict):
             in the ``runDir`` format ("Run123456"), while the values are ``runContainer`` objects.
         runDict (dict): Nested dict which contains the new filenames and the HLT mode. For the precise
             structure, ``base.utilities.moveFiles()``.
+        changes (runChangeTracker): Notified about the runs and subsystems which are modified, including
+            the subsystems with new files. Default: None.
     Returns:
         None. Subsystems are created inside of the ``runContainer`` objects for which there are entries in the
             ``runDict``.
     """
+    if changes is None:
+        changes = runChangeTracker()
     # Copy the dict to avoid modifying the passed copy.
     # Although it is not used after this function as of Oct 2018, since we modify the dict by adding entries for subsystems
     # which are not their own ``fileLocationSubsystem``, as well as popping the ``hltMode``, it is safer to copy it and
@@ -719,6 +1281,7 @@ def processMovedFilesIntoRuns(runs, runDict):
             for subsystemName in runDict[runDir]:
                 # We only want to update files if there are actually new files (and not just an empty list)
                 if runDict[runDir][subsystemName]:
+                    changes.markNewFiles(runDir, subsystemName)
                     if subsystemName in run.subsystems:
                         # Scenario 1
                         # Update the subsystem
@@ -795,15 +1358,380 @@ def processMovedFilesIntoRuns(runs, runDict):
             # possible subsystems here. Anything for which we don't have available data will either
             # not be shown (if there is not HLT receiver data) or will take advantage of relevant data
             # from the HLT receiver.
+            changes.markChanged(runDir)
             for subsystem in processingParameters["subsystemList"]:
                 try:
                     createNewSubsystemFromMovedFilesInformation(runs, subsystem, runDict, runDir)
+                    changes.markNewFiles(runDir, subsystem)
                 except ValueError as e:
                     # This means that the subsystem could not be created.  This is okay - we just want
                     # to log it and continue on. For more information on the conditions that can lead
                     # to such a case, see ``createNewSubsystemFromMovedFilesInformation(...)``.
                     logger.warning(e.args[0])
 
+def subsystemNeedsProcessing(runDir, subsystem):
+    """ Determine whether a subsystem needs to be processed in this processing iteration.
+
+    A subsystem is processed if there is a new file, or if we explicitly ask for processing by forcing
+    it. We can force either generally (``forceReprocessing``), or for particular runs (``forceReprocessRuns``).
+
+    Args:
+        runDir (str): String containing the run number. For an example run 123456, it
+            should be formatted as ``Run123456``.
+        subsystem (subsystemContainer): Subsystem to be checked.
+    Returns:
+        bool: True if the subsystem should be processed.
+    """
+    return subsystem.newFile or processingParameters["forceReprocessing"] or int(runDir.replace("Run", "")) in processingParameters["forceReprocessRuns"]
+
+# Attributes of the ``subsystemContainer`` which store the histogram containers and groups. They are never sent
+# to the worker processes during parallel processing. Instead, the worker recreates them, and only the new containers
+# or the changes to the existing containers are transferred back.
+_subsystemHistogramAttributes = ["histGroups", "histsInFile", "histsAvailable", "hists"]
+# Attributes of the ``subsystemContainer`` which are not needed by ``processRootFile()``. They can be large
+# (one entry per file), so they are not sent to the worker processes either.
+_subsystemAttributesNotSentToWorkers = ["files", "timeSlices"] + _subsystemHistogramAttributes
+
+class _trendingHistogramRecorder(object):
+    """ Stand-in for the ``TrendingManager`` when processing in a worker process.
+
+    The trending objects and alarms live in the database of the parent process, so they can't be filled
+    in the worker. Instead, we record a copy of each histogram which is subscribed to a trending object,
+    and then replay them into the ``TrendingManager`` in the parent process.
+
+    Args:
+        trendedHistNames (set): Names of histograms which are subscribed to at least one trending object.
+
+    Attributes:
+        trendedHistNames (set): Names of histograms which are subscribed to at least one trending object.
+        recordedHists (list): (histName, ROOT.TH1) pairs containing copies of the trended histograms,
+            stored in the order that they were processed.
+    """
+    def __init__(self, trendedHistNames):
+        self.trendedHistNames = trendedHistNames
+        self.recordedHists = []
+
+    def isTrended(self, histName):
+        """ Check whether the histogram is subscribed to at least one trending object.
+
+        Args:
+            histName (str): Name of the histogram.
+        Returns:
+            bool: True if the histogram is trended.
+        """
+        return histName in self.trendedHistNames
+
+    def notifyAboutNewHistogramValue(self, hist, timestamp = None, runNumber = None):
+        """ Record a copy of the histogram if it is trended.
+
+        Args:
+            hist (histogramContainer): Histogram which is processed.
+            timestamp (float): Unix time of the data in the histogram. It is not recorded since it is determined
+                again from the subsystem when replaying. Default: None.
+            runNumber (int): Run number of the data in the histogram. Not recorded for the same reason. Default: None.
+        Returns:
+            None.
+        """
+        if not self.isTrended(hist.histName):
+            return
+        histCopy = hist.hist.Clone()
+        # Ensure that the copy isn't owned (and then deleted) by the input file.
+        if hasattr(histCopy, "SetDirectory"):
+            histCopy.SetDirectory(0)
+        self.recordedHists.append((hist.histName, histCopy))
+
+def _storedHistograms(subsystem):
+    """ Collect the names and stored information of the histograms of a subsystem to send to a worker process.
+
+    Only the names of the groups and histograms, as well as the information stored by the processing, are
+    sent. The histogram containers themselves (including the trending objects which refer to them) stay in
+    the database of this process.
+
+    Args:
+        subsystem (subsystemContainer): Subsystem which will be processed.
+    Returns:
+        dict: ``{"histGroups": [(prettyName, selectionPattern, plotInGridSelectionPattern, histList), ...],
+            "hists": {histName: (renderFingerprint, information), ...}}``, or None if the subsystem doesn't have
+            any histograms yet, in which case they are created by the worker.
+    """
+    if not subsystem.hists:
+        return None
+    histGroups = [(group.prettyName, group.selectionPattern, group.plotInGridSelectionPattern, list(group.histList))
+                  for group in subsystem.histGroups]
+    hists = {histName: (hist.renderFingerprint, dict(hist.information)) for histName, hist in iteritems(subsystem.hists)}
+    return {"histGroups": histGroups, "hists": hists}
+
+def _processSubsystemInWorker(task):
+    """ Process a single subsystem in a worker process.
+
+    The subsystem is reconstructed (without any histogram containers) from the state sent by the parent
+    process. The histogram containers are then recreated from the combined file via the plugins, which also
+    determines the functions to apply. If the subsystem already has histograms in the database, only the stored
+    groups and histograms are processed, starting from their stored information (such as the render fingerprint).
+    The subsystem is processed via ``processRootFile()`` (which writes the images and ``json`` to disk), and then
+    only the changes are returned to the parent so that they can be stored in the database. Each worker process has
+    it's own ROOT instance, so the canvases created during processing are independent.
+
+    Args:
+        task (tuple): (runDir, subsystemName, filename, outputFormatting, subsystemState, storedHists, trendedHistNames),
+            where ``subsystemState`` is the state of the ``subsystemContainer`` (without the attributes listed
+            in ``_subsystemAttributesNotSentToWorkers``), ``storedHists`` are the stored histograms determined by
+            ``_storedHistograms()``, and ``trendedHistNames`` is the set of histogram names which are needed for
+            trending.
+    Returns:
+        tuple: (runDir, subsystemName, newContainers, histUpdates, recordedHists, timings), where ``newContainers``
+            (dict) contains the values of the attributes in ``_subsystemHistogramAttributes``, as well as ``nEvents``
+            and ``processingOptions`` if the subsystem didn't have any histograms yet (None otherwise), ``histUpdates``
+            (dict) maps the name of each stored histogram whose information changed to it's new (renderFingerprint,
+            information), ``recordedHists`` (list) contains the (histName, hist) pairs needed for trending, and
+            ``timings`` (profiledCycle) contains the timings recorded while processing (None if profiling is disabled).
+    """
+    (runDir, subsystemName, filename, outputFormatting, subsystemState, storedHists, trendedHistNames) = task
+    # Reconstruct the subsystem without attaching it to any database.
+    subsystem = processingClasses.subsystemContainer.__new__(processingClasses.subsystemContainer)
+    subsystem.__setstate__(subsystemState)
+    subsystem.histGroups = persistent.list.PersistentList()
+    subsystem.histsInFile = BTrees.OOBTree.BTree()
+    subsystem.histsAvailable = BTrees.OOBTree.BTree()
+    subsystem.hists = BTrees.OOBTree.BTree()
+    subsystem.processingOptions = persistent.mapping.PersistentMapping(subsystemState["processingOptions"])
+
+    recorder = _trendingHistogramRecorder(trendedHistNames) if trendedHistNames else None
+    # Record the timings separately, such that they can be merged into the cycle of the main process.
+    profiler.startCycle()
+    fIn = ROOT.TFile(filename, "READ")
+    if storedHists is not None:
+        # Recreate the containers to determine the functions to apply, but keep the stored values.
+        createHistogramContainers(subsystem = subsystem, fIn = fIn)
+        subsystem.nEvents = subsystemState["nEvents"]
+        subsystem.processingOptions = persistent.mapping.PersistentMapping(subsystemState["processingOptions"])
+        # Only process the stored groups and histograms, as in the serial processing.
+        subsystem.histGroups = persistent.list.PersistentList()
+        for (prettyName, selectionPattern, plotInGridSelectionPattern, histList) in storedHists["histGroups"]:
+            group = processingClasses.histogramGroupContainer(prettyName, selectionPattern, plotInGridSelectionPattern)
+            group.histList.extend(histName for histName in histList if histName in subsystem.hists)
+            subsystem.histGroups.append(group)
+        for histName, (renderFingerprint, information) in iteritems(storedHists["hists"]):
+            hist = subsystem.hists.get(histName)
+            if hist is not None:
+                hist.renderFingerprint = renderFingerprint
+                hist.information.clear()
+                hist.information.update(information)
+
+    processRootFile(filename = filename,
+                    outputFormatting = outputFormatting,
+                    subsystem = subsystem,
+                    forceRecreateSubsystem = processingParameters["forceRecreateSubsystem"] and storedHists is None,
+                    trendingManager = recorder,
+                    inputFile = fIn)
+
+    newContainers = None
+    histUpdates = {}
+    if storedHists is None:
+        newContainers = {attr: getattr(subsystem, attr) for attr in _subsystemHistogramAttributes}
+        newContainers["nEvents"] = subsystem.nEvents
+        newContainers["processingOptions"] = dict(subsystem.processingOptions)
+    else:
+        for group in subsystem.histGroups:
+            for histName in group.histList:
+                hist = subsystem.hists[histName]
+                update = (hist.renderFingerprint, dict(hist.information))
+                if update != storedHists["hists"].get(histName):
+                    histUpdates[histName] = update
+    recordedHists = recorder.recordedHists if recorder else []
+    return (runDir, subsystemName, newContainers, histUpdates, recordedHists, profiler.detachCycle())
+
+def _applyProcessedSubsystem(subsystem, newContainers, histUpdates):
+    """ Store the results of processing a subsystem in a worker process in the subsystem.
+
+    The stored histogram containers are modified in place, so that only the containers which actually changed
+    are written to the database. New containers are only added if the subsystem doesn't already contain them.
+
+    Args:
+        subsystem (subsystemContainer): Subsystem which was processed.
+        newContainers (dict): New histogram containers, groups, number of events, and processing options created
+            by the worker, or None if the subsystem already had histograms. See ``_processSubsystemInWorker()``.
+        histUpdates (dict): New (renderFingerprint, information) of the stored histograms, keyed by histogram name.
+    Returns:
+        None. However, the subsystem is modified.
+    """
+    if newContainers is not None:
+        for attr in ["histsInFile", "histsAvailable", "hists"]:
+            storedHists = getattr(subsystem, attr)
+            for histName, hist in iteritems(newContainers[attr]):
+                if histName not in storedHists:
+                    storedHists[histName] = hist
+        if not subsystem.histGroups:
+            subsystem.histGroups.extend(newContainers["histGroups"])
+        if subsystem.nEvents != newContainers["nEvents"]:
+            subsystem.nEvents = newContainers["nEvents"]
+        if dict(subsystem.processingOptions) != newContainers["processingOptions"]:
+            subsystem.processingOptions.update(newContainers["processingOptions"])
+
+    for histName, (renderFingerprint, information) in iteritems(histUpdates):
+        hist = subsystem.hists[histName]
+        if hist.renderFingerprint != renderFingerprint:
+            hist.renderFingerprint = renderFingerprint
+        if dict(hist.information) != information:
+            hist.information.clear()
+            hist.information.update(information)
+
+def processSubsystemsInParallel(runs, outputFormatting, trendingManager, nWorkers, runDirs = None, changes = None):
+    """ Process all subsystems which need processing using a pool of worker processes.
+
+    Each (run, subsystem) unit which needs processing is dispatched to a worker process, which processes
+    the combined file and writes the images and ``json`` to disk. Only the names and stored information of the
+    histograms are sent to the workers, and only the new histogram containers or the changes to the stored
+    containers are sent back and applied to the ``subsystemContainer`` objects in this process. The trended
+    histograms are passed to the ``TrendingManager`` (so that the trending objects and alarms are only ever
+    modified in this process). All of the changes are committed in one transaction.
+
+    Note:
+        Only the histogram containers and groups (when they are first created), the ``renderFingerprint`` and
+        ``information`` of the histograms, and the number of events and processing options of the subsystem are
+        stored in the database. Plugin functions which store information elsewhere during processing will lose
+        those changes in this mode. In that case, use the serial processing (``processingWorkers: 1``).
+
+    Args:
+        runs (BTree): Dict-like object which stores all run, subsystem, and hist information. Keys are the
+            in the ``runDir`` format ("Run123456"), while the values are ``runContainer`` objects.
+        outputFormatting (str): Specially formatted string which contains a generic path to be used when printing
+            histograms. See ``processRootFile()``.
+        trendingManager (TrendingManager): Manages the trending subsystem. May be ``None`` if trending is disabled.
+        nWorkers (int): Number of worker processes.
+        runDirs (list): Run directories of the runs to consider. Other runs aren't loaded from the database.
+            Default: None, which considers all runs.
+        changes (runChangeTracker): Notified about the processed subsystems. Default: None.
+    Returns:
+        None. However, the subsystems are modified and the changes are committed to the database.
+    """
+    trendedHistNames = set(trendingManager.histToTrending) if trendingManager else set()
+
+    if runDirs is None:
+        runDirs = list(runs.keys())
+
+    tasks = []
+    for runDir in runDirs:
+        run = runs[runDir]
+        for subsystem in itervalues(run.subsystems):
+            if not subsystemNeedsProcessing(runDir, subsystem):
+                logger.debug("Don't need to process {prettyName} for subsystem {subsystem}. It has already been processed".format(prettyName = run.prettyName, subsystem = subsystem.subsystem))
+                continue
+            logger.info("About to process {prettyName}, {subsystem}".format(prettyName = run.prettyName, subsystem = subsystem.subsystem))
+            if processingParameters["forceRecreateSubsystem"]:
+                # The worker will recreate all of the histogram containers.
+                subsystem.resetContainer()
+            subsystemState = dict(subsystem.__getstate__())
+            for attr in _subsystemAttributesNotSentToWorkers:
+                subsystemState.pop(attr, None)
+            subsystemState["processingOptions"] = dict(subsystem.processingOptions)
+            tasks.append((runDir, subsystem.subsystem,
+                          os.path.join(processingParameters["dirPrefix"], subsystem.combinedFile.filename),
+                          outputFormatting, subsystemState, _storedHistograms(subsystem), trendedHistNames))
+
+    if not tasks:
+        return
+
+    logger.info("Processing {nTasks} subsystem(s) with {nWorkers} worker processes.".format(nTasks = len(tasks), nWorkers = nWorkers))
+    # The alarms of the previous cycle may have started the alarm delivery thread. It must not run while
+    # the workers are forked, since they could inherit a lock which is held by the thread and then deadlock.
+    with alarmDeliveryQueue.suspended():
+        pool = multiprocessing.Pool(processes = min(nWorkers, len(tasks)))
+    try:
+        # ``imap`` preserves the order of the tasks, so the trending objects are filled in the same
+        # order as in the serial processing.
+        for (runDir, subsystemName, newContainers, histUpdates, recordedHists, timings) in pool.imap(_processSubsystemInWorker, tasks):
+            profiler.mergeCycle(timings)
+            if changes is not None:
+                changes.markChanged(runDir, subsystemName)
+            subsystem = runs[runDir].subsystems[subsystemName]
+            _applyProcessedSubsystem(subsystem = subsystem, newContainers = newContainers, histUpdates = histUpdates)
+
+            if trendingManager:
+                for histName, rootHist in recordedHists:
+                    hist = subsystem.hists[histName]
+                    hist.hist = rootHist
+                    timestamp, runNumber = trendingEntryInformation(subsystem)
+                    with profiler.stage("trendingValues"):
+                        trendingManager.notifyAboutNewHistogramValue(hist, timestamp = timestamp, runNumber = runNumber)
+                    hist.hist = None
+                with profiler.stage("alarms"):
+                    trendingManager.checkPendingAlarms()
+        pool.close()
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    # Commit all of the merged results at once.
+    with profiler.stage("commit"):
+        transaction.commit()
+
+def processSubsystemsSerially(runs, outputFormatting, trendingManager, imageRenderer = None, runDirs = None, changes = None):
+    """ Process all subsystems which need processing in the current process.
+
+    The database is committed after each run where a subsystem was processed, such that each transaction
+    only contains the changes to a single run. If an image renderer is provided, we wait for all of the images
+    of the run to be written before committing.
+
+    Args:
+        runs (BTree): Dict-like object which stores all run, subsystem, and hist information. Keys are the
+            ``runDir``, while the values are ``runContainer`` objects.
+        outputFormatting (str): Specially formatted string which contains a generic path to be used when printing
+            histograms. See ``processRootFile()``.
+        trendingManager (TrendingManager): Manages the trending subsystem.
+        imageRenderer (imageRenderer): Renders images asynchronously. Default: ``None``.
+        runDirs (list): Run directories of the runs to consider. Other runs aren't loaded from the database.
+            Default: None, which considers all runs.
+        changes (runChangeTracker): Tracks the modified runs and commits their changes. Default: None.
+    Returns:
+        None. However, the subsystems are processed and the database is updated.
+    """
+    if runDirs is None:
+        runDirs = list(runs.keys())
+    if changes is None:
+        changes = runChangeTracker()
+
+    for runDir in runDirs:
+        run = runs[runDir]
+        for subsystem in run.subsystems.values():
+            # Process the subsystem if there is a new file or we explicitly ask for
+            # processing by forcing it.
+            if subsystemNeedsProcessing(runDir, subsystem):
+                # Process combined root file: plot histograms and save the results of the processing
+                # in both image and `json` on the disk.
+                logger.info("About to process {prettyName}, {subsystem}".format(prettyName = run.prettyName, subsystem = subsystem.subsystem))
+                processRootFile(
+                    filename = os.path.join(processingParameters["dirPrefix"], subsystem.combinedFile.filename),
+                    outputFormatting = outputFormatting,
+                    subsystem = subsystem,
+                    forceRecreateSubsystem = processingParameters["forceRecreateSubsystem"],
+                    trendingManager = trendingManager,
+                    imageRenderer = imageRenderer,
+                )
+                changes.markChanged(runDir, subsystem.subsystem)
+                # Check the alarms for all of the values trended from this file at once.
+                if trendingManager:
+                    with profiler.stage("alarms"):
+                        trendingManager.checkPendingAlarms()
+                # TODO need additional info
+                # As of August 2018, this is where the trending container should step in to
+                # update the trending objects if they are not entirely up to date (say, if they're
+                # missing entries because the trending objects were recreated).
+                # TODO: Loop over process root file with various until it is up to date
+                pass
+            else:
+                # We often want to skip processing since most runs won't have new files and will not need to be processed most times.
+                logger.debug("Don't need to process {prettyName} for subsystem {subsystem}. It has already been processed".format(prettyName = run.prettyName, subsystem = subsystem.subsystem))
+
+        # Ensure that all of the images for this run have been written before committing.
+        if imageRenderer:
+            with profiler.stage("waitForImageRendering"):
+                imageRenderer.wait()
+        # Commit after we have successfully processed each run. Nothing is committed if the run is unchanged.
+        changes.commit()
+
 def processAllRuns(dbRoot = None, connection = None):
     """ Driver function for processing all available data, storing the results in a database and on disk.
 
@@ -841,6 +1769,10 @@ def processAllRuns(dbRoot = None, connection = None):
         None. However, it has extensive side effects. It changes values in the database related to runs,
             subsystems, etc, as well as writing image and ``json`` files to disk.
     """
+    # Record the timings of this processing cycle.
+    profiler.configure(processingParameters)
+    profiler.startCycle()
+
     # Get the database. Create the connection if necessary.
     created_connection_in_this_function = False
     if dbRoot is None or connection is None:
@@ -857,17 +1789,25 @@ def processAllRuns(dbRoot = None, connection = None):
         # At the end of the previous processing run, this flag wasn't clear so we can know
         # which files were just processed. Since we are now starting a new processing run,
         # we now must be clear this flag so we don't reprocess those runs again.
-        for run in itervalues(runs):
-            for subsystem in itervalues(run.subsystems):
-                if subsystem.newFile:
-                    subsystem.newFile = False
+        # The subsystems with new files are stored in an index, so we only need to visit those.
+        # Those runs may no longer be ongoing once the flags are cleared, so their summaries are updated as well.
+        previousRunDirs = set(runDir for runDir, _ in dbRoot["pendingSubsystems"]) if "pendingSubsystems" in dbRoot else set()
+        changes = runChangeTracker(pendingSubsystems = pendingSubsystemsIndex(dbRoot, runs))
     else:
         # Create the runs tree to store the information
         dbRoot["runs"] = BTrees.OOBTree.BTree()
         runs = dbRoot["runs"]
+        dbRoot["pendingSubsystems"] = BTrees.OOBTree.OOTreeSet()
+        changes = runChangeTracker(pendingSubsystems = dbRoot["pendingSubsystems"])
+        previousRunDirs = set()
+        # The run summaries are recreated along with the runs.
+        if "runSummaries" in dbRoot:
+            del dbRoot["runSummaries"]
 
         # The objects don't exist, so we need to create them.
-        # This will be a slow process, so the results should be stored.
+        # This will be a slow process, so the results should be stored. They are committed together (so that we
+        # never store a partially rebuilt database), but we create a savepoint after each run so that the
+        # objects which are already complete don't all need to be kept in memory.
         for runDir in utilities.findCurrentRunDirs(processingParameters["dirPrefix"]):
             # Create run objects.
             runs[runDir] = processingClasses.runContainer(runDir = runDir,
@@ -935,9 +1875,15 @@ def processAllRuns(dbRoot = None, connection = None):
                     run.subsystems[subsystem].combinedFile = processingClasses.fileContainer(os.path.join(runDir, fileLocationSubsystem, combinedFilename[0]), startOfRun)
                 else:
                     logger.info("No combined file in {runDir}".format(runDir = runDir))
+                # New subsystems need to be processed.
+                changes.markNewFiles(runDir, subsystem)
+
+            # The run is complete, so it doesn't need to be kept in memory until the commit.
+            transaction.savepoint(optimistic = True)
+            run._p_deactivate()
 
         # Commit any changes made to the database so we can proceed onto the actual processing.
-        transaction.commit()
+        changes.commit()
 
     # See how we've done so far.
     # This is quite verbose, so we don't want it to be normally enabled.
@@ -960,9 +1906,11 @@ def processAllRuns(dbRoot = None, connection = None):
 
     # First, we move files that we have received from the receivers into the Overwatch run structure and
     # add them to the database.
-    runDict = utilities.moveRootFiles(processingParameters["dirPrefix"], processingParameters["subsystemList"])
+    with profiler.stage("moveRootFiles"):
+        runDict = utilities.moveRootFiles(processingParameters["dirPrefix"], processingParameters["subsystemList"])
     logger.info("Files moved: {runDict}".format(runDict = runDict))
-    processMovedFilesIntoRuns(runs, runDict)
+    with profiler.stage("processMovedFilesIntoRuns"):
+        processMovedFilesIntoRuns(runs, runDict, changes = changes)
 
     # Potentially helpful debug information
     if processingParameters["debug"]:
@@ -976,50 +1924,56 @@ def processAllRuns(dbRoot = None, connection = None):
     # Regardless of the mode, this will result in a single "combined" file which contains all of the
     # most up to date files.
     # NOTE: We will only merge subsystems which contain new files.
-    mergeFiles.mergeRootFiles(runs, processingParameters["dirPrefix"],
-                              processingParameters["forceNewMerge"],
-                              processingParameters["cumulativeMode"])
+    with profiler.stage("mergeRootFiles"):
+        mergeFiles.mergeRootFiles(runs, processingParameters["dirPrefix"],
+                                  processingParameters["forceNewMerge"],
+                                  processingParameters["cumulativeMode"],
+                                  nWorkers = processingParameters["mergeWorkers"],
+                                  chunkSize = processingParameters["mergeChunkSize"],
+                                  runDirs = changes.pendingRuns())
 
     # Perform the actual histogram processing
     outputFormattingSave = os.path.join("{base}", "{name}.{ext}")
-    for runDir, run in iteritems(runs):
-        for subsystem in run.subsystems.values():
-            # Process the subsystem if there is a new file or we explicitly ask for
-            # processing by forcing it.
-            # We can force either generally (`forceReprocess`), or for particular runs (`forceReprocessRuns`)
-            if subsystem.newFile or processingParameters["forceReprocessing"] or int(runDir.replace("Run", "")) in processingParameters["forceReprocessRuns"]:
-                # Process combined root file: plot histograms and save the results of the processing
-                # in both image and `json` on the disk.
-                logger.info("About to process {prettyName}, {subsystem}".format(prettyName = run.prettyName, subsystem = subsystem.subsystem))
-                processRootFile(
-                    filename = os.path.join(processingParameters["dirPrefix"], subsystem.combinedFile.filename),
-                    outputFormatting = outputFormattingSave,
-                    subsystem = subsystem,
-                    forceRecreateSubsystem = processingParameters["forceRecreateSubsystem"],
-                    trendingManager = trendingManager,
-                )
-                # TODO need additional info
-                # As of August 2018, this is where the trending container should step in to
-                # update the trending objects if they are not entirely up to date (say, if they're
-                # missing entries because the trending objects were recreated).
-                # TODO: Loop over process root file with various until it is up to date
-                pass
-            else:
-                # We often want to skip processing since most runs won't have new files and will not need to be processed most times.
-                logger.debug("Don't need to process {prettyName} for subsystem {subsystem}. It has already been processed".format(prettyName = run.prettyName, subsystem = subsystem.subsystem))
-
-        # Commit after we have successfully processed each run
-        transaction.commit()
+    if processingParameters["processingWorkers"] > 1:
+        # Dispatch each (run, subsystem) to a pool of worker processes and merge the results back
+        # into the database here.
+        processSubsystemsInParallel(runs = runs,
+                                    outputFormatting = outputFormattingSave,
+                                    trendingManager = trendingManager,
+                                    nWorkers = processingParameters["processingWorkers"],
+                                    runDirs = changes.runsToProcess(runs),
+                                    changes = changes)
+    else:
+        # Images can be written by a separate pool of rendering workers while we continue processing.
+        renderer = None
+        if processingParameters["renderingWorkers"] > 1 and not processingParameters["renderImagesOnDemand"]:
+            renderer = imageRenderer(nWorkers = processingParameters["renderingWorkers"])
+        try:
+            processSubsystemsSerially(runs = runs,
+                                      outputFormatting = outputFormattingSave,
+                                      trendingManager = trendingManager,
+                                      imageRenderer = renderer,
+                                      runDirs = changes.runsToProcess(runs),
+                                      changes = changes)
+        finally:
+            if renderer:
+                renderer.close()
 
     logger.info("Finished standard processing!")
 
     # Run trending now that we have gotten to the most recent run
     if trendingManager:
-        trendingManager.processTrending()
+        with profiler.stage("trending"):
+            trendingManager.processTrending(subsystems = changes.changedSubsystemNames())
         # Commit after we have successfully processed the trending
-        transaction.commit()
+        with profiler.stage("commit"):
+            transaction.commit()
         logger.info("Finished trending processing!")
 
+    # Update the summaries of the modified runs, which are displayed in the web app run list.
+    with profiler.stage("runSummaries"):
+        updateRunSummaries(dbRoot, runs, changes.changedRuns | previousRunDirs)
+
     # Add users and secret key if debugging
     # This needs to be done manually if deploying, since this requires some care to ensure that everything is
     # configured properly. However, it's quite convenient for development.
@@ -1027,8 +1981,14 @@ def processAllRuns(dbRoot = None, connection = None):
         utilities.updateDBSensitiveParameters(dbRoot)
 
     # Ensure that any additional changes are committed and finish up with the database.
-    transaction.commit()
+    with profiler.stage("commit"):
+        transaction.commit()
     # Only close the connection if we created it here.
     if created_connection_in_this_function is True:
         connection.close()
 
+    # Store the timings of this cycle and make them available to the web app.
+    if profiler.finishCycle() is not None:
+        profiler.logSummary()
+        profiler.writeReports(processingParameters["dirPrefix"])
+
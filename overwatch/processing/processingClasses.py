@@ -22,8 +22,13 @@ from future.utils import itervalues
 
 # Database
 import BTrees.OOBTree
+import BTrees.IOBTree
+import BTrees.LOBTree
+import BTrees.Length
 import persistent
 
+import itertools
+
 import os
 import pendulum
 import logging
@@ -202,6 +207,202 @@ class runContainer(persistent.Persistent):
 
         return returnValue
 
+class runSummary(persistent.Persistent):
+    """ Compact summary of a run, which contains the information needed to display it in the run list.
+
+    Loading a ``runContainer`` also loads the subsystems and their files, which is far more than the run list
+    needs. Instead, the processing stores a summary of each run in the ``runSummaryIndex``, and updates it whenever
+    the run changes. The summary provides the same interface as the ``runContainer`` for the run list.
+
+    Args:
+        run (runContainer): Run to be summarized.
+
+    Attributes:
+        runDir (str): String containing the run number. For an example run 123456, it should be
+            formatted as ``Run123456``
+        runNumber (int): Run number extracted from the ``runDir``.
+        prettyName (str): Reformatting of the ``runDir`` for improved readability.
+        hltMode (str): Mode the HLT operated in for this run.
+        startOfRun (int): Start of the run in unix time. Default: ``None`` if there are no subsystems.
+        endOfRun (int): End of the run (ie. the most recent end of run of any subsystem) in unix time.
+            Default: ``None`` if there are no subsystems.
+        lastFileTime (int): Unix time stamp of the most recent file in any subsystem. Default: -1.
+        subsystemNames (tuple): Names of the subsystems which are available in the run.
+        newFile (bool): True if any subsystem received a new file during the most recent processing.
+    """
+    def __init__(self, run):
+        self.runDir = run.runDir
+        self.runNumber = run.runNumber
+        self.prettyName = run.prettyName
+        self.hltMode = None
+        self.startOfRun = None
+        self.endOfRun = None
+        self.lastFileTime = -1
+        self.subsystemNames = ()
+        self.newFile = False
+        self.update(run)
+
+    def __repr__(self):
+        """ Representation of the object. """
+        # Dummy call. See note at the top of the module.
+        self.runDir
+        return "{}(runDir = {runDir}, subsystemNames = {subsystemNames})".format(self.__class__.__name__, **self.__dict__)
+
+    def update(self, run):
+        """ Update the summary from the given run.
+
+        Only values which have changed are assigned, such that an unchanged summary isn't written to the
+        database again.
+
+        Args:
+            run (runContainer): Run to be summarized.
+        Returns:
+            bool: True if the summary changed.
+        """
+        values = {
+            "hltMode": run.hltMode,
+            "subsystemNames": tuple(run.subsystems.keys()),
+            "newFile": False,
+        }
+        endOfRun = None
+        lastFileTime = -1
+        for subsystem in itervalues(run.subsystems):
+            # As in ``runContainer.startOfRunTimeStamp()``, we take the last subsystem.
+            values["startOfRun"] = subsystem.startOfRun
+            endOfRun = subsystem.endOfRun if endOfRun is None else max(endOfRun, subsystem.endOfRun)
+            if subsystem.newFile is True:
+                values["newFile"] = True
+            # ``len()`` would load every bucket of the files tree, so we just look up the newest file.
+            try:
+                lastFileTime = max(lastFileTime, subsystem.files[subsystem.files.maxKey()].fileTime)
+            except ValueError:
+                # There are no files.
+                pass
+        values["endOfRun"] = endOfRun
+        values["lastFileTime"] = lastFileTime
+
+        changed = False
+        for name, value in iteritems(values):
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed = True
+        return changed
+
+    def isRunOngoing(self):
+        """ Checks if a run is ongoing.
+
+        Same as ``runContainer.isRunOngoing()``, but determined from the summary.
+
+        Args:
+            None
+        Returns:
+            bool: True if the run is ongoing.
+        """
+        if self.newFile is True:
+            return True
+        return 0 <= self.minutesSinceLastTimestamp() < 5
+
+    def minutesSinceLastTimestamp(self):
+        """ Determine the time since the last file timestamp in minutes.
+
+        Args:
+            None.
+        Returns:
+            float: Minutes since the timestamp of the most recent file. Default: -1.
+        """
+        if self.lastFileTime < 0:
+            return -1
+        # The timestamps of the files are set in Geneva. See ``runContainer.minutesSinceLastTimestamp()``.
+        geneva = pendulum.from_timestamp(self.lastFileTime, tz = "Europe/Zurich")
+        return pendulum.now().diff(geneva).in_minutes()
+
+    def startOfRunTimeStamp(self):
+        """ Provides the start of the run time stamp in a format suitable for display.
+
+        Args:
+            None
+        Returns:
+            str: Start of run time stamp formatted in an appropriate manner for display, or False if it
+                is not available.
+        """
+        if self.startOfRun is None:
+            return False
+        return subsystemContainer.prettyPrintUnixTime(self.startOfRun)
+
+class runSummaryIndex(persistent.Persistent):
+    """ Index of the ``runSummary`` of each run, which is read by the web app to display the run list.
+
+    The summaries are stored by run number, such that the most recent runs can be retrieved by iterating over
+    the keys in reverse, and the number of runs is stored separately, so that neither depend on the total
+    number of runs.
+
+    Args:
+        None.
+
+    Attributes:
+        summaries (BTrees.IOBTree.BTree): Summaries of the runs, keyed by run number.
+        numberOfRuns (BTrees.Length.Length): Number of runs in the index.
+    """
+    def __init__(self):
+        self.summaries = BTrees.IOBTree.BTree()
+        self.numberOfRuns = BTrees.Length.Length()
+
+    def __len__(self):
+        return self.numberOfRuns()
+
+    def update(self, run):
+        """ Add or update the summary of the given run.
+
+        Args:
+            run (runContainer): Run to be summarized.
+        Returns:
+            bool: True if the summary was added or changed.
+        """
+        summary = self.summaries.get(run.runNumber)
+        if summary is None:
+            self.summaries[run.runNumber] = runSummary(run)
+            self.numberOfRuns.change(1)
+            return True
+        return summary.update(run)
+
+    def mostRecentRun(self):
+        """ Summary of the most recent run, or None if there are no runs. """
+        if not self.summaries:
+            return None
+        return self.summaries[self.summaries.maxKey()]
+
+    def newestRuns(self):
+        """ Iterate over the run summaries, starting from the most recent run.
+
+        Each step only looks up the next smaller key, so the runs which are skipped are never loaded.
+
+        Args:
+            None.
+        Yields:
+            runSummary: Summaries of the runs in reverse order.
+        """
+        if not self.summaries:
+            return
+        runNumber = self.summaries.maxKey()
+        while True:
+            yield self.summaries[runNumber]
+            try:
+                runNumber = self.summaries.maxKey(runNumber - 1)
+            except ValueError:
+                # There are no smaller keys.
+                return
+
+    def page(self, offset, numberOfRuns):
+        """ Retrieve the summaries of a page of the run list.
+
+        Args:
+            offset (int): Number of runs to skip, starting from the most recent run.
+            numberOfRuns (int): Maximum number of runs to return.
+        Returns:
+            list: Summaries of the runs in the page, starting with the most recent.
+        """
+        return list(itertools.islice(self.newestRuns(), offset, offset + numberOfRuns))
+
 class subsystemContainer(persistent.Persistent):
     """ Object to represent a particular subsystem (detector).
 
@@ -234,8 +435,10 @@ class subsystemContainer(persistent.Persistent):
         fileLocationSubsystem (str): Subsystem name of where the files are actually located. If a subsystem has
             specific data files then this is just equal to the `subsystem`. However, if it relies on files inside
             of another subsystem, then this variable is equal to that subsystem name.
-        files (BTree): Dict-like object which describes subsystem ROOT files. Unix time of a given file is the key
-            and a file container for that file is the value.
+        files (BTrees.LOBTree.BTree): Dict-like object which describes subsystem ROOT files. Unix time of a given
+            file is the key and a file container for that file is the value. Files in a time range can be selected
+            via ``files.values(min = ..., max = ...)``. Subsystems stored before this was an ``LOBTree`` use an
+            ``OOBTree``, which provides the same interface.
         timeSlices (BTree): Dict-like object which describes subsystem time slices. A UUID is the dict key (so they
             can be uniquely identified), while a timeSliceContainer with the corresponding time slice properties
             is the value.
@@ -268,7 +471,14 @@ class subsystemContainer(persistent.Persistent):
             standard processing. The subsystem processing options can vary when processing a time slice,
             so storing the options allow us to return to the standard options when performing a full processing.
             Keys are the option names as string, while values are their corresponding values.
+        mergedFileTimes (OOTreeSet): Set-like object of the unix time stamps of the files which have been merged
+            into the combined file in reset mode. Only the files which are not yet included need to be merged into
+            the combined file. ``None`` if it is unknown which files are included, in which case the combined file
+            will be recreated from all files. Default: ``None``.
     """
+    # Class level default so that containers stored before this attribute was added are still valid.
+    mergedFileTimes = None
+
     def __init__(self, subsystem, runDir, startOfRun, endOfRun, showRootFiles = False, fileLocationSubsystem = None):
         self.subsystem = subsystem
         self.showRootFiles = showRootFiles
@@ -290,11 +500,14 @@ class subsystemContainer(persistent.Persistent):
 
         # Files
         # Be certain to set these after the subsystem has been created!
-        # Contains all files for that particular run
-        self.files = BTrees.OOBTree.BTree()
-        self.timeSlices = persistent.mapping.PersistentMapping()
+        # Contains all files for that particular run, keyed by their (integer) time stamp.
+        self.files = BTrees.LOBTree.BTree()
+        # Stored as a BTree so that adding a time slice only writes the bucket which contains it.
+        self.timeSlices = BTrees.OOBTree.BTree()
         # Only one combined file, so we do not need a dict!
         self.combinedFile = None
+        # Time stamps of the files which have been merged into the combined file (in reset mode).
+        self.mergedFileTimes = None
 
         # Directories
         self.setupDirectories(runDir)
@@ -681,14 +894,14 @@ class histogramContainer(persistent.Persistent):
         information (PersistentMapping): Information that is extracted from the histogram that should be
             stored persistently and displayed. This information will be displayed with the web app, with
             the key shown as a clickable button, and the value information stored behind it.
-        hist (ROOT.TH1): The histogram which this container wraps.
+        hist (ROOT.TH1): The histogram which this container wraps. It is not stored in the database.
         histType (ROOT.TClass): Class of the histogram. For example, ``ROOT.TH1F``. Can be used for functions
             that only apply to 2D hists, etc. It is stored separately from the histogram to allow for it to
             be available even when the underlying histogram is not (as occurs while setting up but not yet
             processing a histogram).
         drawOptions (str): Draw options to be passed to ``TH1.Draw()`` when drawing the histogram.
         canvas (ROOT.TCanvas): Canvas onto which the histogram will be plotted. Available after the histogram
-            has been classified (ie in processing functions).
+            has been classified (ie in processing functions). It is not stored in the database.
         projectionFunctionsToApply (PersistentList): List-like object of functions that perform projections
             to the histogram that is represented by this container. See the :doc:`detector subsystem README </detectorPluginsReadme>`
             for more information.
@@ -698,7 +911,17 @@ class histogramContainer(persistent.Persistent):
         trendingObjects (PersistentList): List-like object of trending objects which operate on this
             histogram. See the :doc:`detector subsystem and trending README </detectorPluginsReadme>`
             for more information.
+        renderFingerprint (str): Fingerprint of the histogram content and processing options when the
+            histogram was last written to image and ``json``. Used to skip writing unchanged histograms.
+            Default: ``None``.
     """
+    # Class level default so that containers stored before this attribute was added are still valid.
+    renderFingerprint = None
+    # The histogram and canvas only exist during processing. They are stored in volatile (``_v_``) attributes,
+    # which ZODB never stores and which don't mark the container as modified. Otherwise, assigning them would
+    # cause every processed histogram container to be written to the database again in each processing cycle.
+    _volatileAttributes = ("hist", "canvas")
+
     def __init__(self, histName, histList = None, prettyName = None):
         # Replace any slashes with underscores to ensure that it can be used safely as a filename
         #histName = histName.replace("/", "_")
@@ -722,6 +945,24 @@ class histogramContainer(persistent.Persistent):
         self.functionsToApply = persistent.list.PersistentList()
         # Trending objects which use this histogram
         self.trendingObjects = persistent.list.PersistentList()
+        # Fingerprint of the histogram when it was last written
+        self.renderFingerprint = None
+
+    def __setattr__(self, name, value):
+        """ Store the volatile attributes under their ``_v_`` name, such that they are never stored in the database. """
+        if name in histogramContainer._volatileAttributes:
+            name = "_v_" + name
+        super(histogramContainer, self).__setattr__(name, value)
+
+    @property
+    def hist(self):
+        """ ROOT.TH1: The histogram which this container wraps. ``None`` if it isn't available. """
+        return getattr(self, "_v_hist", None)
+
+    @property
+    def canvas(self):
+        """ ROOT.TCanvas: Canvas onto which the histogram will be plotted. ``None`` if it isn't available. """
+        return getattr(self, "_v_canvas", None)
 
     def __repr__(self):
         """ Representation of the object. """
@@ -733,10 +974,13 @@ class histogramContainer(persistent.Persistent):
         """ Print many of the elements of the object. """
         # Dummy call. See note at the top of the module.
         self.histName
+        # The volatile attributes aren't stored in ``__dict__``.
+        values = dict(self.__dict__)
+        values.update(hist = self.hist, canvas = self.canvas)
         return "{}: histName = {histName}, histList = {histList}, prettyName = {prettyName}," \
                " information: {information}, hist: {hist}, histType: {histType}, drawOptions: {drawOptions}," \
                " canvas: {canvas}, projectionFunctionsToApply: {projectionFunctionsToApply}," \
-               " functionsToApply: {functionsToApply}".format(self.__class__.__name__, **self.__dict__)
+               " functionsToApply: {functionsToApply}".format(self.__class__.__name__, **values)
 
     def retrieveHistogram(self, ROOT, fIn = None, trending = None):
         """ Retrieve the histogram from the given file or trending container.
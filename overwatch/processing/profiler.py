@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+""" Timing instrumentation for the processing.
+
+The ``processingProfiler`` records how long each stage of a processing cycle takes (moving and merging files,
+retrieving histograms, plugin functions, ``TBufferJSON``, ``SaveAs``, trending, database commits, ...), as well
+as the time spent on each histogram and in each plugin function. The most recent cycles are kept in a rolling
+store, and they are written to the ``profiling`` directory in the data directory after each cycle as:
+
+- ``metrics.prom``: The most recent cycle in the Prometheus text exposition format. It is served by the web app
+  at ``/metrics``.
+- ``report.json``: A summary of the stored cycles, including the slowest histograms and plugin functions.
+  It is served by the web app at ``/monitoring/profiling``.
+
+Note:
+    The time of a stage includes the time of any stages which are nested within it. For example, the time
+    of ``processHist`` includes the time of the plugin functions which are called for the histogram.
+"""
+
+# Python 2/3 support
+from __future__ import print_function
+from future.utils import iteritems
+
+import collections
+import contextlib
+import heapq
+import json
+import os
+import time
+import timeit
+import logging
+logger = logging.getLogger(__name__)
+
+# Name of the directory (within the data directory) where the reports are written.
+profilingDir = "profiling"
+metricsFilename = "metrics.prom"
+reportFilename = "report.json"
+
+class timingStatistics(object):
+    """ Accumulated timing of one stage or function.
+
+    Attributes:
+        count (int): Number of times that it was measured.
+        total (float): Total time in seconds.
+        maximum (float): Longest single measurement in seconds.
+    """
+    __slots__ = ["count", "total", "maximum"]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.maximum = 0.
+
+    def __getstate__(self):
+        return (self.count, self.total, self.maximum)
+
+    def __setstate__(self, state):
+        (self.count, self.total, self.maximum) = state
+
+    def add(self, duration):
+        """ Add a single measurement. """
+        self.count += 1
+        self.total += duration
+        self.maximum = max(self.maximum, duration)
+
+    def merge(self, other):
+        """ Add all of the measurements of another ``timingStatistics``. """
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    def toDict(self):
+        return {"count": self.count, "total": self.total, "max": self.maximum}
+
+class profiledCycle(object):
+    """ Timings of a single processing cycle.
+
+    Args:
+        startTime (float): Unix time when the cycle started.
+
+    Attributes:
+        startTime (float): Unix time when the cycle started.
+        duration (float): Duration of the cycle in seconds. None until the cycle is finished.
+        stages (dict): ``timingStatistics`` for each stage, keyed by stage name.
+        histograms (dict): Total time in seconds spent on each histogram, keyed by (subsystem, runDir, histName).
+        functions (dict): ``timingStatistics`` for each plugin function, keyed by (subsystem, functionName).
+    """
+    def __init__(self, startTime):
+        self.startTime = startTime
+        self.duration = None
+        self.stages = collections.defaultdict(timingStatistics)
+        self.histograms = collections.defaultdict(float)
+        self.functions = collections.defaultdict(timingStatistics)
+
+    def merge(self, other):
+        """ Add the timings of another cycle, such as the timings recorded in a worker process. """
+        for name, stats in iteritems(other.stages):
+            self.stages[name].merge(stats)
+        for key, duration in iteritems(other.histograms):
+            self.histograms[key] += duration
+        for key, stats in iteritems(other.functions):
+            self.functions[key].merge(stats)
+
+    def slowestHistograms(self, n):
+        """ Retrieve the ``n`` histograms on which the most time was spent.
+
+        Returns:
+            list: (duration, (subsystem, runDir, histName)) tuples, slowest first.
+        """
+        return heapq.nlargest(n, ((duration, key) for key, duration in iteritems(self.histograms)))
+
+    def slowestFunctions(self, n):
+        """ Retrieve the ``n`` plugin functions on which the most time was spent.
+
+        Returns:
+            list: (timingStatistics, (subsystem, functionName)) tuples, slowest first.
+        """
+        return heapq.nlargest(n, ((stats, key) for key, stats in iteritems(self.functions)),
+                              key = lambda x: x[0].total)
+
+    def summary(self, nSlowest):
+        """ Summarize the cycle for the ``json`` report.
+
+        Args:
+            nSlowest (int): Number of slowest histograms and plugin functions to include.
+        Returns:
+            dict: Summary of the cycle.
+        """
+        return {
+            "startTime": self.startTime,
+            "duration": self.duration,
+            "stages": {name: stats.toDict() for name, stats in iteritems(self.stages)},
+            "slowestHistograms": [
+                {"subsystem": subsystem, "run": runDir, "histogram": histName, "seconds": duration}
+                for duration, (subsystem, runDir, histName) in self.slowestHistograms(nSlowest)
+            ],
+            "slowestFunctions": [
+                dict(stats.toDict(), subsystem = subsystem, function = functionName)
+                for stats, (subsystem, functionName) in self.slowestFunctions(nSlowest)
+            ],
+        }
+
+def _escapeLabel(value):
+    """ Escape a label value for the Prometheus text format. """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _metric(name, value, **labels):
+    """ Format a single sample for the Prometheus text format. """
+    if labels:
+        formattedLabels = ",".join("{k}=\"{v}\"".format(k = k, v = _escapeLabel(v)) for k, v in sorted(iteritems(labels)))
+        name = "{name}{{{labels}}}".format(name = name, labels = formattedLabels)
+    return "{name} {value!r}".format(name = name, value = float(value))
+
+class processingProfiler(object):
+    """ Records the timings of the processing cycles.
+
+    The timings are only recorded between ``startCycle()`` and ``finishCycle()``. Outside of a cycle (or when
+    the profiler is disabled), the measurements do nothing.
+
+    Args:
+        maxCycles (int): Number of cycles which are kept. Default: 20.
+        nSlowest (int): Number of slowest histograms and plugin functions which are reported. Default: 10.
+        timer (callable): Returns a time in seconds for measuring durations. Default: ``timeit.default_timer``.
+
+    Attributes:
+        enabled (bool): True if timings are recorded.
+        cycles (collections.deque): Finished cycles, oldest first.
+        current (profiledCycle): Cycle which is currently being recorded. None if there isn't one.
+        nSlowest (int): Number of slowest histograms and plugin functions which are reported.
+    """
+    def __init__(self, maxCycles = 20, nSlowest = 10, timer = timeit.default_timer):
+        self.enabled = True
+        self.cycles = collections.deque(maxlen = maxCycles)
+        self.current = None
+        self.nSlowest = nSlowest
+        self.timer = timer
+        self._cycleStart = None
+
+    def configure(self, parameters):
+        """ Set the profiling options from the configuration parameters. """
+        self.enabled = parameters.get("profiling", self.enabled)
+        maxCycles = parameters.get("profilingCycles", self.cycles.maxlen)
+        if maxCycles != self.cycles.maxlen:
+            self.cycles = collections.deque(self.cycles, maxlen = maxCycles)
+        self.nSlowest = parameters.get("profilingSlowest", self.nSlowest)
+
+    def startCycle(self):
+        """ Start recording a new processing cycle. Any unfinished cycle is discarded. """
+        self.current = profiledCycle(startTime = time.time()) if self.enabled else None
+        self._cycleStart = self.timer()
+
+    def finishCycle(self):
+        """ Finish recording the current cycle and store it.
+
+        Returns:
+            profiledCycle: The finished cycle, or None if no cycle was being recorded.
+        """
+        cycle = self.detachCycle()
+        if cycle is not None:
+            cycle.duration = self.timer() - self._cycleStart
+            self.cycles.append(cycle)
+        return cycle
+
+    def detachCycle(self):
+        """ Stop recording the current cycle without storing it.
+
+        It is used in worker processes, which send their timings to the main process to be merged
+        into the cycle there.
+
+        Returns:
+            profiledCycle: The cycle which was being recorded, or None if there wasn't one.
+        """
+        cycle, self.current = self.current, None
+        return cycle
+
+    def mergeCycle(self, cycle):
+        """ Merge timings recorded elsewhere (such as in a worker process) into the current cycle. """
+        if self.current is not None and cycle is not None:
+            self.current.merge(cycle)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ Measure the time of a processing stage.
+
+        Args:
+            name (str): Name of the stage.
+        """
+        cycle = self.current
+        if cycle is None:
+            yield
+            return
+        start = self.timer()
+        try:
+            yield
+        finally:
+            cycle.stages[name].add(self.timer() - start)
+
+    @contextlib.contextmanager
+    def histogram(self, subsystem, runDir, histName):
+        """ Measure the time spent processing a histogram. It is also recorded as the ``processHist`` stage.
+
+        Args:
+            subsystem (str): Name of the subsystem.
+            runDir (str): Run directory (for example, "Run123").
+            histName (str): Name of the histogram.
+        """
+        cycle = self.current
+        if cycle is None:
+            yield
+            return
+        start = self.timer()
+        try:
+            yield
+        finally:
+            duration = self.timer() - start
+            cycle.stages["processHist"].add(duration)
+            cycle.histograms[(subsystem, runDir, histName)] += duration
+
+    @contextlib.contextmanager
+    def function(self, subsystem, func):
+        """ Measure the time of a plugin function. It is also recorded as the ``pluginFunctions`` stage.
+
+        Args:
+            subsystem (str): Name of the subsystem.
+            func (callable): Plugin function which is called.
+        """
+        cycle = self.current
+        if cycle is None:
+            yield
+            return
+        start = self.timer()
+        try:
+            yield
+        finally:
+            duration = self.timer() - start
+            cycle.stages["pluginFunctions"].add(duration)
+            cycle.functions[(subsystem, getattr(func, "__name__", str(func)))].add(duration)
+
+    def report(self):
+        """ Create the ``json`` report of the stored cycles.
+
+        Returns:
+            dict: Summary of each stored cycle (most recent first), as well as the slowest histograms and plugin
+                functions over all stored cycles.
+        """
+        combined = profiledCycle(startTime = None)
+        for cycle in self.cycles:
+            combined.merge(cycle)
+        combinedSummary = combined.summary(self.nSlowest)
+        return {
+            "cycles": [cycle.summary(self.nSlowest) for cycle in reversed(self.cycles)],
+            "slowestHistograms": combinedSummary["slowestHistograms"],
+            "slowestFunctions": combinedSummary["slowestFunctions"],
+        }
+
+    def prometheusText(self):
+        """ Format the timings of the most recent cycle in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics in the Prometheus text format. Empty if no cycle has been finished.
+        """
+        if not self.cycles:
+            return ""
+        cycle = self.cycles[-1]
+        lines = [
+            "# HELP overwatch_processing_cycle_duration_seconds Duration of the most recent processing cycle.",
+            "# TYPE overwatch_processing_cycle_duration_seconds gauge",
+            _metric("overwatch_processing_cycle_duration_seconds", cycle.duration),
+            "# HELP overwatch_processing_cycle_start_time_seconds Unix time when the most recent processing cycle started.",
+            "# TYPE overwatch_processing_cycle_start_time_seconds gauge",
+            _metric("overwatch_processing_cycle_start_time_seconds", cycle.startTime),
+            "# HELP overwatch_processing_stage_seconds Time spent in each stage of the most recent processing cycle.",
+            "# TYPE overwatch_processing_stage_seconds gauge",
+        ]
+        lines.extend(_metric("overwatch_processing_stage_seconds", stats.total, stage = name)
+                     for name, stats in sorted(iteritems(cycle.stages)))
+        lines.extend([
+            "# HELP overwatch_processing_stage_calls Number of times that each stage ran in the most recent processing cycle.",
+            "# TYPE overwatch_processing_stage_calls gauge",
+        ])
+        lines.extend(_metric("overwatch_processing_stage_calls", stats.count, stage = name)
+                     for name, stats in sorted(iteritems(cycle.stages)))
+        lines.extend([
+            "# HELP overwatch_processing_histogram_seconds Time spent on the slowest histograms in the most recent processing cycle.",
+            "# TYPE overwatch_processing_histogram_seconds gauge",
+        ])
+        lines.extend(_metric("overwatch_processing_histogram_seconds", duration,
+                             subsystem = subsystem, run = runDir, histogram = histName)
+                     for duration, (subsystem, runDir, histName) in cycle.slowestHistograms(self.nSlowest))
+        lines.extend([
+            "# HELP overwatch_processing_function_seconds Time spent in the slowest plugin functions in the most recent processing cycle.",
+            "# TYPE overwatch_processing_function_seconds gauge",
+        ])
+        lines.extend(_metric("overwatch_processing_function_seconds", stats.total,
+                             subsystem = subsystem, function = functionName)
+                     for stats, (subsystem, functionName) in cycle.slowestFunctions(self.nSlowest))
+        return "\n".join(lines) + "\n"
+
+    def writeReports(self, dirPrefix):
+        """ Write the Prometheus metrics and the ``json`` report to the profiling directory.
+
+        The files are replaced atomically, so the web app never reads a partially written file.
+
+        Args:
+            dirPrefix (str): Path to the data directory.
+        Returns:
+            None.
+        """
+        if not self.cycles:
+            return
+        outputDir = os.path.join(dirPrefix, profilingDir)
+        if not os.path.exists(outputDir):
+            os.makedirs(outputDir)
+        for filename, content in [(metricsFilename, self.prometheusText()),
+                                  (reportFilename, json.dumps(self.report()))]:
+            outputFilename = os.path.join(outputDir, filename)
+            tempFilename = outputFilename + ".tmp"
+            with open(tempFilename, "w") as f:
+                f.write(content)
+            os.rename(tempFilename, outputFilename)
+
+    def logSummary(self):
+        """ Log the stages of the most recent cycle, slowest first. """
+        if not self.cycles:
+            return
+        cycle = self.cycles[-1]
+        stages = sorted(iteritems(cycle.stages), key = lambda x: x[1].total, reverse = True)
+        logger.info("Processing cycle took {duration:.2f} s. Stages: {stages}".format(
+            duration = cycle.duration,
+            stages = ", ".join("{name}: {total:.2f} s".format(name = name, total = stats.total) for name, stats in stages)))
+
+profiler = processingProfiler()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+""" Columnar archive of trended values.
+
+Every trended value is written to Parquet files, partitioned by subsystem and run number, such that the
+trending can be studied offline without opening the database. The files are laid out as::
+
+    {archiveDir}/{subsystemName}/runNumber={runNumber}/part-{uuid}.parquet
+
+with the columns ``trendName``, ``timestamp``, ``value`` and ``error`` (the run number is stored in the
+partition directory name). Queries use the partitioning and the Parquet statistics to only read
+the required data. Each processing cycle adds a (small) file to the partitions which received new values,
+so once a partition contains too many files, they are compacted into a single file.
+
+Note:
+    This requires ``pyarrow`` (and ``pandas`` to return ``DataFrame``), which are optional dependencies.
+    They can be installed via the ``archive`` extra.
+"""
+import logging
+import os
+import uuid
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+    pq = None
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Columns which are written to the archive (other than the run number partition).
+ARCHIVE_COLUMNS = ["trendName", "timestamp", "value", "error"]
+
+
+def _checkPyarrowAvailable():
+    if pyarrow is None:
+        raise ImportError("pyarrow is required for the trending archive. Install it via the archive extra.")
+
+
+class TrendingArchiveWriter(object):
+    """ Collects new trended values and writes them to the archive.
+
+    Values are buffered in memory and written when ``flush()`` is called (once per processing cycle),
+    such that each cycle adds one file per subsystem and run. Once a subsystem and run has more than
+    ``maxFilesPerPartition`` files, they are compacted into one file, so the number of files doesn't
+    grow with the number of processing cycles.
+
+    Args:
+        archiveDir (str): Path to the base directory of the archive.
+        maxFilesPerPartition (int): Maximum number of files for each subsystem and run before they are
+            compacted. Default: 10.
+
+    Attributes:
+        archiveDir (str): Path to the base directory of the archive.
+        maxFilesPerPartition (int): Maximum number of files for each subsystem and run before they are compacted.
+        pending (dict): Buffered values. Keys are ``(subsystemName, runNumber)``, while the values are
+            lists of ``(trendName, timestamp, value, error)``.
+    """
+
+    def __init__(self, archiveDir, maxFilesPerPartition=10):  # type: (str, int) -> None
+        _checkPyarrowAvailable()
+        self.archiveDir = archiveDir
+        self.maxFilesPerPartition = max(int(maxFilesPerPartition), 1)
+        self.pending = defaultdict(list)  # type: Dict[Tuple[str, int], List[Tuple[str, float, float, float]]]
+
+    def record(self, subsystemName, trendName, timestamp, runNumber, value, error):
+        # type: (str, str, float, int, float, float) -> None
+        """ Buffer a new trended value to be written to the archive. """
+        self.pending[(subsystemName, int(runNumber))].append((trendName, float(timestamp), float(value), float(error)))
+
+    def flush(self):  # type: () -> None
+        """ Write all buffered values to the archive. """
+        for (subsystemName, runNumber), rows in self.pending.items():
+            if not rows:
+                continue
+            partitionDir = os.path.join(self.archiveDir, subsystemName, "runNumber={runNumber}".format(runNumber=runNumber))
+            if not os.path.exists(partitionDir):
+                os.makedirs(partitionDir)
+
+            columns = list(zip(*rows))
+            table = pyarrow.Table.from_arrays([
+                pyarrow.array(columns[0], type=pyarrow.string()),
+                pyarrow.array(columns[1], type=pyarrow.float64()),
+                pyarrow.array(columns[2], type=pyarrow.float64()),
+                pyarrow.array(columns[3], type=pyarrow.float64()),
+            ], names=ARCHIVE_COLUMNS)
+            filename = os.path.join(partitionDir, "part-{id}.parquet".format(id=uuid.uuid4().hex))
+            logger.debug("Writing {n} trended values to {filename}".format(n=len(rows), filename=filename))
+            pq.write_table(table, filename)
+            self.compact(partitionDir)
+        self.pending.clear()
+
+    def compact(self, partitionDir):  # type: (str) -> None
+        """ Merge the files of a partition into a single file if it contains too many files.
+
+        The merged file is written under a hidden name (which is ignored by queries) and then moved into
+        place before the merged files are removed.
+
+        Args:
+            partitionDir (str): Path to the partition (subsystem and run) directory.
+        Returns:
+            None.
+        """
+        filenames = sorted(os.path.join(partitionDir, name) for name in os.listdir(partitionDir)
+                           if name.startswith("part-") and name.endswith(".parquet"))
+        if len(filenames) <= self.maxFilesPerPartition:
+            return
+
+        table = pyarrow.concat_tables([pq.read_table(filename, columns=ARCHIVE_COLUMNS) for filename in filenames])
+        partId = uuid.uuid4().hex
+        tempFilename = os.path.join(partitionDir, ".part-{id}.parquet".format(id=partId))
+        pq.write_table(table, tempFilename)
+        os.rename(tempFilename, os.path.join(partitionDir, "part-{id}.parquet".format(id=partId)))
+        for filename in filenames:
+            os.remove(filename)
+        logger.debug("Compacted {n} files with {nRows} trended values in {partitionDir}".format(
+            n=len(filenames), nRows=table.num_rows, partitionDir=partitionDir))
+
+
+def queryTrend(archiveDir, subsystemName, trendName, minTime=None, maxTime=None, minRun=None, maxRun=None,
+               asDataFrame=False):
+    # type: (str, str, str, Optional[float], Optional[float], Optional[int], Optional[int], bool) -> Any
+    """ Retrieve the archived values of a trend.
+
+    Args:
+        archiveDir (str): Path to the base directory of the archive.
+        subsystemName (str): Subsystem of the trend.
+        trendName (str): Name of the trending object.
+        minTime (float): Minimum unix time to include. Default: None.
+        maxTime (float): Maximum unix time to include. Default: None.
+        minRun (int): Minimum run number to include. Default: None.
+        maxRun (int): Maximum run number to include. Default: None.
+        asDataFrame (bool): If True, return a ``pandas.DataFrame``. Default: False.
+    Returns:
+        np.ndarray or pandas.DataFrame: Values sorted by time, with the columns ``timestamp``, ``runNumber``,
+            ``value`` and ``error``. A numpy structured array is returned unless a ``DataFrame`` is requested.
+    """
+    _checkPyarrowAvailable()
+    filters = [("trendName", "=", trendName)]
+    for column, operator, value in [("timestamp", ">=", minTime), ("timestamp", "<=", maxTime),
+                                    ("runNumber", ">=", minRun), ("runNumber", "<=", maxRun)]:
+        if value is not None:
+            filters.append((column, operator, value))
+
+    subsystemDir = os.path.join(archiveDir, subsystemName)
+    columns = ["timestamp", "runNumber", "value", "error"]
+    if not os.path.exists(subsystemDir):
+        table = pyarrow.Table.from_arrays([pyarrow.array([], type=pyarrow.float64()) for _ in columns], names=columns)
+    else:
+        table = pq.read_table(subsystemDir, columns=columns, filters=filters, partitioning="hive")
+
+    result = np.zeros(table.num_rows, dtype=[("timestamp", np.float64), ("runNumber", np.int64),
+                                             ("value", np.float64), ("error", np.float64)])
+    for column in columns:
+        result[column] = table.column(column).to_numpy() if table.num_rows else []
+    result = np.sort(result, order="timestamp")
+
+    if asDataFrame:
+        import pandas as pd
+        return pd.DataFrame(result)
+    return result
@@ -10,9 +10,15 @@ TRENDING = 'trending'
 SUBSYSTEMS = 'subsystemList'
 DIR_PREFIX = 'dirPrefix'
 RECREATE = 'forceRecreateSubsystem'
+FORCE_REPROCESSING = 'forceReprocessing'
 
 EXTENSION = 'fileExtension'
 ENTRIES = "entries"
+HISTORY_CHUNK_SIZE = "trendingHistoryChunkSize"
+WINDOW = "trendingWindow"
+ARCHIVE = "trendingArchive"
+ARCHIVE_DIR = "archive"
+ARCHIVE_MAX_FILES = "trendingArchiveMaxFiles"
 
 IMAGE = 'img'
 JSON = 'json'
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+""" Unbounded, timestamped storage for trended values.
+
+The history is split into fixed size persistent chunks, such that appending a value only modifies (and
+therefore only requires storing) the most recent chunk, regardless of how long the history becomes.
+"""
+import numpy as np
+from BTrees.Length import Length
+from BTrees.OOBTree import BTree
+from persistent import Persistent
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+
+# Columns stored for each trended value.
+HISTORY_DTYPE = np.dtype([
+    ("timestamp", np.float64),
+    ("runNumber", np.int64),
+    ("value", np.float64),
+    ("error", np.float64),
+])
+
+
+class TrendingHistoryChunk(Persistent):
+    """ Fixed size block of trended values.
+
+    Args:
+        chunkSize (int): Maximum number of entries in the chunk.
+
+    Attributes:
+        entries (np.ndarray): Preallocated structured array with the columns defined in ``HISTORY_DTYPE``.
+        size (int): Number of entries which are filled.
+    """
+
+    def __init__(self, chunkSize):  # type: (int) -> None
+        self.entries = np.zeros(chunkSize, dtype=HISTORY_DTYPE)
+        self.size = 0
+
+    def isFull(self):  # type: () -> bool
+        return self.size >= len(self.entries)
+
+    def append(self, timestamp, runNumber, value, error):  # type: (float, int, float, float) -> None
+        self.entries[self.size] = (timestamp, runNumber, value, error)
+        self.size += 1
+        # The array is modified in place, so ZODB needs to be told explicitly.
+        self._p_changed = True
+
+    def filled(self):  # type: () -> np.ndarray
+        return self.entries[:self.size]
+
+
+class TrendingHistory(Persistent):
+    """ Complete history of a trended quantity.
+
+    The chunks are stored in a ``BTree`` keyed by the timestamp of their first entry, so a time window
+    only needs to load the chunks which overlap with it. Values are expected to be appended in
+    chronological order.
+
+    Args:
+        chunkSize (int): Number of entries per chunk. Default: 1000.
+
+    Attributes:
+        chunkSize (int): Number of entries per chunk.
+        chunks (BTree): Chunks of entries, keyed by the timestamp of their first entry.
+        lastChunk (TrendingHistoryChunk): Chunk to which new values are appended.
+        numberOfEntries (Length): Number of entries in all chunks. It is stored separately so that the length
+            is available without loading every chunk.
+    """
+    # Class level default so that histories stored before this attribute was added are still valid.
+    numberOfEntries = None  # type: Optional[Length]
+
+    def __init__(self, chunkSize=1000):  # type: (int) -> None
+        self.chunkSize = chunkSize
+        self.chunks = BTree()
+        self.lastChunk = None
+        self.numberOfEntries = Length()
+
+    def append(self, timestamp, runNumber, value, error=0.):  # type: (float, int, float, float) -> None
+        """ Store a new trended value.
+
+        Args:
+            timestamp (float): Unix time corresponding to the value.
+            runNumber (int): Run number corresponding to the value. -1 if unknown.
+            value (float): Trended value.
+            error (float): Error of the trended value. Default: 0.
+        Returns:
+            None.
+        """
+        if self.lastChunk is None or self.lastChunk.isFull():
+            self.lastChunk = TrendingHistoryChunk(self.chunkSize)
+            key = float(timestamp)
+            # Chunks started at the same time shouldn't replace each other.
+            while key in self.chunks:
+                key = float(np.nextafter(key, np.inf))
+            self.chunks[key] = self.lastChunk
+        self.lastChunk.append(timestamp, runNumber, value, error)
+        if self.numberOfEntries is None:
+            # Count the existing entries once for a history stored without the counter.
+            self.numberOfEntries = Length(self._countEntries() - 1)
+        self.numberOfEntries.change(1)
+
+    def _countEntries(self):  # type: () -> int
+        return sum(chunk.size for chunk in self.chunks.values())
+
+    def __len__(self):
+        if self.numberOfEntries is None:
+            return self._countEntries()
+        return self.numberOfEntries()
+
+    def latestTimestamp(self):  # type: () -> Optional[float]
+        """ Timestamp of the most recently appended entry, or None if the history is empty. """
+        if self.lastChunk is None or self.lastChunk.size == 0:
+            return None
+        return self.lastChunk.entries["timestamp"][self.lastChunk.size - 1]
+
+    def window(self, minTime=None, maxTime=None):  # type: (Optional[float], Optional[float]) -> np.ndarray
+        """ Retrieve the entries within a time window.
+
+        Args:
+            minTime (float): Minimum unix time to include. Default: None, which includes the start of the history.
+            maxTime (float): Maximum unix time to include. Default: None, which includes the end of the history.
+        Returns:
+            np.ndarray: Structured array with the columns defined in ``HISTORY_DTYPE``.
+        """
+        if not self.chunks:
+            return np.zeros(0, dtype=HISTORY_DTYPE)
+
+        # The chunk which contains ``minTime`` starts before it, so start from the last chunk starting at or before it.
+        startKey = None
+        if minTime is not None and self.chunks.minKey() <= minTime:
+            startKey = self.chunks.maxKey(minTime)
+        chunks = self.chunks.values(min=startKey, max=maxTime)
+
+        entries = np.concatenate([chunk.filled() for chunk in chunks] or [np.zeros(0, dtype=HISTORY_DTYPE)])
+        selected = np.ones(len(entries), dtype=bool)
+        if minTime is not None:
+            selected &= entries["timestamp"] >= minTime
+        if maxTime is not None:
+            selected &= entries["timestamp"] <= maxTime
+        return entries[selected]
@@ -9,7 +9,7 @@ notify appropriate objects about new histograms, manage processing trending hist
 """
 import logging
 import os
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
 import ROOT
 from BTrees.OOBTree import BTree
@@ -17,8 +17,12 @@ from persistent import Persistent
 
 import overwatch.processing.pluginManager as pluginManager
 import overwatch.processing.trending.constants as CON
+from overwatch.processing.alarms.alarm import Alarm
 from overwatch.processing.alarms.collectors import Mail, SlackNotification
 from overwatch.processing.alarms.collectors import alarmCollector
+from overwatch.processing.alarms.delivery import alarmDeliveryQueue
+from overwatch.processing.alarms.plan import AlarmPlan
+from overwatch.processing.trending.archive import TrendingArchiveWriter
 
 logger = logging.getLogger(__name__)
 
@@ -54,18 +58,29 @@ class TrendingManager(Persistent):
         parameters (dict): Parameters read from configuration files
         histToTrending (dict): Dictionary whose key is histogram and value is the list of trending objects
         trendingDB (BTree): Database for trending
+        archive (TrendingArchiveWriter): Writes all new trended values to the columnar archive.
+            None if the archive is disabled.
+        pendingAlarmChecks (OrderedDict): Trending objects which received new values, but whose alarms haven't
+            been checked yet. Values are the list of (histogram, number of trended values) for each new value.
         """
 
     def __init__(self, dbRoot, parameters):  # type: (PersistentMapping, dict)->None
         self.parameters = parameters
         self.histToTrending = defaultdict(list)  # type: Dict[str, List[TrendingObject]]
+        self.pendingAlarmChecks = OrderedDict()  # type: Dict[TrendingObject, List[Tuple[histogramContainer, int]]]
 
         self._prepareDataBase(CON.TRENDING, dbRoot)
         self.trendingDB = dbRoot[CON.TRENDING]  # type: BTree[str, BTree[str, TrendingObject]]
 
         self._prepareDirStructure()
+        self.archive = None  # type: Optional[TrendingArchiveWriter]
+        if parameters.get(CON.ARCHIVE, False):
+            self.archive = TrendingArchiveWriter(
+                os.path.join(self.parameters[CON.DIR_PREFIX], CON.TRENDING, CON.ARCHIVE_DIR),
+                maxFilesPerPartition=parameters.get(CON.ARCHIVE_MAX_FILES, 10))
         Mail(alarmsParameters=parameters)
         SlackNotification(alarmsParameters=parameters)
+        alarmDeliveryQueue.configure(parameters)
 
     def _prepareDirStructure(self):
         trendingDir = os.path.join(self.parameters[CON.DIR_PREFIX], CON.TRENDING, '{{subsystemName}}', '{type}')
@@ -127,48 +142,104 @@ class TrendingManager(Persistent):
         for histName in histogramNames:
             self.histToTrending[histName].append(trendingObject)
 
+    def isTrended(self, histName):  # type: (str) -> bool
+        """ Check whether the histogram is subscribed to at least one trending object. """
+        return histName in self.histToTrending
+
     def resetDB(self):  # TODO not used - is it needed?
         self.trendingDB.clear()
         self._prepareDirStructure()
 
-    def processTrending(self):
+    def processTrending(self, subsystems=None):  # type: (Optional[Iterable[str]]) -> None
         """ Process the trending objects.
 
-        It loops over the trending objects and passes them to ``processHist()`` for plotting.
+        It loops over the trending objects and passes those which received new values since they were last
+        plotted to ``processHist()``. Collected alarm messages are shown once per processing cycle.
 
         Args:
-            None.
+            subsystems (iterable): Names of the subsystems which were processed in this cycle. Only their trending
+                objects can have new values, so only they are loaded. Default: None, which checks all subsystems.
         Returns:
             None.
         """
+        self.checkPendingAlarms()
+
         # Cannot have same name as other canvases, otherwise the canvas will be replaced, leading to segfaults
         canvasName = 'processTrendingCanvas'
         canvas = ROOT.TCanvas(canvasName, canvasName)
 
-        for subsystemName, subsystem in self.trendingDB.items():  # type: (str, BTree[str, TrendingObject])
+        forceRendering = self.parameters.get(CON.FORCE_REPROCESSING, False)
+        if subsystems is None or forceRendering:
+            subsystems = self.trendingDB.keys()
+        for subsystemName in sorted(subsystems):
+            subsystem = self.trendingDB.get(subsystemName)  # type: BTree[str, TrendingObject]
+            if subsystem is None:
+                continue
             logger.debug("subsystem: {subsystemName} is going to be trended".format(subsystemName=subsystemName))
             for name, trendingObject in subsystem.items():  # type: (str, TrendingObject)
+                if not trendingObject.needsRendering and not forceRendering:
+                    logger.debug("trendingObject: {trendingObject} is unchanged".format(trendingObject=trendingObject))
+                    continue
                 logger.debug("trendingObject: {trendingObject}".format(trendingObject=trendingObject))
                 trendingObject.processHist(canvas)
 
-    def notifyAboutNewHistogramValue(self, hist):  # type: (histogramContainer) -> None
+        if self.archive:
+            self.archive.flush()
+        alarmCollector.showOnConsole()
+        # alarmCollector.announceOnSlack()
+
+    def notifyAboutNewHistogramValue(self, hist, timestamp=None, runNumber=None):
+        # type: (histogramContainer, Optional[float], Optional[int]) -> None
         """ This function is called when the ROOT histogram is being processed.
 
         It loops over trending objects to which histogram is subscribed to and calls function that extracts
         trended value from histogram e.g. mean, standard deviation (depending on trending object).
-        Then check alarms.
+        The value has to be extracted while the histogram is available, but the alarms are only checked
+        later for all trending objects at once (see ``checkPendingAlarms()``).
 
         Args:
             hist (histogramContainer): Histogram which is processed.
+            timestamp (float): Unix time of the data in the histogram. Default: None, which uses the current time.
+            runNumber (int): Run number of the data in the histogram. Default: None.
         Returns:
             None.
         """
         for trend in self.histToTrending.get(hist.histName, []):
+            trend.setEntryInformation(timestamp, runNumber)
             trend.extractTrendValue(hist)
-            for alarm in trend.alarms:
-                alarm.processCheck(trend)
-            if trend.alarmsMessages:
-                hist.information["Alarm" + trend.name] = '\n'.join(trend.alarmsMessages)
-                trend.alarmsMessages = []
-            alarmCollector.showOnConsole()
-        # alarmCollector.announceOnSlack()
+            trend.needsRendering = True
+            newEntries = trend.popNewEntries()
+            if self.archive:
+                for entryTime, entryRunNumber, value, error in newEntries:
+                    self.archive.record(trend.subsystemName, trend.name, entryTime, entryRunNumber, value, error)
+            self.pendingAlarmChecks.setdefault(trend, []).append((hist, Alarm.numberOfTrendValues(trend)))
+
+    def checkPendingAlarms(self):  # type: () -> None
+        """ Check the alarms of all trending objects which received new values since the last check.
+
+        It is called once the histograms of a file have been processed. The trending objects are handled in one
+        pass, using the compiled ``AlarmPlan`` of their alarms. The plan is evaluated once for each new value, in
+        the order that the values were added, so that alarms which only look at the most recent values also see
+        the earlier values of the batch. The states of the alarms are stored with the trending object, so that
+        only changes of the states are announced. The alarm messages are stored in the histogram which provided
+        the value.
+
+        Args:
+            None.
+        Returns:
+            None.
+        """
+        pending, self.pendingAlarmChecks = self.pendingAlarmChecks, OrderedDict()
+        for trend, checks in pending.items():
+            plan = AlarmPlan.forTrend(trend)
+            states = trend.alarmStateMapping()
+            checkedValues = None
+            for hist, nValues in checks:
+                # Nothing new to check if the histogram didn't provide a value.
+                if nValues == checkedValues:
+                    continue
+                checkedValues = nValues
+                plan.evaluate(trend, states=states, parameters=self.parameters, nValues=nValues)
+                if trend.alarmsMessages:
+                    hist.information["Alarm" + trend.name] = '\n'.join(trend.alarmsMessages)
+                    trend.alarmsMessages = []
@@ -5,34 +5,25 @@
 
 """
 
-import numpy as np
 import ROOT
 
 from overwatch.processing.trending.objects.object import TrendingObject
+from overwatch.processing.trending.ringBuffer import TrendingRingBuffer
 
 
 class MaximumTrending(TrendingObject):
     def initializeTrendingArray(self):
-        return np.zeros(0, dtype=np.float)
+        return TrendingRingBuffer(self.maxEntries)
 
     def extractTrendValue(self, hist):
-        if self.currentEntry > self.maxEntries:
-            self.trendedValues = np.delete(self.trendedValues, 0)
-        else:
-            self.currentEntry += 1
-
-        newValue = hist.hist.GetMaximum()
-        self.trendedValues = np.append(self.trendedValues, newValue)
+        self.appendTrendValue(hist.hist.GetMaximum())
 
     def retrieveHist(self):
-        histogram = ROOT.TGraphErrors(self.maxEntries)
+        histogram = self.trendedGraph()
         histogram.SetName(self.name)
         histogram.GetXaxis().SetTimeDisplay(True)
+        # The points are in unix time.
+        histogram.GetXaxis().SetTimeOffset(0, "gmt")
         histogram.SetTitle(self.desc)
         histogram.SetMarkerStyle(ROOT.kFullCircle)
-
-        for i in range(len(self.trendedValues)):
-            histogram.SetPoint(i, i, self.trendedValues[i])
-            histogram.SetPointError(i, 0, 0)
-
         return histogram
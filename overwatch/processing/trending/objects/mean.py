@@ -4,36 +4,27 @@
 
 .. codeauthor:: Pawel Ostrowski <ostr000@interia.pl>, AGH University of Science and Technology
 """
-import numpy as np
 import ROOT
 
 from overwatch.processing.trending.objects.object import TrendingObject
+from overwatch.processing.trending.ringBuffer import TrendingRingBuffer
 
 
 class MeanTrending(TrendingObject):
     def initializeTrendingArray(self):
-        return np.zeros((0, 2), dtype=np.float)
+        return TrendingRingBuffer(self.maxEntries)
 
     def extractTrendValue(self, hist):
-        if self.currentEntry > self.maxEntries:
-            self.trendedValues = np.delete(self.trendedValues, 0, axis=0)
-        else:
-            self.currentEntry += 1
-
-        newValue = hist.hist.GetMean(), hist.hist.GetMeanError()
-        self.trendedValues = np.append(self.trendedValues, [newValue], axis=0)
+        self.appendTrendValue(hist.hist.GetMean(), hist.hist.GetMeanError())
 
     def retrieveHist(self):
-        histogram = ROOT.TGraphErrors(self.maxEntries)
+        histogram = self.trendedGraph()
         histogram.SetName(self.name)
         histogram.GetXaxis().SetTitle("Time")
         histogram.GetYaxis().SetTitle(self.desc)
         histogram.GetXaxis().SetTimeDisplay(True)
+        # The points are in unix time.
+        histogram.GetXaxis().SetTimeOffset(0, "gmt")
         histogram.SetTitle(self.desc)
         histogram.SetMarkerStyle(ROOT.kFullCircle)
-
-        for i in range(len(self.trendedValues)):
-            histogram.SetPoint(i, i, self.trendedValues[i, 0])
-            histogram.SetPointError(i, 0, self.trendedValues[i, 1])
-
         return histogram
@@ -8,11 +8,16 @@ can save create histogram to image file and json file.
 """
 import logging
 import os
+import time
 
+import numpy as np
 import ROOT
+from BTrees.OOBTree import BTree
 from persistent import Persistent
 
 import overwatch.processing.trending.constants as CON
+from overwatch.processing.trending.history import TrendingHistory
+from overwatch.processing.trending.ringBuffer import TrendingRingBuffer
 
 try:
     from typing import *  # noqa
@@ -26,6 +31,12 @@ logger = logging.getLogger(__name__)
 
 
 class TrendingObject(Persistent):
+    # Class level default so that trending objects stored before the history was available are still valid.
+    history = None
+    # Class level default so that trending objects stored before the flag was available are rendered once.
+    needsRendering = True
+    # Class level default so that trending objects stored before the alarm states were available are still valid.
+    alarmStates = None
 
     def __init__(self, name, description, histogramNames, subsystemName, parameters):
         # type: (str, str, list, str, dict) -> None
@@ -38,10 +49,14 @@ class TrendingObject(Persistent):
         self.currentEntry = 0
         self.maxEntries = self.parameters.get(CON.ENTRIES, 100)
         self.trendedValues = self.initializeTrendingArray()
+        # Complete (timestamp, run number, value, error) history. ``trendedValues`` only holds the most recent values.
+        self.history = TrendingHistory(self.parameters.get(CON.HISTORY_CHUNK_SIZE, 1000))
         self.alarms = []
         self.alarmsMessages = []
 
         self.histogram = None
+        # Set when new values are trended, and cleared once the trend has been rendered.
+        self.needsRendering = True
         # Ensure that the axis and points are drawn on the TGraph
         self.drawOptions = 'AP'
 
@@ -50,38 +65,107 @@ class TrendingObject(Persistent):
 
     def initializeTrendingArray(self):  # type: () -> Any
         """Example:
-        return np.zeros((self.maxEntries, 2), dtype=np.float)
+        return TrendingRingBuffer(self.maxEntries)
         """
         raise NotImplementedError
 
     def extractTrendValue(self, hist):  # type: (histogramContainer) -> None
         """Example:
-        if self.currentEntry > self.maxEntries:
-            self.trendedValues = np.delete(self.trendedValues, 0, axis=0)
-        else:
-            self.currentEntry += 1
-
-        newValue = hist.hist.GetMean(), hist.hist.GetMeanError()
-        self.trendedValues = np.append(self.trendedValues, [newValue], axis=0)
+        self.appendTrendValue(hist.hist.GetMean(), hist.hist.GetMeanError())
         """
         raise NotImplementedError
 
     def retrieveHist(self):  # type: () -> ROOT.TObject
         """Example:
-        histogram = ROOT.TGraphErrors(self.maxEntries)
+        histogram = self.trendedGraph()
         histogram.SetName(self.name)
         histogram.GetXaxis().SetTimeDisplay(True)
         histogram.SetTitle(self.desc)
         histogram.SetMarkerStyle(ROOT.kFullCircle)
-
-        for i in range(len(self.trendedValues)):
-            histogram.SetPoint(i, i, self.trendedValues[i, 0])
-            histogram.SetPointError(i, 0, self.trendedValues[i, 1])
-
         return histogram
         """
         raise NotImplementedError
 
+    def ringBuffer(self):  # type: () -> TrendingRingBuffer
+        """ Ring buffer which stores the trended values.
+
+        Trending objects which were stored before the ring buffer was available are converted here.
+        """
+        if not isinstance(self.trendedValues, TrendingRingBuffer):
+            self.trendedValues = TrendingRingBuffer.fromArray(self.trendedValues, self.maxEntries)
+        return self.trendedValues
+
+    def alarmStateMapping(self):  # type: () -> BTree
+        """ Persistent states of the alarms of the trend, keyed by ``AlarmPlan.stateKeys``.
+
+        It is created when the alarms are first checked.
+        """
+        if self.alarmStates is None:
+            self.alarmStates = BTree()
+        return self.alarmStates
+
+    def setEntryInformation(self, timestamp=None, runNumber=None):  # type: (Optional[float], Optional[int]) -> None
+        """ Set the timestamp and run number which correspond to the next trended value.
+
+        Invoked by the trending manager before ``extractTrendValue``. The information is stored in volatile
+        attributes, so it is not stored in the database.
+        """
+        self._v_timestamp = timestamp
+        self._v_runNumber = runNumber
+
+    def appendTrendValue(self, value, error=0.):  # type: (float, float) -> None
+        """ Store a new trended value in the ring buffer and the history. """
+        timestamp = getattr(self, "_v_timestamp", None)
+        if timestamp is None:
+            timestamp = time.time()
+        runNumber = getattr(self, "_v_runNumber", None)
+        if runNumber is None:
+            runNumber = -1
+
+        self.ringBuffer().append(value, error, timestamp)
+        if self.history is None:
+            self.history = TrendingHistory(self.parameters.get(CON.HISTORY_CHUNK_SIZE, 1000))
+        self.history.append(timestamp, runNumber, value, error)
+        # Keep track of the new entries so that they can be passed on (for example, to the archive).
+        self._v_newEntries = getattr(self, "_v_newEntries", []) + [(timestamp, runNumber, value, error)]
+
+    def popNewEntries(self):  # type: () -> List[Tuple[float, int, float, float]]
+        """ Retrieve and clear the (timestamp, run number, value, error) entries appended since the last call. """
+        entries = getattr(self, "_v_newEntries", [])
+        self._v_newEntries = []
+        return entries
+
+    def trendedPoints(self):  # type: () -> Tuple[np.ndarray, np.ndarray, np.ndarray]
+        """ Retrieve the (x, value, error) points to be drawn.
+
+        The points are drawn from the history over the configured time window (in seconds) before the most
+        recent value, where x is the unix time. A window of 0 or less draws the entire history. If there
+        is no history (for trending objects stored before it was available), the recent values are drawn
+        with the entry index as x.
+        """
+        if self.history is not None and self.history.lastChunk is not None:
+            windowLength = self.parameters.get(CON.WINDOW, 24 * 60 * 60)
+            minTime = self.history.latestTimestamp() - windowLength if windowLength > 0 else None
+            entries = self.history.window(minTime=minTime)
+            return entries["timestamp"], entries["value"], entries["error"]
+
+        trendedValues = self.ringBuffer()
+        values = trendedValues.chronologicalValues()
+        return np.arange(len(values), dtype=np.float64), values, trendedValues.chronologicalErrors()
+
+    def trendedGraph(self):  # type: () -> ROOT.TGraphErrors
+        """ Create a graph of the trended points (see ``trendedPoints()``).
+
+        The points are passed to the graph as arrays, rather than setting each point individually.
+        """
+        times, values, errors = self.trendedPoints()
+        if not len(values):
+            return ROOT.TGraphErrors(0)
+        # The graph copies the points from contiguous double arrays.
+        columns = [np.ascontiguousarray(column, dtype=np.float64)
+                   for column in (times, values, np.zeros(len(values)), errors)]
+        return ROOT.TGraphErrors(len(values), *columns)
+
     def processHist(self, canvas):
         self.resetCanvas(canvas)
         # Ensure we plot onto the right canvas
@@ -103,6 +187,7 @@ class TrendingObject(Persistent):
 
         with open(jsonFile, "wb") as f:
             f.write(ROOT.TBufferJSON.ConvertToJSON(canvas).Data().encode())
+        self.needsRendering = False
 
     @staticmethod
     def resetCanvas(canvas):
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+""" Fixed capacity storage for trended values.
+"""
+import numpy as np
+from persistent import Persistent
+
+try:
+    from typing import *  # noqa
+except ImportError:
+    pass
+
+
+class TrendingRingBufferBlock(Persistent):
+    """ Fixed size block of the columns of a ``TrendingRingBuffer``.
+
+    Args:
+        blockSize (int): Number of entries in the block.
+
+    Attributes:
+        values (np.ndarray): Trended values, in storage (not chronological) order.
+        errors (np.ndarray): Errors of the trended values, in storage order.
+        timestamps (np.ndarray): Unix time when each value was trended, in storage order.
+    """
+
+    def __init__(self, blockSize):  # type: (int) -> None
+        self.values = np.zeros(blockSize, dtype=np.float64)
+        self.errors = np.zeros(blockSize, dtype=np.float64)
+        self.timestamps = np.zeros(blockSize, dtype=np.float64)
+
+
+class TrendingRingBuffer(Persistent):
+    """ Ring buffer which stores the most recent trended values.
+
+    The value, error and timestamp columns are allocated once when the buffer is created. Appending a value
+    overwrites the oldest entry once the buffer is full, so it is O(1) and doesn't allocate. The entries can
+    be retrieved in chronological order (oldest first) through the ``chronological*()`` methods.
+
+    The columns are split into fixed size persistent blocks. Appending a value only modifies the block which
+    contains the entry (as well as the few counters of the buffer itself), so each commit only stores one block
+    (24 bytes per entry in the block), regardless of the capacity of the buffer.
+
+    Args:
+        capacity (int): Maximum number of entries to store.
+        blockSize (int): Number of entries per block. Default: 100.
+
+    Attributes:
+        capacity (int): Maximum number of entries to store.
+        blockSize (int): Number of entries per block.
+        blocks (tuple): ``TrendingRingBufferBlock`` objects which store the columns. Entry ``i`` (in storage
+            order) is stored at index ``i % blockSize`` of block ``i // blockSize``.
+        head (int): Index where the next value will be stored.
+        size (int): Number of entries which are currently stored.
+        count (int): Total number of values which have been appended, including those which were overwritten.
+    """
+    # Class level defaults for buffers stored before the count and blocks were available.
+    count = 0
+    blocks = None  # type: Optional[Tuple[TrendingRingBufferBlock, ...]]
+
+    def __init__(self, capacity, blockSize=100):  # type: (int, int) -> None
+        self.capacity = max(int(capacity), 1)
+        self._createBlocks(blockSize)
+        self.head = 0
+        self.size = 0
+        self.count = 0
+
+    def _createBlocks(self, blockSize):  # type: (int) -> None
+        self.blockSize = min(max(int(blockSize), 1), self.capacity)
+        nBlocks = (self.capacity + self.blockSize - 1) // self.blockSize
+        self.blocks = tuple(TrendingRingBufferBlock(self.blockSize) for _ in range(nBlocks))
+
+    def _convertColumnsToBlocks(self):  # type: () -> None
+        """ Move the columns of a buffer which was stored before the blocks were available into blocks. """
+        columns = {name: getattr(self, name) for name in ("values", "errors", "timestamps")}
+        self._createBlocks(100)
+        for name, column in columns.items():
+            for i, block in enumerate(self.blocks):
+                blockColumn = column[i * self.blockSize:(i + 1) * self.blockSize]
+                getattr(block, name)[:len(blockColumn)] = blockColumn
+            delattr(self, name)
+
+    @classmethod
+    def fromArray(cls, trendedValues, capacity):  # type: (Any, int) -> TrendingRingBuffer
+        """ Create a ring buffer from previously trended values.
+
+        This is used to convert trending objects which were stored before the ring buffer was available.
+
+        Args:
+            trendedValues (np.ndarray or list): Trended values in chronological order. Either 1D with only the
+                values, or 2D with the values in the first column and the errors in the second column.
+            capacity (int): Maximum number of entries to store.
+        Returns:
+            TrendingRingBuffer: Ring buffer containing the most recent of the given values.
+        """
+        buf = cls(capacity)
+        trendedValues = np.array(trendedValues, dtype=np.float64)
+        for entry in trendedValues:
+            if trendedValues.ndim == 2:
+                buf.append(entry[0], entry[1])
+            else:
+                buf.append(entry)
+        return buf
+
+    def append(self, value, error=0., timestamp=0.):  # type: (float, float, float) -> None
+        """ Store a new value, replacing the oldest value if the buffer is full.
+
+        Args:
+            value (float): Trended value.
+            error (float): Error of the trended value. Default: 0.
+            timestamp (float): Unix time corresponding to the value. Default: 0.
+        Returns:
+            None.
+        """
+        if self.blocks is None:
+            self._convertColumnsToBlocks()
+        block = self.blocks[self.head // self.blockSize]
+        index = self.head % self.blockSize
+        block.values[index] = value
+        block.errors[index] = error
+        block.timestamps[index] = timestamp
+        # The arrays are modified in place, so ZODB needs to be told explicitly.
+        block._p_changed = True
+        self.head = (self.head + 1) % self.capacity
+        # The count of buffers stored before it was available starts from the number of stored values.
+        self.count = max(self.count, self.size) + 1
+        self.size = min(self.size + 1, self.capacity)
+
+    def __len__(self):
+        return self.size
+
+    def _column(self, name):  # type: (str) -> np.ndarray
+        """ Column of all entries, in storage order. """
+        if self.blocks is None:
+            return getattr(self, name)
+        return np.concatenate([getattr(block, name) for block in self.blocks])[:self.capacity]
+
+    def _chronological(self, name):  # type: (str) -> np.ndarray
+        column = self._column(name)
+        if self.size < self.capacity:
+            # The buffer hasn't wrapped yet, so the storage order is already chronological.
+            return column[:self.size]
+        return np.concatenate((column[self.head:], column[:self.head]))
+
+    def latestValues(self, n):  # type: (int) -> np.ndarray
+        """ Most recent ``n`` (or fewer, if not available) values, ordered from oldest to newest.
+
+        Only the requested values are copied, so it is cheaper than ``chronologicalValues()`` for small ``n``.
+        """
+        n = min(n, self.size)
+        indices = (self.head - n + np.arange(n)) % self.capacity
+        if self.blocks is None:
+            return self.values[indices]
+        return np.array([self.blocks[i // self.blockSize].values[i % self.blockSize] for i in indices],
+                        dtype=np.float64)
+
+    def chronologicalValues(self):  # type: () -> np.ndarray
+        """ Trended values, ordered from oldest to newest. """
+        return self._chronological("values")
+
+    def chronologicalErrors(self):  # type: () -> np.ndarray
+        """ Errors of the trended values, ordered from oldest to newest. """
+        return self._chronological("errors")
+
+    def chronologicalTimestamps(self):  # type: () -> np.ndarray
+        """ Timestamps of the trended values, ordered from oldest to newest. """
+        return self._chronological("timestamps")
+
+    def __array__(self, dtype=None):
+        """ Allow the buffer to be used directly as an array of the values in chronological order. """
+        values = self.chronologicalValues()
+        return values.astype(dtype) if dtype else values
+
+    def __getitem__(self, item):
+        return self.chronologicalValues()[item]
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+""" Database access for the web app.
+
+Nearly all pages only read from the database, while the processing continuously commits new data. Each request
+therefore uses a connection from a pool which views a consistent snapshot of the database (via the ZODB MVCC),
+and the transaction of the request is aborted at the end instead of being committed. Since these requests never
+commit, they can't conflict with the processing. Only views which are decorated with ``writable()`` (for example,
+requesting a time slice) commit their changes.
+
+The connections in the pool keep their object cache between requests. Since the cache is invalidated via MVCC
+when the processing commits, only the changed objects need to be loaded again. The cache of each connection can
+optionally be warmed with the objects needed by the most common pages when the database is opened.
+"""
+
+from __future__ import print_function
+
+import functools
+import os
+import threading
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2
+    from collections import MutableMapping
+
+import ZODB
+import transaction
+import zodburi
+from flask import g
+
+# Logging
+import logging
+logger = logging.getLogger(__name__)
+
+class SnapshotDB(MutableMapping):
+    """ Dict-like access to the database root for the current request.
+
+    It provides the same interface as ``flask_zodb.ZODB``, such that ``db["runs"]`` retrieves the runs from
+    the database root. The connection for the request is opened on first access and returned to the pool when
+    the request is torn down.
+
+    The database is opened lazily in each process because the ``uwsgi`` workers are forked after the app is
+    created, and a storage can't be shared between processes.
+
+    Note:
+        The app is configured through ``ZODB_STORAGE`` (a zodburi URI), ``ZODB_POOL_SIZE`` (number of connections
+        kept in the pool), ``ZODB_CACHE_SIZE`` (number of objects kept in the cache of each connection), and
+        ``ZODB_WARM_CACHE`` (whether the connection caches should be warmed when the database is opened). The pool
+        and cache sizes override any values set in the database URI.
+
+    Args:
+        app (flask.Flask): Flask app. Default: None, in which case ``init_app()`` must be called later.
+
+    Attributes:
+        app (flask.Flask): Flask app.
+        db (ZODB.DB): Database of the current process. ``None`` until it is first needed.
+    """
+    def __init__(self, app = None):
+        self.app = None
+        self.db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """ Setup the database for the given app.
+
+        Args:
+            app (flask.Flask): Flask app.
+        Returns:
+            None.
+        """
+        self.app = app
+        app.config.setdefault("ZODB_POOL_SIZE", 7)
+        app.config.setdefault("ZODB_CACHE_SIZE", 10000)
+        app.config.setdefault("ZODB_WARM_CACHE", True)
+        app.teardown_request(self.closeConnection)
+
+    def database(self):
+        """ Retrieve the database for this process, opening it if necessary.
+
+        Args:
+            None.
+        Returns:
+            ZODB.DB: The database.
+        """
+        pid = os.getpid()
+        if self.db is None or self._pid != pid:
+            with self._lock:
+                if self.db is None or self._pid != pid:
+                    storageFactory, dbArgs = zodburi.resolve_uri(self.app.config["ZODB_STORAGE"])
+                    # zodburi always provides (default) values, so the app settings take precedence.
+                    dbArgs["pool_size"] = self.app.config["ZODB_POOL_SIZE"]
+                    dbArgs["cache_size"] = self.app.config["ZODB_CACHE_SIZE"]
+                    logger.info("Opening the database with {dbArgs}".format(dbArgs = dbArgs))
+                    db = ZODB.DB(storageFactory(), **dbArgs)
+                    if self.app.config["ZODB_WARM_CACHE"]:
+                        warmCache(db, nConnections = dbArgs["pool_size"])
+                    self.db = db
+                    self._pid = pid
+        return self.db
+
+    @property
+    def connection(self):
+        """ ZODB.Connection.Connection: Connection of the current request, which is opened if necessary. """
+        connection = getattr(g, "_zodbConnection", None)
+        if connection is None:
+            # Each connection has it's own transaction manager, such that concurrent requests (in different
+            # threads) are independent. Opening the connection starts a new transaction, which views the most
+            # recently committed state of the database.
+            connection = self.database().open(transaction_manager = transaction.TransactionManager())
+            g._zodbConnection = connection
+        return connection
+
+    @property
+    def root(self):
+        """ PersistentMapping: Database root for the current request. """
+        return self.connection.root()
+
+    def closeConnection(self, exception = None):
+        """ Return the connection of the current request to the pool.
+
+        Any changes which weren't committed by a ``writable()`` view are discarded.
+
+        Args:
+            exception (Exception): Exception raised while handling the request. Default: None.
+        Returns:
+            None.
+        """
+        connection = getattr(g, "_zodbConnection", None)
+        if connection is None:
+            return
+        g._zodbConnection = None
+        try:
+            connection.transaction_manager.abort()
+        finally:
+            connection.close()
+
+    def writable(self, func):
+        """ Decorator for views which modify the database, such that their changes are committed.
+
+        The transaction is committed after the view returns successfully. If the view raises an exception,
+        the changes are discarded when the request is torn down.
+
+        Args:
+            func (Callable): View function.
+        Returns:
+            Callable: The wrapped view function.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            returnValue = func(*args, **kwargs)
+            connection = getattr(g, "_zodbConnection", None)
+            if connection is not None:
+                connection.transaction_manager.commit()
+            return returnValue
+        return wrapper
+
+    def __getitem__(self, key):
+        return self.root[key]
+
+    def __setitem__(self, key, value):
+        self.root[key] = value
+
+    def __delitem__(self, key):
+        del self.root[key]
+
+    def __contains__(self, key):
+        return key in self.root
+
+    def __iter__(self):
+        return iter(self.root)
+
+    def __len__(self):
+        return len(self.root)
+
+def warmCache(db, nConnections, nRuns = 50):
+    """ Load the objects which are needed by most pages into the cache of the connections in the pool.
+
+    The connections are all opened at once, such that each one of them is warmed. Afterwards, they are
+    returned to the pool, where they keep their cache.
+
+    Args:
+        db (ZODB.DB): Database.
+        nConnections (int): Number of connections to warm.
+        nRuns (int): Number of the most recent run summaries to load. Default: 50 (the length of
+            the first page of the run list).
+    Returns:
+        None.
+    """
+    connections = [db.open(transaction_manager = transaction.TransactionManager()) for _ in range(nConnections)]
+    try:
+        for connection in connections:
+            dbRoot = connection.root()
+            if "config" in dbRoot:
+                dbRoot["config"]._p_activate()
+            if "runSummaries" in dbRoot:
+                for summary in dbRoot["runSummaries"].page(offset = 0, numberOfRuns = nRuns):
+                    summary._p_activate()
+    finally:
+        for connection in connections:
+            connection.transaction_manager.abort()
+            connection.close()
+    logger.info("Warmed the cache of {nConnections} database connections.".format(nConnections = nConnections))
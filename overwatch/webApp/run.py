@@ -61,10 +61,10 @@ if not serverParameters["debug"]:
     app.config.update(SECRET_KEY = secretKey)
     logger.debug("     After setting: {key}".format(key = app.config["SECRET_KEY"]))
 
-    # Usually we close the db connection here!
-    # Even though we just created a new db connection, if we close it here, then it will interfere with the web app
-    # Instead, we just leave it up to flask_zodb to manage everything
-    #connection.close()
+    # The web app opens it's own database (with a pool of connections) when it is first needed,
+    # so we are done with this connection.
+    connection.close()
+    connection.db().close()
 
 def runDevelopment():
     """ Main entry point for running the web app development server.
@@ -33,7 +33,6 @@ logger = logging.getLogger(__name__)
 from flask import Flask, url_for, request, render_template, redirect, flash, send_from_directory, jsonify, session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
-from flask_zodb import ZODB
 from flask_assets import Environment
 from flask_wtf.csrf import CSRFProtect, CSRFError
 
@@ -51,17 +50,24 @@ from ..base import utilities as baseUtilities
 from . import routing
 from . import auth
 from . import validation
+from .database import SnapshotDB
 from . import utilities  # NOQA
 
 # Processing module includes
 from ..processing import processRuns
+from ..processing import profiler
 
 # Flask setup
 app = Flask(__name__, static_url_path=serverParameters["staticURLPath"], static_folder=serverParameters["staticFolder"], template_folder=serverParameters["templateFolder"])
 
 # Setup database
+# Requests read from a snapshot of the database via a pool of connections. Only views decorated with
+# ``db.writable`` commit their changes. See ``overwatch.webApp.database``.
 app.config["ZODB_STORAGE"] = serverParameters["databaseLocation"]
-db = ZODB(app)
+app.config["ZODB_POOL_SIZE"] = serverParameters["databasePoolSize"]
+app.config["ZODB_CACHE_SIZE"] = serverParameters["databaseCacheSize"]
+app.config["ZODB_WARM_CACHE"] = serverParameters["databaseWarmCache"]
+db = SnapshotDB(app)
 
 from .trending import trendingPage
 app.register_blueprint(trendingPage)
@@ -163,6 +169,7 @@ sentry_sdk.init(dsn = sentryDSN, integrations = [FlaskIntegration(), sentry_logg
 ######################################################################################################
 
 @app.route("/", methods=["GET", "POST"])
+@db.writable
 def login():
     """ Login function. This is is the first page the user sees.
 
@@ -331,6 +338,29 @@ def statusQuery():
         response = "Alive", 200
     return response
 
+@app.route("/metrics", methods=["GET"])
+def processingMetrics():
+    """ Returns the timings of the most recent processing cycle in the Prometheus text format.
+
+    The metrics are written by the processing at the end of each cycle. See ``overwatch.processing.profiler``.
+
+    Note:
+        It doesn't require authentication so that it can be scraped by Prometheus. It only contains timing
+        information about the processing, which isn't sensitive.
+
+    Args:
+        None
+    Returns:
+        Response: Metrics in the Prometheus text format and a 200 response code, or a 404 response code if
+            no processing cycle has been profiled yet.
+    """
+    metricsFilename = os.path.join(serverParameters["dirPrefix"], profiler.profilingDir, profiler.metricsFilename)
+    if not os.path.exists(metricsFilename):
+        return "No processing cycle has been profiled yet.", 404
+    with open(metricsFilename, "r") as f:
+        metrics = f.read()
+    return metrics, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 ######################################################################################################
 # Authenticated Routes
 ######################################################################################################
@@ -362,11 +392,12 @@ def index():
     # We only use this once and there isn't much complicated, so we just perform the validation here.
     runOffset = validation.convertRequestToPositiveInteger(paramName = "runOffset", source = request.args)
 
-    runs = db["runs"]
+    # The run list only reads the run summaries, so the runs themselves are never loaded.
+    runSummaries = db["runSummaries"]
 
     # Determine if a run is ongoing
     # To do so, we need the most recent run (regardless of which runs we selected to display)
-    mostRecentRun = runs[runs.keys()[-1]]
+    mostRecentRun = runSummaries.mostRecentRun()
     runOngoing = mostRecentRun.isRunOngoing()
     if runOngoing:
         runOngoingNumber = mostRecentRun.runNumber
@@ -377,13 +408,12 @@ def index():
     # We select a default of 50 runs per page. Too many might be unreasonable.
     numberOfRunsToDisplay = 50
     # Restrict the runs that we are going to display to those that are included in our requested range.
-    # It is reversed because we process the earliest runs first. However, the reversed object isn't scriptable,
-    # so it must be converted to a list to slice it.
+    # The most recent runs are shown first, so the summaries are retrieved in reverse order.
     # +1 on the upper limit so that the 50 is inclusive
-    runsToUse = list(reversed(runs.values()))[runOffset:runOffset + numberOfRunsToDisplay + 1]
+    runsToUse = runSummaries.page(offset = runOffset, numberOfRuns = numberOfRunsToDisplay + 1)
     logger.debug("runOffset: {}, numberOfRunsToDisplay: {}".format(runOffset, numberOfRunsToDisplay))
     # Total number of runs, which should be displayed at the bottom.
-    numberOfRuns = len(runs.keys())
+    numberOfRuns = len(runSummaries)
 
     # We want 10 anchors
     # NOTE: We need to convert it to an int to ensure that the mod call in the template works.
@@ -427,6 +457,10 @@ def runPage(runNumber, subsystemName, requestedFileType):
     Note:
         Some function args (after the first 3) are provided through the flask request object.
 
+    Note:
+        This view only reads from the database. Since it isn't ``db.writable``, any changes to the runs
+        are discarded at the end of the request.
+
     Warning:
         Careful if changing the routing for this function, as the display swtich for the time slices button
         in the web app depends on "runPage" being in this route. If this is changed, then the ``js`` also needs
@@ -583,10 +617,37 @@ def protected(filename):
     # Ignore the time GET parameter that is sometimes passed- just to avoid the cache when required
     #if request.args.get("time"):
     #    print "timeParameter:", request.args.get("time")
-    return send_from_directory(os.path.realpath(serverParameters["protectedFolder"]), filename)
+    protectedFolder = os.path.realpath(serverParameters["protectedFolder"])
+    # Render the image from the stored json if it hasn't been rendered during processing.
+    if serverParameters["renderImagesOnDemand"] and filename.endswith("." + serverParameters["fileExtension"]):
+        imageFilename = os.path.realpath(os.path.join(protectedFolder, filename))
+        # Ensure that we never write outside of the protected folder.
+        if imageFilename.startswith(protectedFolder + os.sep):
+            processRuns.renderImageOnDemand(imageFilename)
+    # Time slices may have only been created in memory, so we write the file the first time that it is requested.
+    if filename.endswith(".root") and not os.path.exists(os.path.join(protectedFolder, filename)):
+        processRuns.writeTimeSliceFile(db["runs"], os.path.normpath(filename))
+    return send_from_directory(protectedFolder, filename)
+
+@app.route("/monitoring/profiling")
+@login_required
+def processingProfile():
+    """ Serves the ``json`` report of the timings of the most recent processing cycles.
+
+    The report includes the time spent in each processing stage, as well as the slowest histograms and
+    plugin functions. It is written by the processing at the end of each cycle. See ``overwatch.processing.profiler``.
+
+    Args:
+        None
+    Returns:
+        Response: The ``json`` report, or a 404 response code if no processing cycle has been profiled yet.
+    """
+    profilingFolder = os.path.realpath(os.path.join(serverParameters["dirPrefix"], profiler.profilingDir))
+    return send_from_directory(profilingFolder, profiler.reportFilename, mimetype = "application/json")
 
 @app.route("/timeSlice", methods=["GET", "POST"])
 @login_required
+@db.writable
 def timeSlice():
     """ Handles time slice and user reprocessing requests.
 
@@ -638,7 +699,7 @@ def timeSlice():
             logger.debug("histName: {histName}".format(histName = histName))
 
             # Process the time slice
-            returnValue = processRuns.processTimeSlices(runs, runDir, minTime, maxTime, subsystem, inputProcessingOptions)
+            returnValue = processRuns.processTimeSlices(runs, runDir, minTime, maxTime, subsystem, inputProcessingOptions, dbRoot = db)
             logger.info("returnValue: {}".format(returnValue))
             logger.debug("runs[runDir].subsystems[subsystem].timeSlices: {}".format(runs[runDir].subsystems[subsystem].timeSlices))
 
@@ -690,6 +751,10 @@ def testingDataArchive():
         ``webApp.routing.redirectBack()``. This hard coding is to avoid a loop where the user is stuck accessing
         this file after logging in.
 
+    Note:
+        This view only reads from the database. Since it isn't ``db.writable``, any changes to the runs
+        are discarded at the end of the request.
+
     Args:
         None
     Returns:
@@ -772,7 +837,7 @@ def overwatchStatus():
         Response: Status template populated with the status of Overwatch sites specified in the configuration.
     """
     # Setup
-    runs = db["runs"]
+    runSummaries = db["runSummaries"]
     ajaxRequest = validation.convertRequestToPythonBool("ajaxRequest", request.args)
 
     # Where the statuses will be collected
@@ -780,7 +845,7 @@ def overwatchStatus():
 
     # Determine if a run is ongoing
     # To do so, we need the most recent run
-    mostRecentRun = runs[runs.keys()[-1]]
+    mostRecentRun = runSummaries.mostRecentRun()
     runOngoing = mostRecentRun.isRunOngoing()
     if runOngoing:
         runOngoingNumber = "- " + mostRecentRun.prettyName
@@ -111,8 +111,9 @@ setup(
         "PyYAML",
         "Flask-RESTful",
         "ZODB",
-        # Install `Flask-ZODB` from git repo to support the newer hook and py 3
-        # git+https://github.com/SpotlightKid/flask-zodb.git
+        # The web app handles it's own database connections (see `overwatch.webApp.database`), but the
+        # REST API (`overwatch.api`) still requires `Flask-ZODB`. It must be installed from the git repo to
+        # support the newer hook and py 3: git+https://github.com/SpotlightKid/flask-zodb.git
         # Unfortunately, we can't install this directly from git, so it has to be handled directly.
         "zodburi",
         "bcrypt",
@@ -135,6 +136,8 @@ setup(
             "pytest-cov",
             "pytest-mock",
             "codecov",
+            # Local SMTP server for testing the alarm email delivery
+            "aiosmtpd; python_version >= '3.5'",
         ],
         "docs": [
             "sphinx",
@@ -145,6 +148,11 @@ setup(
         ],
         "dev": [
             "flake8",
-        ]
+        ],
+        # Columnar trending archive
+        "archive": [
+            "pyarrow",
+            "pandas",
+        ],
     }
 )
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+""" Tests for the background alarm delivery queue.
+"""
+import pytest
+import socket
+
+from overwatch.processing.alarms.collectors import Mail, MailSender, SlackNotification
+from overwatch.processing.alarms.delivery import AlarmDeliveryQueue
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+class Receiver(object):
+    def __init__(self, failures=0):
+        self.delivered = []
+        self.failures = failures
+
+    def __call__(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise IOError("Delivery failed")
+        self.delivered.append(message)
+
+
+@pytest.fixture
+def clock():
+    yield FakeClock()
+
+
+def testBatchingAndDeduplication(clock):
+    deliveryQueue = AlarmDeliveryQueue(deduplicationInterval=60, clock=clock)
+    receiver = Receiver()
+
+    deliveryQueue.queue.put((receiver, "a"))
+    deliveryQueue.queue.put((receiver, "b"))
+    deliveryQueue.queue.put((receiver, "a"))
+    deliveryQueue.deliverPending()
+    assert receiver.delivered == ["a\nb"]
+
+    # Repeated messages are only delivered again after the deduplication interval.
+    clock.now += 30
+    deliveryQueue.queue.put((receiver, "a"))
+    deliveryQueue.deliverPending()
+    assert receiver.delivered == ["a\nb"]
+    clock.now += 31
+    deliveryQueue.queue.put((receiver, "a"))
+    deliveryQueue.deliverPending()
+    assert receiver.delivered == ["a\nb", "a"]
+
+
+def testRetryWithBackoff(clock):
+    deliveryQueue = AlarmDeliveryQueue(maxRetries=2, retryBackoff=10, clock=clock)
+    receiver = Receiver(failures=2)
+
+    deliveryQueue.queue.put((receiver, "a"))
+    deliveryQueue.deliverPending()
+    assert deliveryQueue.pending[receiver].retryAt == 1010
+    clock.now = 1009
+    deliveryQueue.deliverPending()
+    assert deliveryQueue.pending[receiver].attempts == 1
+    clock.now = 1010
+    deliveryQueue.deliverPending()
+    assert deliveryQueue.pending[receiver].retryAt == 1030
+    clock.now = 1030
+    deliveryQueue.deliverPending()
+    assert receiver.delivered == ["a"]
+    assert not deliveryQueue.pending
+
+
+def testDropAfterMaxRetries(clock):
+    deliveryQueue = AlarmDeliveryQueue(maxRetries=0, clock=clock)
+    receiver = Receiver(failures=1)
+
+    deliveryQueue.queue.put((receiver, "a"))
+    deliveryQueue.deliverPending()
+    assert receiver.delivered == []
+    assert not deliveryQueue.pending
+
+
+def testRateLimit(clock):
+    deliveryQueue = AlarmDeliveryQueue(maxPerMinute=2, deduplicationInterval=0, clock=clock)
+    receiver = Receiver()
+
+    for i in range(3):
+        deliveryQueue.queue.put((receiver, str(i)))
+        deliveryQueue.deliverPending()
+        clock.now += 1
+    assert receiver.delivered == ["0", "1"]
+
+    clock.now += 60
+    deliveryQueue.deliverPending()
+    assert receiver.delivered == ["0", "1", "2"]
+
+
+def testBackgroundThread():
+    deliveryQueue = AlarmDeliveryQueue(batchInterval=0.01)
+    receiver = Receiver()
+
+    deliveryQueue.enqueue(receiver, "a")
+    deliveryQueue.stop(timeout=5)
+
+    assert receiver.delivered == ["a"]
+
+
+def testSuspended(monkeypatch):
+    """ The thread is stopped within the context (without delivering) and restarted afterwards. """
+    registered = []
+    monkeypatch.setattr("overwatch.processing.alarms.delivery.atexit.register", registered.append)
+    deliveryQueue = AlarmDeliveryQueue(batchInterval=60)
+    receiver = Receiver()
+
+    deliveryQueue.enqueue(receiver, "a")
+    with deliveryQueue.suspended():
+        assert deliveryQueue.thread is None
+    assert deliveryQueue.thread.is_alive()
+    assert receiver.delivered == []
+    deliveryQueue.stop(timeout=5)
+
+    assert receiver.delivered == ["a"]
+    # The stop function is only registered once, even though the thread was restarted.
+    assert registered == [deliveryQueue.stop]
+
+
+def testMailDelivery(clock, monkeypatch):
+    """ Deliver emails to a local SMTP server. """
+    controllerModule = pytest.importorskip("aiosmtpd.controller")
+    handlers = pytest.importorskip("aiosmtpd.handlers")
+
+    class Handler(handlers.Message):
+        def __init__(self):
+            super(Handler, self).__init__()
+            self.messages = []
+
+        def handle_message(self, message):
+            self.messages.append(message)
+
+    # Find a free port for the server.
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    handler = Handler()
+    controller = controllerModule.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        monkeypatch.delitem(Mail._instances, Mail, raising=False)
+        Mail(alarmsParameters={"emailDelivery": {"smtpSettings": {
+            "address": "127.0.0.1", "port": port, "userName": "overwatch@localhost"}}})
+
+        deliveryQueue = AlarmDeliveryQueue(clock=clock)
+        sender = MailSender(["test@localhost"])
+        deliveryQueue.queue.put((sender.sendMail, "first alarm"))
+        deliveryQueue.queue.put((sender.sendMail, "second alarm"))
+        deliveryQueue.deliverPending()
+
+        assert len(handler.messages) == 1
+        body = handler.messages[0].get_payload()[0].get_payload()
+        assert "first alarm" in body
+        assert "second alarm" in body
+    finally:
+        Mail().resetConnection()
+        controller.stop()
+
+
+def testSlackDelivery(clock, monkeypatch):
+    """ Deliver messages to a fake Slack endpoint which fails once. """
+    class FakeSlackClient(object):
+        def __init__(self):
+            self.calls = []
+
+        def api_call(self, method, **kwargs):
+            self.calls.append(kwargs["text"])
+            return {"ok": len(self.calls) > 1, "error": "ratelimited"}
+
+    monkeypatch.delitem(SlackNotification._instances, SlackNotification, raising=False)
+    slack = SlackNotification(alarmsParameters={"slack": {"apiToken": "token", "slackChannel": "alarms"}})
+    slack.slackClient = FakeSlackClient()
+
+    deliveryQueue = AlarmDeliveryQueue(retryBackoff=1, clock=clock)
+    deliveryQueue.queue.put((slack.sendMessage, "alarm"))
+    deliveryQueue.deliverPending()
+    clock.now += 1
+    deliveryQueue.deliverPending()
+
+    assert slack.slackClient.calls == ["alarm", "alarm"]
+    assert not deliveryQueue.pending
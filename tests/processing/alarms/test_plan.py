@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+""" Tests for evaluating the alarms of a trend with an AlarmPlan.
+"""
+from overwatch.processing.alarms.impl.andAlarm import AndAlarm
+from overwatch.processing.alarms.impl.betweenValuesAlarm import BetweenValuesAlarm
+from overwatch.processing.alarms.impl.checkLastNAlarm import CheckLastNAlarm
+from overwatch.processing.alarms.impl.meanInRangeAlarm import MeanInRangeAlarm
+from overwatch.processing.alarms.impl.orAlarm import OrAlarm
+from overwatch.processing.alarms.plan import AlarmPlan
+
+
+def testWindowsAreShared():
+    meanAlarm = MeanInRangeAlarm(minVal=0, maxVal=10, N=3)
+    lastNAlarm = CheckLastNAlarm(minVal=0, maxVal=10, N=3)
+    otherLastNAlarm = CheckLastNAlarm(minVal=5, maxVal=20, N=3)
+    betweenAlarm = BetweenValuesAlarm(minVal=0, maxVal=10)
+
+    plan = AlarmPlan([meanAlarm, lastNAlarm, otherLastNAlarm, betweenAlarm])
+
+    assert sorted(plan.windows) == [1, 3]
+    assert sorted(plan.windows[3].inRangeCounts) == [(0, 10), (5, 20)]
+
+
+def testAggregatingAlarmsAreEvaluatedInThePlan(af_alarmChecker, af_trendingObjectClass):
+    ba1 = BetweenValuesAlarm(minVal=0, maxVal=10, alarmText='ba1')
+    ba2 = BetweenValuesAlarm(minVal=0, maxVal=20, alarmText='ba2')
+    andAlarm = AndAlarm([ba1, ba2], 'and')
+    orAlarm = OrAlarm([andAlarm], 'or')
+    orAlarm.addReceiver(af_alarmChecker.receiver)
+    to = af_trendingObjectClass('to')
+    to.alarms = [ba1, ba2]
+
+    plan = AlarmPlan.forTrend(to)
+    assert plan.aggregatingAlarms == [andAlarm, orAlarm]
+    assert AlarmPlan.forTrend(to) is plan
+
+    def test(value, isAlarm):
+        to.trendedValues.append(value)
+        results = plan.evaluate(to)
+        assert results[orAlarm] is isAlarm
+        # No results are left over in the aggregating alarms between checks.
+        assert all(result is None for result in andAlarm.children.values())
+
+    test(5, False)
+    test(15, False)
+    test(25, True)
+    assert len(af_alarmChecker.receivedAlarms) == 1
+
+
+def testChildrenFromDifferentTrends(af_alarmChecker, af_trendingObjectClass):
+    """ Aggregating alarms with children in other trends still wait for all of the children. """
+    ba1 = BetweenValuesAlarm(minVal=0, maxVal=10, alarmText='ba1')
+    ba2 = BetweenValuesAlarm(minVal=0, maxVal=10, alarmText='ba2')
+    andAlarm = AndAlarm([ba1, ba2], 'and')
+    andAlarm.addReceiver(af_alarmChecker.receiver)
+    tc1 = af_trendingObjectClass('tc1')
+    tc1.alarms = [ba1]
+    tc2 = af_trendingObjectClass('tc2')
+    tc2.alarms = [ba2]
+
+    tc1.trendedValues.append(20)
+    AlarmPlan.forTrend(tc1).evaluate(tc1)
+    assert af_alarmChecker.receivedAlarms == []
+
+    tc2.trendedValues.append(20)
+    AlarmPlan.forTrend(tc2).evaluate(tc2)
+    assert len(af_alarmChecker.receivedAlarms) == 1
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+""" Tests for the persistent alarm states.
+"""
+import overwatch.processing.alarms.state as STATE
+from overwatch.processing.alarms.impl.andAlarm import AndAlarm
+from overwatch.processing.alarms.impl.betweenValuesAlarm import BetweenValuesAlarm
+from overwatch.processing.alarms.plan import AlarmPlan
+from overwatch.processing.alarms.state import AlarmState
+
+
+def testRaiseAndClear():
+    state = AlarmState()
+    assert state.update(True, 10) == STATE.RAISED
+    assert state.status == STATE.ALARM
+    assert state.since == 10
+    assert state.update(True, 20) is None
+    assert state.update(False, 30) == STATE.CLEARED
+    assert state.status == STATE.OK
+    assert state.update(False, 40) is None
+
+
+def testDebounceAndHysteresis():
+    state = AlarmState()
+    changes = [state.update(isAlarm, now, raiseAfter=2, clearAfter=3)
+               for now, isAlarm in enumerate([True, False, True, True, False, True, False, False, False])]
+    assert changes == [None, None, None, STATE.RAISED, None, None, None, None, STATE.CLEARED]
+
+
+def testReminders():
+    state = AlarmState()
+    changes = [state.update(True, now, renotifyInterval=10) for now in [0, 5, 10, 15, 20]]
+    assert changes == [STATE.RAISED, None, STATE.REMINDER, None, STATE.REMINDER]
+
+
+def testOnlyChangesAreAnnounced(af_alarmChecker, af_trendingObjectClass):
+    ba = BetweenValuesAlarm(minVal=0, maxVal=10, alarmText='ba')
+    ba.addReceiver(af_alarmChecker.receiver)
+    to = af_trendingObjectClass('to')
+    to.alarms = [ba]
+    states = {}
+    plan = AlarmPlan.forTrend(to)
+
+    for now, value in enumerate([5, 20, 20, 20, 5, 5]):
+        to.trendedValues.append(value)
+        plan.evaluate(to, states=states, parameters={STATE.RENOTIFY_INTERVAL: 2}, now=now)
+
+    assert len(states) == 1
+    assert len(af_alarmChecker.receivedAlarms) == 3
+    assert af_alarmChecker.receivedAlarms[0].startswith("[ba]: ")
+    assert "active since" in af_alarmChecker.receivedAlarms[1]
+    assert af_alarmChecker.receivedAlarms[2] == "[ba]: cleared"
+    # Every triggered check is still shown with the trend.
+    assert len(to.alarmsMessages) == 3
+
+
+def testAlarmSettingsOverrideParameters(af_alarmChecker, af_trendingObjectClass):
+    ba1 = BetweenValuesAlarm(minVal=0, maxVal=10, alarmText='ba1', raiseAfter=1)
+    ba2 = BetweenValuesAlarm(minVal=0, maxVal=10, alarmText='ba2')
+    andAlarm = AndAlarm([ba1, ba2], 'and')
+    andAlarm.addReceiver(af_alarmChecker.receiver)
+    ba1.addReceiver(af_alarmChecker.receiver)
+    to = af_trendingObjectClass('to')
+    to.alarms = [ba1, ba2]
+    states = {}
+    plan = AlarmPlan.forTrend(to)
+
+    to.trendedValues.append(20)
+    plan.evaluate(to, states=states, parameters={STATE.RAISE_AFTER: 2}, now=0)
+    assert len(af_alarmChecker.receivedAlarms) == 1
+    assert af_alarmChecker.receivedAlarms[0].startswith("[ba1]: ")
+
+    to.trendedValues.append(20)
+    plan.evaluate(to, states=states, parameters={STATE.RAISE_AFTER: 2}, now=1)
+    assert len(af_alarmChecker.receivedAlarms) == 2
+    assert af_alarmChecker.receivedAlarms[1].startswith("[and]: ")
+    assert sorted(states) == ["0:BetweenValuesAlarm:ba1", "1:BetweenValuesAlarm:ba2", "2:AndAlarm:and"]
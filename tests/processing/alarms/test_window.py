@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+""" Tests for the rolling alarm window statistics.
+"""
+import numpy as np
+import pytest
+
+from overwatch.processing.alarms.impl.meanInRangeAlarm import MeanInRangeAlarm
+from overwatch.processing.alarms.window import AlarmWindow
+from overwatch.processing.trending.ringBuffer import TrendingRingBuffer
+
+
+@pytest.mark.parametrize("size", [1, 2, 5])
+def testWindowStatistics(size):
+    values = np.random.RandomState(1234).uniform(0, 100, 200)
+    window = AlarmWindow(size)
+    window.addRange(20, 60)
+    for i, value in enumerate(values):
+        window.push(value)
+        last = values[max(i + 1 - size, 0):i + 1]
+        assert list(window.values) == list(last)
+        assert window.mean() == pytest.approx(np.mean(last))
+        assert window.minimum() == np.min(last)
+        assert window.maximum() == np.max(last)
+        assert window.countInRange(20, 60) == np.count_nonzero((last > 20) & (last < 60))
+
+
+def testWindowFollowsRingBuffer(af_alarmChecker, af_trendingObjectClass):
+    """ Several values may be trended between checks, and the window must see all of them. """
+    alarm = MeanInRangeAlarm(minVal=0, maxVal=10, N=3)
+    alarm.addReceiver(af_alarmChecker.receiver)
+    to = af_trendingObjectClass()
+    to.trendedValues = TrendingRingBuffer(4)
+
+    for value in [1, 2, 3, 40, 50]:
+        to.trendedValues.append(value)
+    alarm.processCheck(to)
+    assert list(alarm.windows[to].values) == [3, 40, 50]
+    assert len(af_alarmChecker.receivedAlarms) == 1
+
+    for value in [1, 1, 1]:
+        to.trendedValues.append(value)
+    alarm.processCheck(to)
+    assert list(alarm.windows[to].values) == [1, 1, 1]
+    assert len(af_alarmChecker.receivedAlarms) == 1
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+""" Tests for accessing histogram bins as numpy arrays.
+"""
+
+import pytest
+import numpy as np
+import ROOT
+
+from overwatch.processing import histogramArrays
+from overwatch.processing.detectors import EMC
+
+@pytest.mark.parametrize("histClass", [
+    ROOT.TH1D,
+    ROOT.TH1F,
+    ROOT.TH1I,
+], ids = ["TH1D", "TH1F", "TH1I"])
+def testBinContents1D(loggingMixin, histClass):
+    """ Test retrieving the bin contents of 1D histograms of various types. """
+    hist = histClass("test{name}".format(name = histClass.__name__), "test", 5, 0, 5)
+    for value in [-1, 0.5, 2.5, 2.5, 10]:
+        hist.Fill(value)
+
+    contents = histogramArrays.binContents(hist)
+    assert contents.shape == (5,)
+    assert np.array_equal(contents, [hist.GetBinContent(i) for i in range(1, 6)])
+    contentsWithFlow = histogramArrays.binContents(hist, includeFlowBins = True)
+    assert np.array_equal(contentsWithFlow, [hist.GetBinContent(i) for i in range(0, 7)])
+
+    # The array should be a view of the histogram.
+    hist.Fill(0.5)
+    assert contents[0] == 2
+
+def testBinContents2D(loggingMixin):
+    """ Test that the 2D bin contents are indexed as [binY - 1, binX - 1]. """
+    hist = ROOT.TH2D("test2D", "test2D", 4, 0, 4, 3, 0, 3)
+    hist.Fill(2.5, 0.5, 3)
+    hist.Fill(0.5, 1.5)
+
+    contents = histogramArrays.binContents(hist)
+    assert contents.shape == (3, 4)
+    for binX in range(1, 5):
+        for binY in range(1, 4):
+            assert contents[binY - 1, binX - 1] == hist.GetBinContent(binX, binY)
+
+def testBinErrors(loggingMixin):
+    """ Test the bin errors both with and without the sum of weights squared. """
+    hist = ROOT.TH1D("testErrors", "testErrors", 3, 0, 3)
+    hist.Fill(0.5, 4)
+    hist.Fill(1.5)
+    assert np.allclose(histogramArrays.binErrors(hist), [hist.GetBinError(i) for i in range(1, 4)])
+
+    hist.Sumw2()
+    hist.Fill(0.5, 3)
+    assert np.allclose(histogramArrays.binErrors(hist), [hist.GetBinError(i) for i in range(1, 4)])
+
+def testHasSignalOutlier(loggingMixin):
+    """ Test the vectorized outlier search against a simple calculation. """
+    hist = ROOT.TH2D("testOutlier", "testOutlier", 4, 0, 4, 2, 0, 2)
+    for binX in range(1, 5):
+        for binY in range(1, 3):
+            hist.SetBinContent(binX, binY, 1)
+    hist.SetBinContent(3, 2, 20)
+
+    (numOutliers, mean, stdev, newMean, newStdev) = EMC.hasSignalOutlier(hist)
+
+    signal = np.array([1, 1, 1, 1, 1, 1, 20, 1], dtype = np.float64)
+    assert numOutliers == 1
+    assert mean == pytest.approx(np.mean(signal))
+    assert stdev == pytest.approx(np.std(signal))
+    assert newMean == pytest.approx(1)
+    assert newStdev == pytest.approx(0)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+""" Tests for the merge files module.
+
+.. codeauthor:: Raymond Ehlers <raymond.ehlers@yale.edu>, Yale University
+"""
+
+import pytest
+import os
+import ROOT
+
+from overwatch.processing import mergeFiles
+from overwatch.processing import processingClasses
+
+def createFile(filename, nEntries):
+    """ Create a file with a histogram at the top level and one in a ``TPCQA`` subdirectory. """
+    f = ROOT.TFile(filename, "RECREATE")
+    hist = ROOT.TH1F("hist", "hist", 10, 0, 10)
+    for _ in range(nEntries):
+        hist.Fill(1)
+    hist.Write()
+    f.mkdir("TPCQA").cd()
+    tpcHist = ROOT.TH1F("tpcHist", "tpcHist", 10, 0, 10)
+    for _ in range(2 * nEntries):
+        tpcHist.Fill(2)
+    tpcHist.Write()
+    # Only in one file, so it shouldn't be subtracted.
+    if nEntries > 3:
+        f.cd()
+        onlyMax = ROOT.TH1F("onlyMax", "onlyMax", 10, 0, 10)
+        onlyMax.Write()
+    f.Close()
+
+def testSubtractFiles(loggingMixin, tmpdir):
+    """ Test subtracting matching histograms, including those stored in subdirectories. """
+    minFile = str(tmpdir.join("min.root"))
+    maxFile = str(tmpdir.join("max.root"))
+    outFile = str(tmpdir.join("out.root"))
+    createFile(minFile, 3)
+    createFile(maxFile, 5)
+
+    mergeFiles.subtractFiles(minFile, maxFile, outFile)
+
+    fOut = ROOT.TFile(outFile, "READ")
+    assert fOut.Get("hist").GetBinContent(2) == pytest.approx(2)
+    assert fOut.Get("TPCQA/tpcHist").GetBinContent(3) == pytest.approx(4)
+    assert not fOut.Get("onlyMax")
+    fOut.Close()
+
+def testSubtractFilesInMemory(loggingMixin, tmpdir):
+    """ Test subtracting histograms into a memory file without writing any output to disk. """
+    minFile = str(tmpdir.join("min.root"))
+    maxFile = str(tmpdir.join("max.root"))
+    createFile(minFile, 3)
+    createFile(maxFile, 5)
+
+    fOut = mergeFiles.subtractFilesInMemory(minFile, maxFile, "timeSlice.root")
+
+    assert fOut.Get("hist").GetBinContent(2) == pytest.approx(2)
+    assert fOut.Get("TPCQA/tpcHist").GetBinContent(3) == pytest.approx(4)
+    assert sorted(f.basename for f in tmpdir.listdir()) == ["max.root", "min.root"]
+    fOut.Close()
+
+@pytest.mark.parametrize("nFiles, chunkSize", [
+    (3, 20),
+    (7, 2),
+    (10, 3),
+], ids = ["Single merge", "Tree with pass through", "Deeper tree"])
+def testTreeMergeFiles(loggingMixin, tmpdir, nFiles, chunkSize):
+    """ Test that merging via a tree reduction includes every input file exactly once. """
+    inputFilenames = []
+    for i in range(nFiles):
+        filename = str(tmpdir.join("hists.{}.root".format(i)))
+        createFile(filename, 1)
+        inputFilenames.append(filename)
+    outFile = str(tmpdir.join("hists.combined.root"))
+
+    mergeFiles.treeMergeFiles(inputFilenames, outFile, nWorkers = 1, chunkSize = chunkSize)
+
+    fOut = ROOT.TFile(outFile, "READ")
+    assert fOut.Get("hist").GetBinContent(2) == pytest.approx(nFiles)
+    assert fOut.Get("TPCQA/tpcHist").GetBinContent(3) == pytest.approx(2 * nFiles)
+    fOut.Close()
+    # The temporary partial files should be cleaned up.
+    assert len(tmpdir.listdir()) == nFiles + 1
+
+class SubsystemStub(object):
+    """ Minimal stand-in for the ``subsystemContainer`` with only the attributes needed for merging. """
+    def __init__(self, baseDir, startOfRun):
+        self.baseDir = baseDir
+        self.startOfRun = startOfRun
+        self.files = {}
+        self.combinedFile = None
+        self.mergedFileTimes = None
+
+def testRunningMergeInResetMode(loggingMixin, tmpdir, mocker):
+    """ Test that only new files are merged into an existing combined file in reset mode. """
+    baseDir = os.path.join("Run123", "EMC")
+    tmpdir.mkdir("Run123").mkdir("EMC")
+    currentDir = str(tmpdir)
+
+    def addFile(subsystem, timeStamp):
+        filename = os.path.join(baseDir, "EMChists.2015_11_24_18_05_{:02}.root".format(timeStamp))
+        createFile(os.path.join(currentDir, filename), 1)
+        fileCont = processingClasses.fileContainer(filename, subsystem.startOfRun)
+        subsystem.files[fileCont.fileTime] = fileCont
+        return fileCont
+
+    subsystem = SubsystemStub(baseDir = baseDir, startOfRun = None)
+    for timeStamp in [10, 20, 30]:
+        addFile(subsystem, timeStamp)
+    mergeFiles.merge(currentDir, None, subsystem, cumulativeMode = False)
+    firstCombinedFile = subsystem.combinedFile.filename
+    assert len(subsystem.mergedFileTimes) == 3
+
+    # Only the new file should be merged with the previous combined file.
+    newFile = addFile(subsystem, 40)
+    mTreeMerge = mocker.spy(mergeFiles, "treeMergeFiles")
+    mergeFiles.merge(currentDir, None, subsystem, cumulativeMode = False)
+    inputFilenames = mTreeMerge.call_args[0][0]
+    assert inputFilenames == [os.path.join(currentDir, firstCombinedFile), os.path.join(currentDir, newFile.filename)]
+
+    assert len(subsystem.mergedFileTimes) == 4
+    assert "hists.combined.4." in subsystem.combinedFile.filename
+    assert not os.path.exists(os.path.join(currentDir, firstCombinedFile))
+    fOut = ROOT.TFile(os.path.join(currentDir, subsystem.combinedFile.filename), "READ")
+    assert fOut.Get("hist").GetBinContent(2) == pytest.approx(4)
+    fOut.Close()
+
+@pytest.mark.parametrize("linkAvailable", [
+    True,
+    False,
+], ids = ["Hard link", "Fall back to copy"])
+def testLinkOrCopyFile(loggingMixin, tmpdir, mocker, linkAvailable):
+    """ Test making a file available under a new name via a hard link or a copy. """
+    source = tmpdir.join("EMChists.2015_11_24_18_05_10.root")
+    source.write("data")
+    destination = tmpdir.join("hists.combined.1.1448388310.root")
+    # An existing file at the destination should be replaced.
+    destination.write("old")
+    if not linkAvailable:
+        mocker.patch("overwatch.processing.mergeFiles.os.link", side_effect = OSError("Cross-device link"))
+
+    mergeFiles.linkOrCopyFile(str(source), str(destination))
+
+    assert destination.read() == "data"
+    assert os.path.samefile(str(source), str(destination)) is linkAvailable
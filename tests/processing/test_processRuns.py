@@ -383,3 +383,455 @@ def testProcessMovedFilesWithInitialFileArrival(setupNewSubsystemsFromMovedFileI
             assert len(runs[runDir].subsystems[subsystem].histsAvailable) == 1
             assert runs[runDir].subsystems[subsystem].histsAvailable["hello"] == "world_{subsystem}".format(subsystem = subsystem)
 
+@pytest.mark.parametrize("newFile, forceReprocessing, forceReprocessRuns, expected", [
+    (True, False, [], True),
+    (False, False, [], False),
+    (False, True, [], True),
+    (False, False, [123], True),
+], ids = ["New file", "No new file", "Force reprocessing", "Force reprocessing run"])
+def testSubsystemNeedsProcessing(setupNewSubsystemsFromMovedFileInfo, newFile, forceReprocessing, forceReprocessRuns, expected, mocker):
+    """ Test the determination of whether a subsystem needs processing. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    processRuns.createNewSubsystemFromMovedFilesInformation(runs = runs, subsystem = "EMC", runDict = runDict, runDir = runDir)
+    subsystem = runs[runDir].subsystems["EMC"]
+    subsystem.newFile = newFile
+    mocker.patch.dict(processRuns.processingParameters, {"forceReprocessing": forceReprocessing,
+                                                         "forceReprocessRuns": forceReprocessRuns})
+
+    assert processRuns.subsystemNeedsProcessing(runDir, subsystem) is expected
+
+def testRunChangeTracker(setupNewSubsystemsFromMovedFileInfo, mocker):
+    """ Test that the changed runs are tracked, and that only they are visited and committed. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    # Another run which doesn't receive any files.
+    runs["Run100"] = processingClasses.runContainer(runDir = "Run100", fileMode = True)
+    mocker.patch.dict(processRuns.processingParameters, {"forceReprocessing": False, "forceReprocessRuns": []})
+    mCommit = mocker.patch("overwatch.processing.processRuns.transaction.commit")
+
+    changes = processRuns.runChangeTracker()
+    # Nothing is committed if nothing has changed.
+    assert changes.commit() is False
+    mCommit.assert_not_called()
+
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict, changes = changes)
+    assert changes.changedRuns == set([runDir])
+    assert set(subsystem for _, subsystem in changes.changedSubsystems) == set(subsystems)
+    assert changes.runsToProcess(runs) == [runDir]
+
+    assert changes.commit() is True
+    mCommit.assert_called_once_with()
+    assert changes.commit() is False
+    mCommit.assert_called_once_with()
+
+    # Explicitly requested runs are also processed.
+    mocker.patch.dict(processRuns.processingParameters, {"forceReprocessRuns": [100]})
+    assert changes.runsToProcess(runs) == ["Run100", runDir]
+
+def testPendingSubsystemsIndex(setupNewSubsystemsFromMovedFileInfo, mocker):
+    """ Test that the subsystems with new files are indexed, and that the index is reset for the next cycle. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    dbRoot = {"runs": runs}
+
+    # A database without an index is checked in full once.
+    pendingSubsystems = processRuns.pendingSubsystemsIndex(dbRoot, runs)
+    assert len(pendingSubsystems) == 0
+    assert dbRoot["pendingSubsystems"] is pendingSubsystems
+
+    changes = processRuns.runChangeTracker(pendingSubsystems = pendingSubsystems)
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict, changes = changes)
+    assert list(pendingSubsystems) == [(runDir, subsystem) for subsystem in subsystems]
+    assert changes.pendingRuns() == [runDir]
+    assert all(subsystem.newFile for subsystem in itervalues(runs[runDir].subsystems))
+
+    # Starting the next cycle clears the new file flags of the indexed subsystems.
+    pendingSubsystems = processRuns.pendingSubsystemsIndex(dbRoot, runs)
+    assert len(pendingSubsystems) == 0
+    assert not any(subsystem.newFile for subsystem in itervalues(runs[runDir].subsystems))
+
+def testFilesMovedByTimeSliceAreProcessed(setupNewSubsystemsFromMovedFileInfo, mocker):
+    """ Test that files moved while serving a time slice are merged and processed in the next cycle. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict)
+    dbRoot = {"runs": runs}
+    # The previous processing cycle is complete.
+    processRuns.pendingSubsystemsIndex(dbRoot, runs)
+    processRuns.updateRunSummaries(dbRoot, runs, [])
+    assert not any(subsystem.newFile for subsystem in itervalues(runs[runDir].subsystems))
+
+    # Request a time slice while new files have arrived. We stop after the files are moved.
+    mMoveRootFiles = mocker.patch("overwatch.processing.processRuns.utilities.moveRootFiles", return_value = additionalRunDict)
+    mocker.patch("overwatch.processing.processRuns.validateAndCreateNewTimeSlice", return_value = (None, None, {"Request Error": ["Stop"]}))
+    processRuns.processTimeSlices(runs, runDir, 0, 5, "EMC", {}, dbRoot = dbRoot)
+    assert (runDir, "EMC") in dbRoot["movedSubsystems"]
+    assert dbRoot["runSummaries"].mostRecentRun().newFile is True
+
+    # The next cycle merges and processes the subsystems with the moved files.
+    mMoveRootFiles.return_value = {}
+    mocker.patch.dict(processRuns.processingParameters, {"trending": False, "debug": False, "processingWorkers": 1,
+                                                         "renderingWorkers": 1, "forceReprocessing": False,
+                                                         "forceReprocessRuns": []})
+    mMerge = mocker.patch("overwatch.processing.processRuns.mergeFiles.mergeRootFiles")
+    mProcess = mocker.patch("overwatch.processing.processRuns.processSubsystemsSerially")
+    mocker.patch("overwatch.processing.processRuns.transaction.commit")
+    mocker.patch("overwatch.processing.processRuns.profiler.writeReports")
+    processRuns.processAllRuns(dbRoot = dbRoot, connection = mocker.MagicMock())
+
+    assert mMerge.call_args[1]["runDirs"] == [runDir]
+    assert mProcess.call_args[1]["runDirs"] == [runDir]
+    assert all(subsystem.newFile for subsystem in itervalues(runs[runDir].subsystems))
+    assert len(dbRoot["movedSubsystems"]) == 0
+
+def testRunSummaries(setupNewSubsystemsFromMovedFileInfo, mocker):
+    """ Test creating and updating the run summaries, as well as retrieving them for the run list. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict)
+    dbRoot = {"runs": runs}
+
+    # A database without the index creates the summaries of all runs.
+    runSummaries = processRuns.updateRunSummaries(dbRoot, runs, [])
+    assert dbRoot["runSummaries"] is runSummaries
+    assert len(runSummaries) == 1
+    summary = runSummaries.mostRecentRun()
+    run = runs[runDir]
+    assert summary.runNumber == run.runNumber
+    assert list(summary.subsystemNames) == list(run.subsystems.keys())
+    assert summary.startOfRunTimeStamp() == run.startOfRunTimeStamp()
+    assert summary.isRunOngoing() is True
+
+    # Only the summaries of the given runs are updated.
+    for subsystem in itervalues(run.subsystems):
+        subsystem.newFile = False
+    processRuns.updateRunSummaries(dbRoot, runs, [])
+    assert summary.newFile is True
+    processRuns.updateRunSummaries(dbRoot, runs, [runDir])
+    assert summary.newFile is False
+    assert summary.update(run) is False
+
+    # Pages start from the most recent run.
+    for runNumber in [120, 122, 121]:
+        runSummaries.update(mocker.MagicMock(runDir = "Run{}".format(runNumber), runNumber = runNumber,
+                                             subsystems = {}, hltMode = "B"))
+    assert len(runSummaries) == 4
+    assert [s.runNumber for s in runSummaries.page(offset = 0, numberOfRuns = 2)] == [run.runNumber, 122]
+    assert [s.runNumber for s in runSummaries.page(offset = 2, numberOfRuns = 5)] == [121, 120]
+    assert runSummaries.page(offset = 4, numberOfRuns = 2) == []
+
+class FakePool(object):
+    """ Minimal stand-in for ``multiprocessing.Pool`` which executes the tasks in the current process. """
+    def __init__(self, processes):
+        self.processes = processes
+
+    def imap(self, func, iterable):
+        for task in iterable:
+            yield func(task)
+
+    def apply_async(self, func, args):
+        result = func(*args)
+        return collections.namedtuple("FakeAsyncResult", ["get"])(get = lambda: result)
+
+    def close(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+def testProcessSubsystemsInParallel(setupNewSubsystemsFromMovedFileInfo, mocker):
+    """ Test that the results of processing in the worker are merged back into the subsystems. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict)
+    for subsystem in itervalues(runs[runDir].subsystems):
+        subsystem.combinedFile = processingClasses.fileContainer(os.path.join(subsystem.baseDir, "hists.combined.1.1448388552.root"))
+
+    def fakeProcessRootFile(filename, outputFormatting, subsystem, forceRecreateSubsystem, trendingManager, inputFile):
+        # Neither the large file information nor the stored histogram containers should be sent to the workers.
+        assert not hasattr(subsystem, "files")
+        assert not subsystem.hists
+        hist = processingClasses.histogramContainer("{subsystem}Hist".format(subsystem = subsystem.subsystem))
+        hist.information["value"] = 1
+        subsystem.hists[hist.histName] = hist
+        group = processingClasses.histogramGroupContainer("{subsystem} Histograms".format(subsystem = subsystem.subsystem), "")
+        group.histList.append(hist.histName)
+        subsystem.histGroups.append(group)
+        subsystem.nEvents = 10
+    mocker.patch("overwatch.processing.processRuns.processRootFile", side_effect = fakeProcessRootFile)
+    mocker.patch("overwatch.processing.processRuns.ROOT.TFile")
+    mocker.patch("overwatch.processing.processRuns.multiprocessing.Pool", FakePool)
+    mCommit = mocker.patch("overwatch.processing.processRuns.transaction.commit")
+
+    processRuns.processSubsystemsInParallel(runs = runs, outputFormatting = "{base}/{name}.{ext}",
+                                            trendingManager = None, nWorkers = 2)
+
+    for subsystem in subsystems:
+        subsystemContainer = runs[runDir].subsystems[subsystem]
+        assert list(subsystemContainer.hists) == ["{subsystem}Hist".format(subsystem = subsystem)]
+        assert list(subsystemContainer.histGroups[0].histList) == ["{subsystem}Hist".format(subsystem = subsystem)]
+        assert subsystemContainer.nEvents == 10
+        # The files should be untouched.
+        assert len(subsystemContainer.files) == 2
+    # Everything is committed in one transaction.
+    mCommit.assert_called_once_with()
+
+def testProcessSubsystemsInParallelUpdatesStoredHists(setupNewSubsystemsFromMovedFileInfo, mocker):
+    """ Test that only the changes to the stored histograms are sent back from the worker and applied in place. """
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict)
+    storedHists = {}
+    for subsystem in itervalues(runs[runDir].subsystems):
+        subsystem.combinedFile = processingClasses.fileContainer(os.path.join(subsystem.baseDir, "hists.combined.1.1448388552.root"))
+        group = processingClasses.histogramGroupContainer("{subsystem} Histograms".format(subsystem = subsystem.subsystem), "")
+        for histName in ["changedHist", "unchangedHist"]:
+            hist = processingClasses.histogramContainer(histName)
+            hist.renderFingerprint = "stored"
+            hist.trendingObjects.append("trendingObject")
+            subsystem.hists[histName] = hist
+            group.histList.append(histName)
+        subsystem.histGroups.append(group)
+        storedHists[subsystem.subsystem] = dict(subsystem.hists)
+
+    def fakeCreateHistogramContainers(subsystem, fIn):
+        # Recreate the containers as the plugins would, including a histogram which isn't stored.
+        for histName in ["changedHist", "unchangedHist", "newHist"]:
+            subsystem.hists[histName] = processingClasses.histogramContainer(histName)
+
+    def fakeProcessRootFile(filename, outputFormatting, subsystem, forceRecreateSubsystem, trendingManager, inputFile):
+        # Only the stored histograms are processed, starting from their stored information.
+        assert [list(group.histList) for group in subsystem.histGroups] == [["changedHist", "unchangedHist"]]
+        assert subsystem.hists["unchangedHist"].renderFingerprint == "stored"
+        hist = subsystem.hists["changedHist"]
+        hist.renderFingerprint = "new"
+        hist.information["value"] = 2
+    mocker.patch("overwatch.processing.processRuns.createHistogramContainers", side_effect = fakeCreateHistogramContainers)
+    mocker.patch("overwatch.processing.processRuns.processRootFile", side_effect = fakeProcessRootFile)
+    mocker.patch("overwatch.processing.processRuns.ROOT.TFile")
+    mocker.patch("overwatch.processing.processRuns.multiprocessing.Pool", FakePool)
+    mocker.patch("overwatch.processing.processRuns.transaction.commit")
+    mApply = mocker.spy(processRuns, "_applyProcessedSubsystem")
+
+    processRuns.processSubsystemsInParallel(runs = runs, outputFormatting = "{base}/{name}.{ext}",
+                                            trendingManager = None, nWorkers = 2)
+
+    for subsystem in subsystems:
+        subsystemContainer = runs[runDir].subsystems[subsystem]
+        # The stored containers are kept (along with their trending objects), and the new hist isn't added.
+        assert dict(subsystemContainer.hists) == storedHists[subsystem]
+        assert list(subsystemContainer.hists["changedHist"].trendingObjects) == ["trendingObject"]
+        assert subsystemContainer.hists["changedHist"].renderFingerprint == "new"
+        assert dict(subsystemContainer.hists["changedHist"].information) == {"value": 2}
+        assert subsystemContainer.hists["unchangedHist"].renderFingerprint == "stored"
+    # Only the changed histogram is sent back.
+    for call in mApply.call_args_list:
+        assert call[1]["newContainers"] is None
+        assert list(call[1]["histUpdates"]) == ["changedHist"]
+
+@pytest.fixture
+def setupParallelProcessingOfCombinedFile(setupNewSubsystemsFromMovedFileInfo, tmpdir, mocker):
+    """ Setup for processing a real HLT combined file in the workers.
+
+    The combined file contains a histogram which is trended and one which isn't. Only the HLT needs processing.
+    """
+    import ROOT
+    runs, runDir, runDict, additionalRunDict, subsystems = setupNewSubsystemsFromMovedFileInfo
+    runs.pop(runDir)
+    processRuns.processMovedFilesIntoRuns(runs = runs, runDict = runDict)
+    mocker.patch.dict(processRuns.processingParameters, {"dirPrefix": tmpdir.strpath,
+                                                         "renderImagesOnDemand": True,
+                                                         "skipUnchangedHists": True,
+                                                         "forceReprocessing": False,
+                                                         "forceRecreateSubsystem": False,
+                                                         "forceReprocessRuns": []})
+    for subsystem in itervalues(runs[runDir].subsystems):
+        subsystem.newFile = subsystem.subsystem == "HLT"
+    subsystem = runs[runDir].subsystems["HLT"]
+    subsystem.combinedFile = processingClasses.fileContainer(os.path.join(subsystem.baseDir, "hists.combined.1.1448388552.root"))
+    # ``os.makedirs`` is mocked by the setup, so we create the directories via ``tmpdir``.
+    tmpdir.join(subsystem.imgDir).ensure(dir = True)
+    tmpdir.join(subsystem.jsonDir).ensure(dir = True)
+
+    fOut = ROOT.TFile(tmpdir.join(subsystem.combinedFile.filename).strpath, "RECREATE")
+    for histName in ["otherHist", "trendedHist"]:
+        hist = ROOT.TH1F(histName, histName, 10, 0, 10)
+        hist.Fill(3)
+        hist.Write()
+    fOut.Close()
+
+    mocker.patch("overwatch.processing.processRuns.multiprocessing.Pool", FakePool)
+    mocker.patch("overwatch.processing.processRuns.transaction.commit")
+
+    return runs, runDir, subsystem
+
+def testProcessSubsystemsInParallelWithTrending(setupParallelProcessingOfCombinedFile, mocker):
+    """ Test processing trended histograms in the workers, where the trending manager is only a recorder. """
+    runs, runDir, subsystem = setupParallelProcessingOfCombinedFile
+    trendingManager = mocker.MagicMock(histToTrending = {"trendedHist": ["trendingObject"]})
+
+    for _ in range(2):
+        processRuns.processSubsystemsInParallel(runs = runs, outputFormatting = "{base}/{name}.{ext}",
+                                                trendingManager = trendingManager, nWorkers = 2)
+
+    assert sorted(subsystem.hists) == ["otherHist", "trendedHist"]
+    # The trended histogram is processed every time, so it's fingerprint is never stored.
+    assert subsystem.hists["trendedHist"].renderFingerprint is None
+    assert subsystem.hists["otherHist"].renderFingerprint is not None
+    assert trendingManager.notifyAboutNewHistogramValue.call_count == 2
+
+def testProcessSubsystemsInParallelReplaysTrendedHists(setupParallelProcessingOfCombinedFile, tmpdir, mocker):
+    """ Test that the histograms recorded in the workers are replayed into the trending manager. """
+    from overwatch.processing.trending import constants as trendingConstants
+    from overwatch.processing.trending.manager import TrendingManager
+    from overwatch.processing.trending.objects.mean import MeanTrending
+    runs, runDir, subsystem = setupParallelProcessingOfCombinedFile
+    parameters = {trendingConstants.DIR_PREFIX: tmpdir.strpath, trendingConstants.SUBSYSTEMS: ["HLT"],
+                  trendingConstants.ENTRIES: 20, trendingConstants.EXTENSION: "png"}
+    trendingManager = TrendingManager({}, parameters)
+    trend = MeanTrending("trendedHistMean", "Mean", ["trendedHist"], "HLT", parameters)
+    trendingManager._subscribe(trend, ["trendedHist"])
+    mCheckAlarms = mocker.spy(trendingManager, "checkPendingAlarms")
+
+    processRuns.processSubsystemsInParallel(runs = runs, outputFormatting = "{base}/{name}.{ext}",
+                                            trendingManager = trendingManager, nWorkers = 2)
+
+    # The trended value is extracted from the recorded copy of the histogram in the worker.
+    history = trend.history.window()
+    assert list(history["value"]) == [3.]
+    assert list(history["runNumber"]) == [123]
+    assert list(history["timestamp"]) == [subsystem.combinedFile.fileTime]
+    assert trend.needsRendering is True
+    mCheckAlarms.assert_called_once_with()
+    # The recorded histograms aren't kept in the containers.
+    assert subsystem.hists["trendedHist"].hist is None
+
+def testHistogramFingerprint(loggingMixin):
+    """ Test that the histogram fingerprint only changes when the histogram or processing options change. """
+    import ROOT
+    hist = ROOT.TH1F("fingerprintTest", "fingerprintTest", 10, 0, 10)
+    hist.SetDirectory(0)
+    hist.Fill(3)
+    processingOptions = {"scaleHists": True}
+
+    fingerprint = processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10)
+    # Same content gives the same fingerprint.
+    assert fingerprint == processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10)
+    # Different processing options or number of events give a different fingerprint.
+    assert fingerprint != processRuns.histogramFingerprint(hist = hist, processingOptions = {"scaleHists": False}, nEvents = 10)
+    assert fingerprint != processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 20)
+    # Different draw options or processing functions give a different fingerprint.
+    assert fingerprint != processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10, drawOptions = "colz")
+
+    def setLogy(subsystem, hist, processingOptions):
+        hist.canvas.SetLogy(True)
+
+    def setLogz(subsystem, hist, processingOptions):
+        hist.canvas.SetLogz(True)
+    withFunction = processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10, functionsToApply = [setLogy])
+    assert fingerprint != withFunction
+    assert withFunction == processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10, functionsToApply = [setLogy])
+    # Changing the code of the function changes the fingerprint as well.
+    setLogz.__name__ = setLogy.__name__
+    assert withFunction != processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10, functionsToApply = [setLogz])
+    # Changing the content changes the fingerprint.
+    hist.Fill(5)
+    assert fingerprint != processRuns.histogramFingerprint(hist = hist, processingOptions = processingOptions, nEvents = 10)
+
+def testHistogramContainerVolatileAttributes(loggingMixin):
+    """ Test that the histogram and canvas are available during processing, but are never stored. """
+    hist = processingClasses.histogramContainer("hist")
+    rootHist = object()
+    hist.hist = rootHist
+    hist.canvas = "canvas"
+    assert hist.hist is rootHist
+    assert hist.canvas == "canvas"
+
+    state = hist.__getstate__()
+    assert "hist" not in state and "_v_hist" not in state
+    assert "canvas" not in state and "_v_canvas" not in state
+    assert "information" in state
+
+    # Containers stored with the histogram in their state still use the volatile attribute.
+    restored = processingClasses.histogramContainer.__new__(processingClasses.histogramContainer)
+    restored.__setstate__(dict(state, hist = None))
+    assert restored.hist is None
+    restored.hist = rootHist
+    assert restored.hist is rootHist
+
+@pytest.mark.parametrize("imageFilename, expected", [
+    ("Run123/EMC/img/hist.png", "Run123/EMC/json/hist.json"),
+    ("Run123/EMC/img/timeSlice.abc.hist.png", "Run123/EMC/json/timeSlice.abc.hist.json"),
+    ("Run123/EMC/hist.png", None),
+], ids = ["Standard image", "Time slice image", "Not in image directory"])
+def testJsonFilenameForImage(loggingMixin, imageFilename, expected):
+    """ Test determining the json filename from an image filename. """
+    assert processRuns.jsonFilenameForImage(imageFilename) == expected
+
+@pytest.mark.parametrize("imageExists, imageIsNewer, expectedRender", [
+    (False, False, True),
+    (True, False, True),
+    (True, True, False),
+], ids = ["No image", "Outdated image", "Cached image"])
+def testRenderImageOnDemand(loggingMixin, mocker, imageExists, imageIsNewer, expectedRender):
+    """ Test that on demand rendering only renders when the cached image is unavailable or outdated. """
+    mocker.patch("overwatch.processing.processRuns.os.path.exists", side_effect = lambda filename: filename.endswith(".json") or imageExists)
+    mocker.patch("overwatch.processing.processRuns.os.path.getmtime", side_effect = lambda filename: (2 if imageIsNewer else 0) if filename.endswith(".png") else 1)
+    mocker.patch("overwatch.processing.processRuns.open", mocker.mock_open(read_data = "{}"), create = True)
+    mConvert = mocker.patch("overwatch.processing.processRuns.ROOT.TBufferJSON.ConvertFromJSON")
+    mRename = mocker.patch("overwatch.processing.processRuns.os.rename")
+
+    result = processRuns.renderImageOnDemand("Run123/EMC/img/hist.png")
+
+    assert result is expectedRender
+    assert mConvert.called is expectedRender
+    if expectedRender:
+        mConvert.return_value.SaveAs.assert_called_once()
+        assert mRename.call_args[0][1] == "Run123/EMC/img/hist.png"
+
+def testImageRenderer(loggingMixin, mocker):
+    """ Test that the image renderer writes all submitted images by the time that it has waited. """
+    mocker.patch("overwatch.processing.processRuns.multiprocessing.Pool", FakePool)
+    mRender = mocker.patch("overwatch.processing.processRuns.renderImageFromJSON", return_value = True)
+
+    renderer = processRuns.imageRenderer(nWorkers = 2)
+    renderer.render(canvasJSON = "{}", outputFilename = "hist1.png")
+    renderer.render(canvasJSON = "{}", outputFilename = "hist2.png")
+    assert len(renderer.pending) == 2
+    renderer.close()
+
+    assert renderer.pending == []
+    assert [c[1]["outputFilename"] for c in mRender.call_args_list] == ["hist1.png", "hist2.png"]
+
+@pytest.mark.parametrize("mergeSucceeds", [True, False], ids = ["Merge succeeds", "Merge fails"])
+def testWriteTimeSliceFile(loggingMixin, tmpdir, mocker, mergeSucceeds):
+    """ Test that the time slice file is written to a temporary file and only then moved into place. """
+    mocker.patch.dict(processRuns.processingParameters, {"dirPrefix": tmpdir.strpath, "cumulativeMode": True})
+    tmpdir.join("Run123", "EMC").ensure(dir = True)
+    timeSlice = mocker.MagicMock()
+    timeSlice.filename.filename = "timeSlice.1.2.abc.root"
+    subsystem = mocker.MagicMock(baseDir = os.path.join("Run123", "EMC"), timeSlices = {"abc": timeSlice})
+    runs = {"Run123": mocker.MagicMock(subsystems = {"EMC": subsystem})}
+    outputFilename = tmpdir.join("Run123", "EMC", "timeSlice.1.2.abc.root")
+
+    def fakeMerge(currentDir, run, subsystem, cumulativeMode, timeSlice, outputFilename):
+        with open(outputFilename, "w") as f:
+            f.write("timeSlice")
+        if not mergeSucceeds:
+            raise ValueError("Merge failed")
+
+    mMerge = mocker.patch("overwatch.processing.processRuns.mergeFiles.merge", side_effect = fakeMerge)
+
+    if mergeSucceeds:
+        assert processRuns.writeTimeSliceFile(runs, os.path.join("Run123", "EMC", "timeSlice.1.2.abc.root")) is True
+        assert outputFilename.read() == "timeSlice"
+    else:
+        with pytest.raises(ValueError):
+            processRuns.writeTimeSliceFile(runs, os.path.join("Run123", "EMC", "timeSlice.1.2.abc.root"))
+        assert not outputFilename.exists()
+    # The merge never writes directly to the requested file, and the temporary file is always removed.
+    assert mMerge.call_args[1]["outputFilename"] != outputFilename.strpath
+    assert tmpdir.join("Run123", "EMC").listdir() == ([outputFilename] if mergeSucceeds else [])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+""" Tests for the processing profiler.
+"""
+
+import json
+import os
+import pickle
+import pytest
+
+from overwatch.processing import profiler as profilerModule
+
+class FakeTimer(object):
+    """ Timer which only advances when requested. """
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def timer():
+    yield FakeTimer()
+
+def pluginFunction():
+    pass
+
+def testStagesAndHistograms(loggingMixin, timer):
+    """ Test recording the stages, histograms and plugin functions of a cycle. """
+    profiler = profilerModule.processingProfiler(nSlowest = 1, timer = timer)
+    profiler.startCycle()
+    with profiler.stage("moveRootFiles"):
+        timer.now += 1
+    for histName, duration in [("a", 2), ("b", 5)]:
+        with profiler.histogram("EMC", "Run123", histName):
+            with profiler.function("EMC", pluginFunction):
+                timer.now += duration
+    cycle = profiler.finishCycle()
+
+    assert cycle.duration == 8
+    assert cycle.stages["moveRootFiles"].total == 1
+    assert cycle.stages["processHist"].count == 2
+    assert cycle.stages["pluginFunctions"].maximum == 5
+    assert cycle.slowestHistograms(1) == [(5, ("EMC", "Run123", "b"))]
+    assert cycle.functions[("EMC", "pluginFunction")].total == 7
+
+    report = profiler.report()
+    assert report["slowestHistograms"] == [{"subsystem": "EMC", "run": "Run123", "histogram": "b", "seconds": 5}]
+    assert report["slowestFunctions"][0]["function"] == "pluginFunction"
+    assert report["cycles"][0]["duration"] == 8
+
+def testNoRecordingOutsideOfCycle(loggingMixin, timer):
+    """ Test that measurements are ignored outside of a cycle or when disabled. """
+    profiler = profilerModule.processingProfiler(timer = timer)
+    with profiler.stage("commit"):
+        timer.now += 1
+    assert profiler.finishCycle() is None
+
+    profiler.configure({"profiling": False})
+    profiler.startCycle()
+    with profiler.stage("commit"):
+        timer.now += 1
+    assert profiler.finishCycle() is None
+    assert len(profiler.cycles) == 0
+
+def testRollingStore(loggingMixin, timer):
+    """ Test that only the configured number of cycles are kept. """
+    profiler = profilerModule.processingProfiler(timer = timer)
+    profiler.configure({"profilingCycles": 2})
+    for i in range(3):
+        profiler.startCycle()
+        timer.now += i
+        profiler.finishCycle()
+    assert [cycle.duration for cycle in profiler.cycles] == [1, 2]
+
+def testMergeWorkerCycle(loggingMixin, timer):
+    """ Test merging timings from a worker process (which are pickled) into the current cycle. """
+    worker = profilerModule.processingProfiler(timer = timer)
+    worker.startCycle()
+    with worker.histogram("TPC", "Run1", "hist"):
+        timer.now += 3
+    workerCycle = pickle.loads(pickle.dumps(worker.detachCycle()))
+    assert len(worker.cycles) == 0
+
+    profiler = profilerModule.processingProfiler(timer = timer)
+    profiler.startCycle()
+    profiler.mergeCycle(workerCycle)
+    cycle = profiler.finishCycle()
+    assert cycle.histograms[("TPC", "Run1", "hist")] == 3
+    assert cycle.stages["processHist"].count == 1
+
+def testReports(loggingMixin, timer, tmpdir):
+    """ Test the Prometheus text format and writing the reports. """
+    profiler = profilerModule.processingProfiler(timer = timer)
+    profiler.startCycle()
+    with profiler.histogram("EMC", "Run123", "hist \"quoted\""):
+        timer.now += 0.5
+    profiler.finishCycle()
+
+    text = profiler.prometheusText()
+    assert "# TYPE overwatch_processing_stage_seconds gauge" in text
+    assert 'overwatch_processing_stage_seconds{stage="processHist"} 0.5' in text
+    assert 'overwatch_processing_histogram_seconds{histogram="hist \\"quoted\\"",run="Run123",subsystem="EMC"} 0.5' in text
+
+    profiler.writeReports(str(tmpdir))
+    outputDir = os.path.join(str(tmpdir), profilerModule.profilingDir)
+    with open(os.path.join(outputDir, profilerModule.metricsFilename)) as f:
+        assert f.read() == text
+    with open(os.path.join(outputDir, profilerModule.reportFilename)) as f:
+        assert json.load(f)["slowestHistograms"][0]["seconds"] == 0.5
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+""" Tests for the columnar trending archive.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from overwatch.processing.trending.archive import TrendingArchiveWriter, queryTrend  # noqa: E402
+
+
+@pytest.fixture
+def archiveDir(tmpdir):
+    writer = TrendingArchiveWriter(str(tmpdir))
+    for i in range(10):
+        runNumber = 100 + i // 5
+        writer.record("EMC", "meanTrend", 1000 + i, runNumber, i, 0.1)
+        writer.record("EMC", "maxTrend", 1000 + i, runNumber, -i, 0)
+    writer.flush()
+    # A second flush should add to the existing data.
+    writer.record("EMC", "meanTrend", 2000, 102, 10, 0.1)
+    writer.flush()
+    yield str(tmpdir)
+
+
+def testQueryAll(archiveDir):
+    result = queryTrend(archiveDir, "EMC", "meanTrend")
+    assert np.array_equal(result["value"], np.arange(11))
+    assert np.array_equal(result["runNumber"], [100] * 5 + [101] * 5 + [102])
+
+
+@pytest.mark.parametrize("kwargs, expected", [
+    ({"minTime": 1003, "maxTime": 1006}, [3, 4, 5, 6]),
+    ({"minRun": 101, "maxRun": 101}, [5, 6, 7, 8, 9]),
+    ({"minTime": 1008, "minRun": 101}, [8, 9, 10]),
+], ids=["time range", "run range", "time and run range"])
+def testQueryRanges(archiveDir, kwargs, expected):
+    result = queryTrend(archiveDir, "EMC", "meanTrend", **kwargs)
+    assert np.array_equal(result["value"], expected)
+
+
+def testQueryMissingSubsystem(archiveDir):
+    assert len(queryTrend(archiveDir, "TPC", "meanTrend")) == 0
+
+
+def testCompaction(tmpdir):
+    writer = TrendingArchiveWriter(str(tmpdir), maxFilesPerPartition=3)
+    # Each flush corresponds to one processing cycle.
+    for i in range(10):
+        writer.record("EMC", "meanTrend", 1000 + i, 100, i, 0.1)
+        writer.flush()
+
+    partitionDir = tmpdir.join("EMC", "runNumber=100")
+    assert len(partitionDir.listdir()) <= 3
+    result = queryTrend(str(tmpdir), "EMC", "meanTrend")
+    assert np.array_equal(result["value"], np.arange(10))
+    assert np.array_equal(result["runNumber"], [100] * 10)
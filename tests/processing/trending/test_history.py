@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+""" Tests for TrendingHistory.
+"""
+import numpy as np
+
+from overwatch.processing.trending.history import TrendingHistory
+from overwatch.processing.trending.objects.mean import MeanTrending
+
+
+def testAppendOnlyTouchesLastChunk():
+    history = TrendingHistory(chunkSize=3)
+    for i in range(7):
+        history.append(1000 + i, 123, i, 0.1)
+
+    assert len(history) == 7
+    assert len(history.chunks) == 3
+    assert history.latestTimestamp() == 1006
+    # Filled chunks are no longer modified.
+    firstChunk = history.chunks.values()[0]
+    history.append(1007, 123, 7, 0.1)
+    assert firstChunk.size == 3
+    assert history.lastChunk.size == 2
+
+
+def testWindow():
+    history = TrendingHistory(chunkSize=3)
+    for i in range(10):
+        history.append(1000 + i, 100 + i // 5, i, 0.)
+
+    entries = history.window(minTime=1004, maxTime=1007)
+    assert np.array_equal(entries["value"], [4, 5, 6, 7])
+    assert np.array_equal(entries["runNumber"], [100, 101, 101, 101])
+    assert len(history.window()) == 10
+    assert len(history.window(minTime=2000)) == 0
+
+
+def testTrendingObjectHistory(tf_trendingArgs, tf_histogram):
+    t = MeanTrending(*tf_trendingArgs)
+    # More entries than the ring buffer can hold, all of which should be kept in the history.
+    nEntries = t.maxEntries + 5
+    for i in range(nEntries):
+        t.setEntryInformation(timestamp=1000 + i, runNumber=123)
+        t.extractTrendValue(tf_histogram)
+
+    assert len(t.trendedValues) == t.maxEntries
+    assert len(t.history) == nEntries
+    times, values, _ = t.trendedPoints()
+    assert np.array_equal(times, np.arange(1000, 1000 + nEntries))
+    assert t.retrieveHist().GetN() == nEntries
+
+
+def testLengthWithoutLoadingChunks():
+    history = TrendingHistory(chunkSize=3)
+    for i in range(7):
+        history.append(1000 + i, 123, i, 0.1)
+    # The length is determined by the counter, not by the chunks.
+    history.chunks = None
+    assert len(history) == 7
+
+
+def testLengthOfStoredHistoryWithoutCounter():
+    history = TrendingHistory(chunkSize=3)
+    for i in range(4):
+        history.append(1000 + i, 123, i, 0.1)
+    # Histories stored before the counter was available don't have it.
+    del history.numberOfEntries
+    assert len(history) == 4
+    history.append(1004, 123, 4, 0.1)
+    assert len(history) == 5
+    assert history.numberOfEntries() == 5
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+""" Tests for the TrendingManager.
+"""
+import pytest
+
+from overwatch.processing.alarms.impl.betweenValuesAlarm import BetweenValuesAlarm
+from overwatch.processing.trending.constants import DIR_PREFIX, SUBSYSTEMS
+from overwatch.processing.trending.manager import TrendingManager
+from overwatch.processing.trending.objects.mean import MeanTrending
+
+
+class HistogramContainerMock(object):
+    def __init__(self, histName, hist):
+        self.histName = histName
+        self.hist = hist.hist
+        self.information = {}
+
+
+@pytest.fixture
+def manager(tmpdir, tf_trendingArgs):
+    parameters = tf_trendingArgs[4]
+    parameters[DIR_PREFIX] = tmpdir.strpath
+    parameters[SUBSYSTEMS] = [tf_trendingArgs[3]]
+    yield TrendingManager({}, parameters)
+
+
+def testAlarmsAreCheckedOncePerBatch(manager, tf_trendingArgs, tf_histogram, af_alarmChecker):
+    """ Values are extracted immediately, while alarms are only checked for the batch. """
+    trend = MeanTrending(*tf_trendingArgs)
+    # The mean of the test histogram is 1, so it is always outside of the range.
+    alarm = BetweenValuesAlarm(minVal=10., maxVal=20.)
+    alarm.addReceiver(af_alarmChecker.receiver)
+    trend.setAlarms([alarm])
+    manager._subscribe(trend, ["h1", "h2"])
+
+    hists = [HistogramContainerMock(name, tf_histogram) for name in ["h1", "h2"]]
+    for hist in hists:
+        manager.notifyAboutNewHistogramValue(hist, timestamp=1000., runNumber=123)
+
+    assert len(trend.trendedValues) == 2
+    assert af_alarmChecker.receivedAlarms == []
+
+    manager.checkPendingAlarms()
+
+    assert len(af_alarmChecker.receivedAlarms) == 1
+    for hist in hists:
+        assert "Alarm" + trend.name in hist.information
+    assert not manager.pendingAlarmChecks
+
+
+def testEarlierValueInBatchTriggersAlarm(manager, tf_trendingArgs, af_alarmChecker):
+    """ Alarms which only look at the most recent value are also checked for the earlier values of a batch. """
+    class ValueHistogram(object):
+        def __init__(self, mean):
+            self.mean = mean
+
+        @property
+        def hist(self):
+            return self
+
+        def GetMean(self):
+            return self.mean
+
+        def GetMeanError(self):
+            return 0.
+
+    trend = MeanTrending(*tf_trendingArgs)
+    alarm = BetweenValuesAlarm(minVal=10., maxVal=20.)
+    alarm.addReceiver(af_alarmChecker.receiver)
+    trend.setAlarms([alarm])
+    manager._subscribe(trend, ["h1", "h2"])
+
+    # Only the first value of the batch is outside of the range.
+    outOfRange = HistogramContainerMock("h1", ValueHistogram(1.))
+    inRange = HistogramContainerMock("h2", ValueHistogram(15.))
+    for hist in [outOfRange, inRange]:
+        manager.notifyAboutNewHistogramValue(hist, timestamp=1000., runNumber=123)
+    manager.checkPendingAlarms()
+
+    assert len(af_alarmChecker.receivedAlarms) == 2
+    assert "value 1.0 not in" in af_alarmChecker.receivedAlarms[0]
+    assert "cleared" in af_alarmChecker.receivedAlarms[1]
+    assert "Alarm" + trend.name in outOfRange.information
+    assert "Alarm" + trend.name not in inRange.information
+
+
+def testOnlyUpdatedTrendsAreRendered(manager, tf_trendingArgs, tf_histogram, mocker):
+    """ Trends are only rendered again after they receive new values. """
+    updated = MeanTrending(*tf_trendingArgs)
+    unchanged = MeanTrending("unchanged", "desc", ["h3"], tf_trendingArgs[3], tf_trendingArgs[4])
+    for trend in [updated, unchanged]:
+        trend.needsRendering = False
+        manager.trendingDB[tf_trendingArgs[3]][trend.name] = trend
+    manager._subscribe(updated, ["h1"])
+    processHist = mocker.patch.object(MeanTrending, "processHist")
+
+    manager.notifyAboutNewHistogramValue(HistogramContainerMock("h1", tf_histogram))
+    manager.processTrending()
+
+    processHist.assert_called_once()
+    assert updated.needsRendering is True
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+""" Tests for TrendingRingBuffer.
+"""
+import numpy as np
+import pytest
+import transaction
+import ZODB
+
+from overwatch.processing.alarms.alarm import Alarm
+from overwatch.processing.trending.objects.mean import MeanTrending
+from overwatch.processing.trending.ringBuffer import TrendingRingBuffer
+
+
+@pytest.mark.parametrize(
+    "nValues, expected",
+    [(3, [0, 1, 2]), (5, [0, 1, 2, 3, 4]), (8, [3, 4, 5, 6, 7])],
+    ids=['partial', 'full', 'wrapped']
+)
+def testChronologicalOrder(nValues, expected):
+    buf = TrendingRingBuffer(5, blockSize=2)
+    valuesArrays = [block.values for block in buf.blocks]
+    for i in range(nValues):
+        buf.append(i, i * 0.1, 1000 + i)
+
+    assert len(buf) == len(expected)
+    assert np.array_equal(buf.chronologicalValues(), expected)
+    assert np.allclose(buf.chronologicalErrors(), np.array(expected) * 0.1)
+    assert np.array_equal(buf.chronologicalTimestamps(), np.array(expected) + 1000)
+    assert np.array_equal(np.array(buf), expected)
+    # Appending must not reallocate the storage.
+    assert all(block.values is values for block, values in zip(buf.blocks, valuesArrays))
+
+
+def testFromArray():
+    buf = TrendingRingBuffer.fromArray(np.array([[1., 0.1], [2., 0.2], [3., 0.3]]), 2)
+    assert np.array_equal(buf.chronologicalValues(), [2., 3.])
+    assert np.allclose(buf.chronologicalErrors(), [0.2, 0.3])
+
+
+def testConvertExistingTrendingObject(tf_trendingArgs, tf_histogram):
+    t = MeanTrending(*tf_trendingArgs)
+    # Trending objects stored before the ring buffer was available contain a numpy array.
+    t.trendedValues = np.array([[5., 0.5]])
+    t.extractTrendValue(tf_histogram)
+
+    assert isinstance(t.trendedValues, TrendingRingBuffer)
+    assert np.array_equal(Alarm.prepareTrendValues(t), [5., tf_histogram.GetMean()])
+
+
+def testLatestValues():
+    buf = TrendingRingBuffer(5)
+    for i in range(8):
+        buf.append(i)
+
+    assert buf.count == 8
+    assert np.array_equal(buf.latestValues(2), [6, 7])
+    assert np.array_equal(buf.latestValues(10), [3, 4, 5, 6, 7])
+
+
+def testAppendOnlyModifiesOneBlock():
+    db = ZODB.DB(None)
+    connection = db.open()
+    try:
+        buf = TrendingRingBuffer(10, blockSize=4)
+        connection.root()["buf"] = buf
+        for i in range(6):
+            buf.append(i)
+        transaction.commit()
+
+        buf.append(6)
+        assert [block._p_changed for block in buf.blocks] == [False, True, False]
+        transaction.commit()
+        for i in range(7, 13):
+            buf.append(i)
+        transaction.commit()
+    finally:
+        transaction.abort()
+        connection.close()
+        db.close()
+
+    assert np.array_equal(buf.chronologicalValues(), np.arange(3, 13))
+    assert np.array_equal(buf.latestValues(3), [10, 11, 12])
+
+
+def testConvertStoredColumnsToBlocks():
+    buf = TrendingRingBuffer(3)
+    for i in range(4):
+        buf.append(i)
+    # Buffers stored before the blocks were available store the columns directly.
+    del buf.blocks
+    buf.values = np.array([3., 1., 2.])
+    buf.errors = np.zeros(3)
+    buf.timestamps = np.zeros(3)
+    assert np.array_equal(buf.chronologicalValues(), [1, 2, 3])
+    assert np.array_equal(buf.latestValues(2), [2, 3])
+
+    buf.append(4)
+    assert len(buf.blocks) == 1
+    assert not hasattr(buf, "values")
+    assert np.array_equal(buf.chronologicalValues(), [2, 3, 4])
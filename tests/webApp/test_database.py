@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+""" Tests for the web app database access.
+"""
+
+import logging
+import pytest
+
+logger = logging.getLogger(__name__)
+
+import flask
+
+from overwatch.webApp.database import SnapshotDB
+
+@pytest.fixture
+def app(loggingMixin):
+    """ Flask app with an in memory database and views which attempt to modify the database. """
+    app = flask.Flask(__name__)
+    app.config["ZODB_STORAGE"] = "memory://"
+    app.config["ZODB_WARM_CACHE"] = False
+    db = SnapshotDB(app)
+
+    @app.route("/read")
+    def read():
+        db["value"] = "read"
+        return "read"
+
+    @app.route("/write")
+    @db.writable
+    def write():
+        db["value"] = "write"
+        return "write"
+
+    yield app, db
+
+    db.database().close()
+
+def storedValue(db):
+    """ Retrieve the value which is stored in the database. """
+    connection = db.database().open()
+    try:
+        return connection.root().get("value")
+    finally:
+        connection.close()
+
+def testViewsOnlyPersistChangesIfWritable(app):
+    """ Test that only views decorated with ``writable()`` can store changes in the database. """
+    app, db = app
+    client = app.test_client()
+
+    assert client.get("/read").status_code == 200
+    assert storedValue(db) is None
+
+    assert client.get("/write").status_code == 200
+    assert storedValue(db) == "write"
+
+    # A later read only view still can't overwrite the stored value.
+    assert client.get("/read").status_code == 200
+    assert storedValue(db) == "write"